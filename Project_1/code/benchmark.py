@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from f_shading import f_shading, f_shading_batch
+from t_shading import t_shading, t_shading_batch
+from render_img import render_img
+from texture_cache import load_texture
+from scene_file import Scene, load_scene
+
+# ----------------------------------------------------------------------------
+# Benchmark harness (the same in every project)
+# ----------------------------------------------------------------------------
+
+def measure(name, fn, repeat=3, number=1, triangles=0, pixels=None):
+    """
+    Times one benchmark case.
+
+    fn is called once to warm up, then `repeat` times `number` calls are timed (the median
+    sample is reported, per call), and one more call runs under tracemalloc for the peak
+    memory allocated by the call. Anything fn prints is discarded.
+
+    Parameters:
+    - name: Name of the case.
+    - fn: Function without arguments running the case.
+    - repeat: Number of timing samples.
+    - number: Calls per timing sample (for very short cases).
+    - triangles: Triangles processed by one call.
+    - pixels: Pixels shaded by one call; None counts them in the result of the warm-up call
+      (see count_pixels).
+
+    Returns:
+    - Dict with the timings, the throughputs and the peak memory of the case.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = fn()
+        if pixels is None:
+            pixels = count_pixels(out)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    seconds = float(np.median(samples))
+    return {
+        'name': name,
+        'seconds': seconds,
+        'min_seconds': float(np.min(samples)),
+        'repeat': repeat,
+        'number': number,
+        'triangles': int(triangles),
+        'pixels': int(pixels),
+        'triangles_per_s': triangles / seconds if seconds > 0 else 0.0,
+        'pixels_per_s': pixels / seconds if seconds > 0 else 0.0,
+        'peak_bytes': int(peak),
+    }
+
+
+def count_pixels(img):
+    """
+    Number of pixels of an image that differ from the white background (1, or 255 for uint8
+    images). A case may also return its pixel count directly (e.g. summed over several
+    frames); anything else counts 0.
+    """
+    if isinstance(img, (int, np.integer)):
+        return int(img)
+    if not isinstance(img, np.ndarray) or img.ndim != 3:
+        return 0
+    return int(np.count_nonzero(np.any(img != (255 if img.dtype == np.uint8 else 1), axis=2)))
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compares results with a baseline run and prints the ratio of every case.
+
+    A case regresses when it is more than `tolerance` (relative) slower than in the baseline,
+    or when its peak memory grew by more than `tolerance`.
+
+    Parameters:
+    - results: List of case dicts (see measure).
+    - baseline: Contents of a JSON file written by an earlier run.
+    - tolerance: Allowed relative slowdown / memory growth.
+
+    Returns:
+    - List of the names of the regressed cases.
+    """
+    base = {case['name']: case for case in baseline['results']}
+    regressions = []
+    for case in results:
+        ref = base.get(case['name'])
+        if ref is None:
+            print(f"{case['name']:<32} (not in baseline)")
+            continue
+
+        time_ratio = case['seconds'] / ref['seconds'] if ref['seconds'] > 0 else 1.0
+        mem_ratio = case['peak_bytes'] / ref['peak_bytes'] if ref['peak_bytes'] > 0 else 1.0
+        regressed = time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(case['name'])
+        print(f"{case['name']:<32} time x{time_ratio:6.2f}  memory x{mem_ratio:6.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main(project, cases):
+    """
+    Command line entry point: runs the cases, writes the JSON report and optionally
+    compares it with a baseline (exit status 1 on regressions).
+
+    Parameters:
+    - project: Name of the project (stored in the report).
+    - cases: List of (name, fn, options) with the keyword options of measure.
+    """
+    parser = argparse.ArgumentParser(description=f"Benchmarks of {project}")
+    parser.add_argument('--repeat', type=int, default=3, help="timing samples per case")
+    parser.add_argument('--only', default=None, help="run only the cases whose name contains this text")
+    parser.add_argument('--out', default='benchmark.json', help="JSON report to write")
+    parser.add_argument('--baseline', default=None, help="JSON report of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = []
+    for name, fn, options in cases:
+        if args.only and args.only not in name:
+            continue
+        case = measure(name, fn, repeat=args.repeat, **options)
+        results.append(case)
+        print(f"{name:<32} {case['seconds'] * 1e3:10.3f} ms  {case['triangles_per_s']:12.0f} tri/s  "
+              f"{case['pixels_per_s']:12.0f} px/s  {case['peak_bytes'] / 2**20:8.2f} MiB")
+
+    report = {
+        'project': project,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved as {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+# ----------------------------------------------------------------------------
+# Project 1 cases (hw1.npy)
+# ----------------------------------------------------------------------------
+
+# Triangles drawn by the f_shading case (every call copies the whole image)
+N_F_SHADING = 500
+
+def build_cases():
+    data = load_scene('hw1.npy')
+    texImg = load_texture('texImg.jpg')
+
+    faces = data['t_pos_idx']
+    vertices = data['v_pos2d']
+    vcolors = data['v_clr']
+    uvs = data['v_uvs']
+    depth = data['depth'].reshape(-1, 1)
+    n_tri = faces.shape[0]
+
+    # Painter's order, as in render_img
+    faces_sorted = faces[np.argsort(-np.mean(depth.flatten()[faces], axis=1))]
+
+    def f_shading_all():
+        img = np.ones((512, 512, 3))
+        for tri in faces_sorted[:N_F_SHADING]:
+            img = f_shading(img, vertices[tri], vcolors[tri])
+        return img
+
+    def t_shading_all():
+        img = np.ones((512, 512, 3))
+        for tri in faces_sorted:
+            img = t_shading(img, vertices[tri], uvs[tri], texImg)
+        return img
+
+    def render(**kw):
+        return lambda: render_img(faces, vertices, vcolors, uvs, depth, texImg=texImg, **kw)
+
+    return [
+        ('load_npy', lambda: np.load('hw1.npy', allow_pickle=True).item(), dict(number=10)),
+        ('load_scene', lambda: Scene('hw1.scene'), dict(number=10)),
+        ('f_shading', f_shading_all, dict(triangles=N_F_SHADING)),
+        ('f_shading_batch', lambda: f_shading_batch(np.ones((512, 512, 3)), vertices, faces_sorted, vcolors),
+         dict(triangles=n_tri)),
+        ('t_shading', t_shading_all, dict(triangles=n_tri)),
+        ('t_shading_batch', lambda: t_shading_batch(np.ones((512, 512, 3)), vertices, faces_sorted, uvs, texImg),
+         dict(triangles=n_tri)),
+        ('render_img_f', render(shading='f'), dict(triangles=n_tri)),
+        ('render_img_t', render(shading='t'), dict(triangles=n_tri)),
+        ('render_img_t_zbuffer', render(shading='t', zbuffer=True), dict(triangles=n_tri)),
+        ('render_img_t_trilinear', render(shading='t', tex_filter='trilinear'), dict(triangles=n_tri)),
+        ('render_img_f_uint8', render(shading='f', precision='uint8'), dict(triangles=n_tri)),
+        ('render_img_t_uint8', render(shading='t', precision='uint8'), dict(triangles=n_tri)),
+        ('render_img_f_numba', render(shading='f', backend='numba'), dict(triangles=n_tri)),
+        ('render_img_t_numba', render(shading='t', backend='numba'), dict(triangles=n_tri)),
+    ]
+
+
+if __name__ == "__main__":
+    main("Project_1", build_cases())
+
+
+
+
+# # Example usage (run from this folder)
+
+# # python benchmark.py --out baseline.json
+# # ... change the code ...
+# # python benchmark.py --out new.json --baseline baseline.json --tolerance 0.1
@@ -1,20 +1,16 @@
-import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
 from render_img import render_img
+from texture_cache import load_texture
+from scene_file import load_scene
 
 # Path where the rendered image will be saved
 path_to_save = "render_g.png"  
 
-# Load data from the .npy file
-data = np.load('hw1.npy', allow_pickle=True).item()
+# Load the scene (hw1.npy is converted once into the memory-mapped hw1.scene)
+data = load_scene('hw1.npy')
 
-# Read texture image
-texImg = mpimg.imread('texImg.jpg')
-
-# Normalize texture image to the range [0, 1] if it is of type uint8
-if texImg.dtype == np.uint8:
-    texImg = texImg / 255.0  
+# Read texture image (decoded once and memory-mapped as uint8; the shaders fetch texels in [0, 1])
+texImg = load_texture('texImg.jpg')
 
 # Get the face indices from the loaded data
 faces = data['t_pos_idx']
@@ -1,4 +1,5 @@
 import numpy as np
+from kernel_backend import get_backend
 
 def f_shading(img, vertices, vcolors):
     """
@@ -12,42 +13,43 @@ def f_shading(img, vertices, vcolors):
     # Make a copy of the image to avoid modifying the original
     updated_img = np.copy(img)
 
-    # Extract only the x, y components of the triangle's vertices
-    triangle = vertices[:, :2].copy()
+    # Shade the single triangle in place on the copy
+    return f_shading_batch(updated_img, vertices, np.array([[0, 1, 2]]), vcolors)
 
-    # Compute flat color as the average of the vertex colors
-    flat_color = np.mean(vcolors, axis=0)
 
-    # Determine bounding box of the triangle (to limit the rasterization area)
-    min_x = max(int(np.floor(np.min(triangle[:, 0]))), 0)
-    max_x = min(int(np.ceil(np.max(triangle[:, 0]))), img.shape[1] - 1)
-    min_y = max(int(np.floor(np.min(triangle[:, 1]))), 0)
-    max_y = min(int(np.ceil(np.max(triangle[:, 1]))), img.shape[0] - 1)
-
-    # Generate a grid of pixel coordinates within the bounding box
-    ys, xs = np.meshgrid(np.arange(min_y, max_y + 1), np.arange(min_x, max_x + 1), indexing='ij')
-    points = np.stack([xs, ys], axis=-1).reshape(-1, 2)
-
-    # Unpack triangle vertices
-    A, B, C = triangle
+def f_shading_batch(img, vertices, faces, vcolors, zbuf=None, stats=None, dtype=np.float64, backend=None):
+    """
+    Applies flat shading to many triangles at once, writing directly into the image.
+
+    Triangles are drawn in the order given by faces: when several triangles cover the same
+    pixel the last one wins, exactly as with repeated f_shading calls (painter's algorithm).
+    With a depth buffer the nearest triangle wins instead, whatever the order.
+
+    :param img: Image to draw on as a NumPy array (H x W x 3), modified in place
+    :param vertices: (m x 2) or (m x 3) array of vertex positions (x, y[, z])
+    :param faces: (n x 3) array of vertex indices per triangle, in drawing order
+    :param vcolors: (m x 3) array of RGB color values for each vertex
+    :param zbuf: Optional DepthBuffer; vertices must then carry their depth as z column
+    :param stats: Optional RenderStats that counts the covered (tested) and written (shaded) pixels
+    :param dtype: Float type of the color math (the compute type, see precision); the colors are
+                  converted to the type of img when written
+    :param backend: Kernel backend (see kernel_backend): None or 'numpy', 'numba' or 'auto'
+    :return: The same image with all triangles shaded
+    """
+    faces = np.asarray(faces).reshape(-1, 3)
+    vertices = np.asarray(vertices)
 
-    # Helper function to compute the cross product in 2D (used for point-in-triangle test)
-    def cross(a, b, c):
-        return (b[0]-a[0])*(c[:,1]-a[1]) - (b[1]-a[1])*(c[:,0]-a[0])
+    if zbuf is not None and vertices.shape[1] < 3:
+        raise ValueError("Depth testing needs vertices with a z column")
 
-    # Compute the edge functions for all points
-    d1 = cross(A, B, points)
-    d2 = cross(B, C, points)
-    d3 = cross(C, A, points)
+    # Extract only the x, y components of every triangle's vertices (n x 3 x 2)
+    triangles = vertices[faces][:, :, :2]
 
-    # Determine which points lie inside the triangle using sign consistency
-    has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
-    has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
-    inside = ~(has_neg & has_pos)
+    # Depth of every triangle's vertices (only needed for the depth test)
+    depths = vertices[faces][:, :, 2].astype(float) if zbuf is not None else None
 
-    # Extract and loop through points inside the triangle to apply flat color
-    inside_points = points[inside]
-    for x, y in inside_points:
-        updated_img[y, x] = flat_color
+    # Flat color of every triangle as the average of its vertex colors
+    flat_colors = np.mean(np.asarray(vcolors)[faces], axis=1).astype(dtype, copy=False)
 
-    return updated_img
+    # Fill the triangles with the kernels of the backend (see kernel_backend)
+    return get_backend(backend).fill_triangles(img, triangles, flat_colors, depths, zbuf, stats)
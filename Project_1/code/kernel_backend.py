@@ -0,0 +1,259 @@
+import numpy as np
+from triangle_kernel import scanline_pixels, fill_triangles
+from texture_cache import texels
+from precision import to_framebuffer
+
+# Numba is optional: without it the 'numba' backend falls back to the NumPy kernels
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+class KernelBackend:
+    def __init__(self, name, scanline_pixels, texels, fill_triangles):
+        """
+        Set of the inner kernels of the shaders.
+
+        Every backend implements the same three kernels with the signatures of the NumPy ones:
+        - scanline_pixels: scanline traversal of a triangle, pixels of its spans and their
+          interpolated attributes (see triangle_kernel), used by t_shading.
+        - texels: nearest texel fetch, scaled to [0, 1] (see texture_cache).
+        - fill_triangles: flat fill of many triangles (see triangle_kernel), used by f_shading_batch.
+
+        :param name: Name of the backend (key of BACKENDS)
+        :param scanline_pixels: Traversal kernel
+        :param texels: Texture fetch kernel
+        :param fill_triangles: Flat fill kernel
+        """
+        self.name = name
+        self.scanline_pixels = scanline_pixels
+        self.texels = texels
+        self.fill_triangles = fill_triangles
+
+    def __repr__(self):
+        return f"KernelBackend('{self.name}')"
+
+
+# Registered backends, by name
+BACKENDS = {}
+
+def register_backend(backend):
+    """
+    Adds a backend to BACKENDS (replacing a backend of the same name).
+    """
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(backend=None):
+    """
+    Resolves the backend argument of the shading functions.
+
+    :param backend: None or 'numpy' (the NumPy kernels), 'numba' (JIT-compiled kernels, or the
+                    NumPy ones if Numba is not installed), 'auto' (the fastest available) or a
+                    KernelBackend
+    :return: The KernelBackend
+    """
+    if isinstance(backend, KernelBackend):
+        return backend
+    if backend is None:
+        backend = 'numpy'
+    if backend == 'auto':
+        backend = 'numba' if 'numba' in BACKENDS else 'numpy'
+    if backend == 'numba' and 'numba' not in BACKENDS and not NUMBA_AVAILABLE:
+        backend = 'numpy'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend: {backend}")
+    return BACKENDS[backend]
+
+
+register_backend(KernelBackend('numpy', scanline_pixels, texels, fill_triangles))
+
+
+# ----------------------------------------------------------------------------
+# JIT-compiled kernels (Numba, CPU). Every kernel repeats the floating-point operations
+# of its NumPy counterpart in the same order (the scanline and edge functions have no
+# reductions), so the images are the same as with the NumPy kernels.
+# ----------------------------------------------------------------------------
+
+def _jit(fn):
+    """
+    Compiles a kernel in nopython mode. The machine code is cached on disk (in __pycache__),
+    so only the first run of a new version of this file pays for the compilation.
+    """
+    return numba.njit(cache=True, nogil=True)(fn) if numba is not None else fn
+
+
+@_jit
+def _lerp(p1, p2, V1, V2, coord, axis, out):
+    """
+    vector_interp for one point, written into out.
+    """
+    denominator = p2[axis] - p1[axis]
+    if abs(denominator) < 1e-10:
+        for d in range(out.shape[0]):
+            out[d] = V1[d]
+    else:
+        t = (coord - p1[axis]) / denominator
+        for d in range(out.shape[0]):
+            out[d] = (1 - t) * V1[d] + t * V2[d]
+
+
+@_jit
+def _scanline(V, n, y_min, y_max, width):
+    """
+    Span endpoints of every scanline, then the pixels of every span (V: the sorted vertices
+    followed by their attributes).
+    """
+    rows = max(y_max - y_min + 1, 0)
+    K = V.shape[1]
+    A = np.empty((rows, K))
+    B = np.empty((rows, K))
+    x_min = np.empty(rows, dtype=np.int64)
+    counts = np.empty(rows, dtype=np.int64)
+
+    # Left/right end of every scanline (A on C1-C2 or C2-C3, B on C1-C3)
+    total = 0
+    for r in range(rows):
+        j = y_min + r
+        if j < V[1, 1]:
+            _lerp(V[0], V[1], V[0], V[1], j, 1, A[r])
+        else:
+            _lerp(V[1], V[2], V[1], V[2], j, 1, A[r])
+        _lerp(V[0], V[2], V[0], V[2], j, 1, B[r])
+        if A[r, 0] > B[r, 0]:
+            for d in range(K):
+                a = A[r, d]
+                A[r, d] = B[r, d]
+                B[r, d] = a
+        x_min[r] = int(max(0.0, np.floor(A[r, 0])))
+        counts[r] = max(int(min(width - 1.0, np.ceil(B[r, 0]))) - x_min[r] + 1, 0)
+        total += counts[r]
+
+    # Interpolate along every span
+    ys = np.empty(total, dtype=np.int64)
+    xs = np.empty(total, dtype=np.int64)
+    attr = np.empty((total, K - n + 1))
+    k = 0
+    for r in range(rows):
+        for i in range(counts[r]):
+            ys[k] = y_min + r
+            xs[k] = x_min[r] + i
+            _lerp(A[r], B[r], A[r, n - 1:], B[r, n - 1:], xs[k], 0, attr[k])
+            k += 1
+    return ys, xs, attr
+
+
+def _scanline_pixels_jit(vertices, attributes, height, width, setup=None):
+    """
+    Compiled scanline_pixels: same pixels in the same order, in one pass over the spans
+    (the sorted vertices and scanline range of a setup record are used as they are).
+    """
+    if setup is not None:
+        V = np.ascontiguousarray(setup.V, dtype=np.float64)
+        y_min, y_max = int(setup.y_min), int(setup.y_max)
+    else:
+        sorted_indices = np.argsort(vertices[:, 1])
+        V = np.ascontiguousarray(np.hstack([vertices, attributes])[sorted_indices], dtype=np.float64)
+        y_min = int(max(0, np.floor(V[0, 1])))
+        y_max = int(min(height - 1, np.ceil(V[2, 1])))
+    return _scanline(V, vertices.shape[1], y_min, y_max, width)
+
+
+@_jit
+def _fetch(tex, ty, tx, scale, out):
+    for p in range(out.shape[0]):
+        for c in range(out.shape[1]):
+            # Convert exactly to the result type first, then scale in that type
+            out[p, c] = tex[ty[p], tx[p], c]
+            out[p, c] = out[p, c] / scale
+    return out
+
+
+def _texels_jit(tex, ty, tx, dtype=np.float64):
+    """
+    Compiled texels for arrays of indices into an (H, W, C) texture (anything else, e.g.
+    scalar indices, goes to the NumPy kernel).
+    """
+    if np.ndim(ty) != 1 or np.ndim(tx) != 1 or np.ndim(tex) != 3:
+        return texels(tex, ty, tx, dtype)
+    tex = np.asarray(tex)  # plain view of a memory-mapped texture
+    dtype = np.dtype(dtype)
+    out = np.empty((np.shape(ty)[0], tex.shape[2]), dtype=dtype)
+    scale = np.asarray(255 if tex.dtype == np.uint8 else 1, dtype=dtype)[()]
+    return _fetch(tex, np.asarray(ty), np.asarray(tx), scale, out)
+
+
+@_jit
+def _fill(img, triangles, colors, min_x, max_x, min_y, max_y, written):
+    """
+    Painter's fill: every pixel inside a triangle takes its color, in triangle order.
+    Returns the number of covered fragments and of distinct pixels written.
+    """
+    tested = 0
+    shaded = 0
+    for t in range(triangles.shape[0]):
+        ax, ay = triangles[t, 0, 0], triangles[t, 0, 1]
+        bx, by = triangles[t, 1, 0], triangles[t, 1, 1]
+        cx, cy = triangles[t, 2, 0], triangles[t, 2, 1]
+        for y in range(min_y[t], max_y[t] + 1):
+            for x in range(min_x[t], max_x[t] + 1):
+                # Edge functions and sign consistency, as in _fill_chunk
+                d1 = (bx - ax) * (y - ay) - (by - ay) * (x - ax)
+                d2 = (cx - bx) * (y - by) - (cy - by) * (x - bx)
+                d3 = (ax - cx) * (y - cy) - (ay - cy) * (x - cx)
+                has_neg = d1 < 0 or d2 < 0 or d3 < 0
+                has_pos = d1 > 0 or d2 > 0 or d3 > 0
+                if has_neg and has_pos:
+                    continue
+                tested += 1
+                if not written[y, x]:
+                    written[y, x] = True
+                    shaded += 1
+                for c in range(img.shape[2]):
+                    img[y, x, c] = colors[t, c]
+    return tested, shaded
+
+
+def _fill_triangles_jit(img, triangles, flat_colors, depths=None, zbuf=None, stats=None):
+    """
+    Compiled fill_triangles for the painter's algorithm (with a depth buffer, the NumPy
+    kernel resolves the nearest fragments).
+    """
+    if zbuf is not None:
+        return fill_triangles(img, triangles, flat_colors, depths, zbuf, stats)
+    H, W = img.shape[0], img.shape[1]
+
+    # Bounding box of every triangle (clamped to the image)
+    min_x = np.maximum(np.floor(np.min(triangles[:, :, 0], axis=1)).astype(int), 0)
+    max_x = np.minimum(np.ceil(np.max(triangles[:, :, 0], axis=1)).astype(int), W - 1)
+    min_y = np.maximum(np.floor(np.min(triangles[:, :, 1], axis=1)).astype(int), 0)
+    max_y = np.minimum(np.ceil(np.max(triangles[:, :, 1], axis=1)).astype(int), H - 1)
+
+    # Colors converted once per triangle instead of once per pixel
+    colors = to_framebuffer(flat_colors, img.dtype)
+    written = np.zeros((H, W), dtype=np.bool_)
+    tested, shaded = _fill(img, triangles, colors, min_x, max_x, min_y, max_y, written)
+
+    if stats is not None and np.any((max_x >= min_x) & (max_y >= min_y)):
+        stats.add('pixels_tested', tested)
+        stats.add('pixels_shaded', shaded)
+
+    return img
+
+
+if NUMBA_AVAILABLE:
+    register_backend(KernelBackend('numba', _scanline_pixels_jit, _texels_jit, _fill_triangles_jit))
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# backend = get_backend('auto')  # the JIT kernels if Numba is installed
+# print(backend, sorted(BACKENDS))
+# vertices = np.array([[10.0, 10.0, 1.0], [50.0, 10.0, 1.0], [30.0, 60.0, 1.0]])
+# uv = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 1.0]])
+# ys, xs, attr_P = backend.scanline_pixels(vertices, uv, 64, 64)
+# print(ys.size, "pixels,", np.array_equal(attr_P, scanline_pixels(vertices, uv, 64, 64)[2]))
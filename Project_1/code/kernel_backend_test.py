@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import kernel_backend
+from kernel_backend import KernelBackend, NUMBA_AVAILABLE, get_backend
+from triangle_kernel import scanline_pixels, setup_scanlines
+from t_shading import t_shading
+from render_img import render_img
+from texture_cache import load_texture
+
+# Tests of the kernel backends on hw1.npy: the JIT kernels must give the same coverage and
+# the same images as the NumPy kernels. Their bodies are plain Python when Numba is not
+# installed (_jit is the identity), so they are checked here as interpreted code; only the
+# test of the compiled kernels needs Numba.
+# Run with: python -m pytest kernel_backend_test.py
+
+data = np.load("hw1.npy", allow_pickle=True).item()
+faces = data["t_pos_idx"]
+vertices = np.hstack([data["v_pos2d"], data["depth"].reshape(-1, 1)])
+texture = load_texture("texImg.jpg")
+
+JIT_KERNELS = ('_lerp', '_scanline', '_fetch', '_fill')
+
+
+@pytest.fixture(scope="module")
+def interpreted():
+    """
+    Backend made of the JIT kernels run as Python (the py_func of every kernel if Numba
+    compiled them).
+    """
+    patch = pytest.MonkeyPatch()
+    for name in JIT_KERNELS:
+        kernel = getattr(kernel_backend, name)
+        patch.setattr(kernel_backend, name, getattr(kernel, 'py_func', kernel))
+    yield KernelBackend('numba (interpreted)', kernel_backend._scanline_pixels_jit, kernel_backend._texels_jit,
+                        kernel_backend._fill_triangles_jit)
+    patch.undo()
+
+
+def render(shading, backend, **kwargs):
+    return render_img(faces, data["v_pos2d"], data["v_clr"], data["v_uvs"], data["depth"], shading, texture,
+                      backend=backend, **kwargs)
+
+
+@pytest.mark.parametrize("use_setup", [False, True])
+def test_scanline_pixels(interpreted, use_setup):
+    setup = setup_scanlines(vertices, faces, data["v_uvs"], 512) if use_setup else None
+    for k, face in enumerate(faces):
+        expected = scanline_pixels(vertices[face], data["v_uvs"][face], 512, 512, setup[k] if use_setup else None)
+        result = interpreted.scanline_pixels(vertices[face], data["v_uvs"][face], 512, 512,
+                                             setup[k] if use_setup else None)
+        # Same pixels (coverage) in the same order, same interpolated depth and UVs
+        for a, b in zip(expected, result):
+            assert np.array_equal(a, b), k
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_texels(interpreted, dtype):
+    rng = np.random.default_rng(0)
+    ty = rng.integers(0, texture.shape[0], 10000)
+    tx = rng.integers(0, texture.shape[1], 10000)
+    for tex in (texture, np.asarray(texture) / 255.0):
+        expected = get_backend('numpy').texels(tex, ty, tx, dtype)
+        result = interpreted.texels(tex, ty, tx, dtype)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+
+def test_t_shading(interpreted):
+    # Triangle by triangle traversal (the texture path of render_img only uses the texel kernel)
+    order = np.argsort(-np.mean(data["depth"][faces], axis=1))
+    images = []
+    for backend in ('numpy', interpreted):
+        img = np.ones((512, 512, 3))
+        for face in faces[order]:
+            img = t_shading(img, vertices[face], data["v_uvs"][face], texture, backend=backend)
+        images.append(img)
+    assert np.array_equal(*images)
+
+
+@pytest.mark.parametrize("precision", [None, 'float32', 'uint8'])
+@pytest.mark.parametrize("zbuffer", [False, True])
+@pytest.mark.parametrize("shading", ['f', 't'])
+def test_render_img(interpreted, shading, zbuffer, precision):
+    expected = render(shading, 'numpy', zbuffer=zbuffer, precision=precision)
+    result = render(shading, interpreted, zbuffer=zbuffer, precision=precision)
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="Numba is not installed")
+@pytest.mark.parametrize("zbuffer", [False, True])
+@pytest.mark.parametrize("shading", ['f', 't'])
+def test_compiled(shading, zbuffer):
+    assert get_backend('numba').name == 'numba'
+    assert np.array_equal(render(shading, 'numba', zbuffer=zbuffer), render(shading, 'numpy', zbuffer=zbuffer))
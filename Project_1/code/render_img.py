@@ -1,8 +1,15 @@
 import numpy as np
-from f_shading import f_shading
-from t_shading import t_shading
+from f_shading import f_shading_batch
+from t_shading import t_shading_batch
+from triangle_kernel import setup_scanlines
+from depth_buffer import DepthBuffer
+from mip_texture import get_mip_texture
+from render_stats import stage, add
+from precision import get_precision
+from kernel_backend import get_backend
 
-def render_img(faces, vertices, vcolors, uvs, depth, shading, texImg):
+def render_img(faces, vertices, vcolors, uvs, depth, shading, texImg, zbuffer=False, tex_filter=None, stats=None,
+               precision=None, backend=None):
     """
     Renders a 3D scene by applying shading to triangles in the image.
 
@@ -14,38 +21,85 @@ def render_img(faces, vertices, vcolors, uvs, depth, shading, texImg):
     :param depth: A (m,) array of depth values for each vertex
     :param shading: A string indicating the shading method ('f' for flat shading, 't' for texture shading)
     :param texImg: The texture image (as a NumPy array) to apply if texture shading is used
-    :return: The rendered image with applied shading
+    :param zbuffer: If True, visibility is resolved per pixel with a depth buffer instead of
+                    sorting the triangles by mean depth (painter's algorithm)
+    :param tex_filter: None for nearest-neighbour fetches from the full-size texture, or 'nearest',
+                       'bilinear' or 'trilinear' to sample a mip pyramid of the texture at the
+                       level of detail of every triangle (see mip_texture)
+    :param stats: Optional RenderStats (see render_stats) that receives the time of every stage
+                  (sorting, setup, shading, output), the triangle and pixel counters and, if it
+                  has a log callback, the per-triangle diagnostics. Without it nothing is printed.
+    :param precision: Data-type policy (see precision): None or 'float64' for the float64
+                      reference, 'float32' for float32 shading math and canvas, 'float16' or
+                      'uint8' for float32 math into a float16 / uint8 canvas, or a Precision
+    :param backend: Kernel backend of the shaders (see kernel_backend): None or 'numpy' for the
+                    NumPy kernels, 'numba' for JIT-compiled kernels (the NumPy ones if Numba is
+                    not installed), 'auto' for the fastest available, or a KernelBackend
+    :return: The rendered image with applied shading (floats in [0, 1], or uint8 in [0, 255])
     """
+    precision = get_precision(precision)
     M, N = 512, 512  # Canvas dimensions
-    img = np.ones((M, N, 3))  # Create a white canvas
+    img = precision.new_image(M, N)  # Create a white canvas
+    kernels = get_backend(backend)
+    if stats is not None and backend == 'numba' and kernels.name != 'numba':
+        stats.message("Numba is not installed, using the NumPy kernels")
 
-    # Calculate the depth of each triangle by averaging the depths of its vertices
-    triangle_depths = np.mean(depth.flatten()[faces], axis=1)
+    if shading == 't' and tex_filter is not None:
+        # Mip pyramid of the texture (built once per texture)
+        texImg = get_mip_texture(texImg, tex_filter)
 
-    # Sort triangles by depth in descending order (farther triangles are rendered first)
-    sorted_indices = np.argsort(-triangle_depths)
-    faces_sorted = faces[sorted_indices]
+    with stage(stats, 'sorting'):
+        if zbuffer:
+            # Depth buffer: triangles can be drawn in any order, vertices carry their depth as z
+            zbuf = DepthBuffer(M, N)
+            faces_sorted = faces
+            vertices = np.hstack([vertices[:, :2], depth.reshape(-1, 1)])
+        else:
+            zbuf = None
+
+            # Calculate the depth of each triangle by averaging the depths of its vertices
+            triangle_depths = np.mean(depth.flatten()[faces], axis=1)
 
-    # Iterate through the sorted triangles to render them
-    for i in range(faces_sorted.shape[0]):
-        triangle_indices = faces_sorted[i].flatten()  # Get the vertex indices for the current triangle
-        verts_2d = vertices[triangle_indices]     # 2D coordinates of the triangle's vertices
-        colors = vcolors[triangle_indices]        # Vertex colors for the triangle
-        uv_coords = uvs[triangle_indices]         # UV coordinates for the triangle's vertices
+            # Sort triangles by depth in descending order (farther triangles are rendered first)
+            sorted_indices = np.argsort(-triangle_depths)
+            faces_sorted = faces[sorted_indices]
+    add(stats, 'triangles_submitted', faces.shape[0])
 
-        # Print the details of the triangle being rendered
-        print(f"Rendering triangle {i} with indices: {triangle_indices}")
-        print(f"verts: {verts_2d}")
+    if shading == 't':
+        # Scanline setup of all triangles at once (vertices sorted by y with their UVs, range of
+        # scanlines), read by t_shading_batch
+        with stage(stats, 'setup'):
+            setup = setup_scanlines(vertices, faces_sorted, uvs, M)
 
-        # Apply shading based on the selected method ('f' for flat, 't' for texture)
+    # Per-triangle diagnostics only when asked for (formatting them costs more than the shading)
+    verbose = stats is not None and stats.verbose
+
+    with stage(stats, 'shading'):
         if shading == 'f':
-            img = f_shading(img, verts_2d, colors)  
+            # Flat shading fills all sorted triangles in one pass (later triangles overwrite earlier ones)
+            img = f_shading_batch(img, vertices, faces_sorted, vcolors, zbuf=zbuf, stats=stats,
+                                  dtype=precision.compute, backend=kernels)
         elif shading == 't':
-            img = t_shading(img, verts_2d, uv_coords, texImg)  
+            # Report the details of the triangles being rendered
+            if verbose:
+                for i in range(faces_sorted.shape[0]):
+                    triangle_indices = faces_sorted[i].flatten()
+                    stats.message(f"Rendering triangle {i} with indices: {triangle_indices}")
+                    stats.message(f"verts: {vertices[triangle_indices]}")
+
+            # Texture shading fills all sorted triangles in one pass (later triangles overwrite earlier ones)
+            img = t_shading_batch(img, vertices, faces_sorted, uvs, texImg, zbuf=zbuf, stats=stats,
+                                  dtype=precision.compute, backend=kernels, setup=setup)
         else:
             raise ValueError("Shading must be either 'f' or 't'")  
+    add(stats, 'triangles_drawn', faces_sorted.shape[0])
 
-    print("Total triangles rendered:", faces_sorted.shape[0])  # Print the number of triangles rendered
-    print("Faces shape:", faces.shape)  # Print the shape of the faces array
+    if stats is not None:
+        with stats.stage('output'):
+            stats.count_visible(img)
+        if verbose:
+            stats.message(f"Total triangles rendered: {faces_sorted.shape[0]}")  # Number of triangles rendered
+            stats.message(f"Faces shape: {faces.shape}")  # Shape of the faces array
+            stats.message(stats.summary())
 
     return img  # Return the final rendered image
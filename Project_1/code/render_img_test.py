@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from render_img import render_img
+from texture_cache import load_texture
+
+# Regression test of render_img on hw1.npy: the flat and textured images must stay those of
+# the original renderer, pinned in reference_images.npz (rounded to 8 bits). Half a level of
+# slack lets rounding of the float math pass, but not a texel or a pixel changing hands.
+# Run with: python -m pytest render_img_test.py
+
+data = np.load("hw1.npy", allow_pickle=True).item()
+texture = load_texture("texImg.jpg")
+reference = np.load("reference_images.npz")
+
+
+@pytest.mark.parametrize("shading", ['f', 't'])
+def test_reference_image(shading):
+    img = render_img(data["t_pos_idx"], data["v_pos2d"], data["v_clr"], data["v_uvs"], data["depth"].reshape(-1, 1),
+                     shading, texture)
+    error = np.abs(img.astype(np.float64) * 255 - reference[shading])
+    assert np.count_nonzero(error > 0.5 + 1e-3) == 0
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import mmap
+import numpy as np
+from collections.abc import Mapping
+from typing import Iterator, Union
+
+# File layout: MAGIC, the length of the JSON header (little-endian uint64), the header, then
+# the raw bytes of the arrays. The data and every array in it start at multiples of ALIGN bytes
+MAGIC = b"SCENE\x00\x01\x00"
+ALIGN = 64
+
+# Scenes already opened by this process, keyed by (absolute path, mtime)
+_opened = {}
+
+class Scene(Mapping):
+    def __init__(self, path: str) -> None:
+        """
+        Read-only scene dict backed by a memory-mapped scene file (see save_scene).
+
+        Opening a scene only reads its header, whatever the size of the meshes. Every array is
+        a zero-copy, read-only view into the mapping, created the first time its key is read,
+        so all processes that open the same file share one page-cache copy of the data.
+        Scalars (sizes, camera and material parameters) are kept in the header and returned
+        as Python numbers. Keys are read as in the dict of np.load(...).item().
+
+        Parameters:
+        - path: Path of the scene file.
+        """
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a scene file: {path}")
+            size = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            header = json.loads(f.read(size).decode('utf-8'))
+            self._start = _align(len(MAGIC) + 8 + size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if header['arrays'] else None
+        self._specs = header['arrays']
+        self._values = header['values']
+        self._arrays = {}
+
+    def __getitem__(self, key: str):
+        if key in self._values:
+            return self._values[key]
+        if key not in self._arrays:
+            spec = self._specs[key]
+            shape, dtype = tuple(spec['shape']), np.dtype(spec['dtype'])
+            if 0 in shape:
+                array = np.empty(shape, dtype=dtype, order=spec['order'])
+            else:
+                array = np.ndarray(shape, dtype=dtype, buffer=self._mmap, offset=self._start + spec['offset'],
+                                   order=spec['order'])
+            self._arrays[key] = array
+        return self._arrays[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._specs) + list(self._values))
+
+    def __len__(self) -> int:
+        return len(self._specs) + len(self._values)
+
+    def __reduce__(self):
+        # Pickled as its path: another process maps the same file instead of receiving a copy
+        return Scene, (self.path,)
+
+    def __repr__(self) -> str:
+        return f"Scene('{self.path}', keys={list(self)})"
+
+
+def save_scene(path: str, data: dict) -> None:
+    """
+    Writes a scene dict as a scene file (opened again with load_scene).
+
+    Arrays are stored as raw buffers in their own memory layout (C or Fortran order, so the
+    transposes the demos take stay views); other layouts are made C-contiguous. Lists of
+    equally shaped arrays (e.g. the light positions) are stacked into one array. Scalars,
+    strings and None go into the JSON header. The file is written under a temporary name and
+    then renamed, so concurrent readers never see a partial file.
+
+    Parameters:
+    - path: Path of the scene file to write.
+    - data: Dict of arrays, lists of arrays and scalars (e.g. the dict of a hw*.npy file).
+    """
+    arrays, values = {}, {}
+    for key, value in data.items():
+        if isinstance(value, (list, tuple)) and value and all(isinstance(v, np.ndarray) for v in value):
+            value = np.stack(value)
+        if isinstance(value, np.ndarray) and value.ndim > 0:
+            value = np.asarray(value)  # plain ndarray (e.g. instead of a trimesh TrackedArray)
+            if not (value.flags['C_CONTIGUOUS'] or value.flags['F_CONTIGUOUS']):
+                value = np.ascontiguousarray(value)
+            arrays[key] = value
+        else:
+            values[key] = value.item() if isinstance(value, (np.ndarray, np.generic)) else value
+
+    # Step 1: Layout of the arrays (offsets from the start of the data)
+    specs = {}
+    offset = 0
+    for key, value in arrays.items():
+        order = 'C' if value.flags['C_CONTIGUOUS'] else 'F'
+        specs[key] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'order': order, 'offset': offset}
+        offset = _align(offset + value.nbytes)
+    header = json.dumps({'arrays': specs, 'values': values}).encode('utf-8')
+    start = _align(len(MAGIC) + 8 + len(header))
+
+    # Step 2: Write the header and the padded arrays
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array([len(header)], dtype='<u8').tobytes())
+            f.write(header)
+            for key, value in arrays.items():
+                f.write(b"\x00" * (start + specs[key]['offset'] - f.tell()))
+                f.write(value.tobytes(order='A'))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def convert_scene(source: str, path: Union[str, None] = None) -> str:
+    """
+    Converts a pickled scene (a dict saved with np.save, like hw1/hw2/hw3.npy) into a scene file.
+
+    Parameters:
+    - source: Path of the .npy file.
+    - path: Path of the scene file (default: the source with the extension .scene).
+
+    Returns:
+    - The path of the scene file.
+    """
+    if path is None:
+        path = os.path.splitext(source)[0] + '.scene'
+    save_scene(path, np.load(source, allow_pickle=True).item())
+    return path
+
+
+def load_scene(path: str) -> Union[Scene, dict]:
+    """
+    Opens a scene in constant time, without unpickling or copying its arrays.
+
+    A pickled .npy scene is converted once into a scene file next to it (<name>.scene, made
+    again whenever the .npy file is newer) and that file is opened instead. If the folder is
+    not writable, the pickled dict is returned as is.
+
+    Parameters:
+    - path: Path of a scene file, or of a pickled .npy scene.
+
+    Returns:
+    - The Scene (a read-only dict of memory-mapped arrays and scalars), cached per process.
+    """
+    if path.endswith('.npy'):
+        source, path = path, os.path.splitext(path)[0] + '.scene'
+        if not os.path.exists(path) or os.stat(path).st_mtime_ns < os.stat(source).st_mtime_ns:
+            try:
+                convert_scene(source, path)
+            except OSError:
+                return np.load(source, allow_pickle=True).item()
+
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _opened:
+        _opened[key] = Scene(path)
+    return _opened[key]
+
+
+def _align(n: int) -> int:
+    """
+    n rounded up to a multiple of ALIGN.
+    """
+    return -(-n // ALIGN) * ALIGN
+
+
+# Converter: python scene_file.py hw1.npy [more .npy files]
+if __name__ == "__main__":
+    for source in sys.argv[1:]:
+        print(f"{source} -> {convert_scene(source)}")
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# scene = load_scene("hw1.npy")  # converts hw1.npy into hw1.scene the first time
+# print(scene)
+# print(type(scene["v_uvs"]), scene["v_uvs"].shape, scene["v_uvs"].flags['WRITEABLE'])
+# print(scene["t_pos_idx"][:2])
@@ -0,0 +1,263 @@
+import numpy as np
+from vector_interp import vector_interp_array
+from precision import to_framebuffer
+
+# Maximum number of candidate pixels processed at once by fill_triangles
+BATCH_PIXELS = 1 << 22
+
+class ScanlineSetup:
+    def __init__(self, V, n, y_min, y_max):
+        """
+        Struct-of-arrays scanline setup of many triangles (see setup_scanlines): what
+        scanline_pixels derives from the vertices of a triangle before its first scanline.
+
+        setup[k] is the record of triangle k (the same fields without the triangle axis), the
+        form taken by scanline_pixels and t_shading.
+
+        :param V: (T x 3 x (n + D)) vertices of every triangle sorted by increasing y, each
+                  followed by its attributes (as floats)
+        :param n: Number of position coordinates of a vertex (x, y[, z])
+        :param y_min: (T,) first scanline of every triangle, clamped to the image
+        :param y_max: (T,) last scanline of every triangle, clamped to the image
+        """
+        self.V = V
+        self.n = n
+        self.y_min = y_min
+        self.y_max = y_max
+
+    def __len__(self):
+        return self.V.shape[0]
+
+    def __getitem__(self, key):
+        return ScanlineSetup(self.V[key], self.n, self.y_min[key], self.y_max[key])
+
+
+def setup_scanlines(vertices, faces, attributes, height):
+    """
+    Scanline setup of all triangles in one vectorized pass: sorts the vertices of every
+    triangle by y (carrying their attributes along) and clamps its range of scanlines, so
+    the rasterizer does not repeat this for every triangle. The records give exactly the
+    pixels and values of scanline_pixels without a setup.
+
+    :param vertices: (m x n) array of vertex positions (x, y[, z])
+    :param faces: (T x 3) array of the vertex indices of every triangle
+    :param attributes: (m x D) array of per-vertex attributes (e.g. UV coordinates)
+    :param height: Height of the image (scanlines are clamped to it)
+    :return: ScanlineSetup of the T triangles, in the order of faces
+    """
+    n = vertices.shape[1]
+    V = np.hstack([vertices, attributes]).astype(float)[faces]
+
+    # Sort the vertices of every triangle by increasing y-coordinate
+    sorted_indices = np.argsort(V[:, :, 1], axis=1)
+    V = np.take_along_axis(V, sorted_indices[:, :, None], axis=1)
+
+    # Vertical range of scanlines (clamped to image bounds, like max/min of scanline_pixels)
+    top, bottom = np.floor(V[:, 0, 1]), np.ceil(V[:, 2, 1])
+    y_min = np.clip(np.where(top > 0, top, 0), 0, height).astype(int)
+    y_max = np.clip(np.where(bottom < height - 1, bottom, height - 1), -1, height - 1).astype(int)
+
+    return ScanlineSetup(V, n, y_min, y_max)
+
+
+def scanline_pixels(vertices, attributes, height, width, setup=None):
+    """
+    Scanline traversal of a triangle: finds the pixels of all its spans and interpolates the
+    vertex attributes at them, first along the edges (span endpoints), then along every span.
+
+    :param vertices: (3 x n) array of vertex positions (x, y[, z]), as floats
+    :param attributes: (3 x D) array of per-vertex attributes (e.g. UV coordinates), as floats
+    :param height: Height of the image (scanlines are clamped to it)
+    :param width: Width of the image (spans are clamped to it)
+    :param setup: Optional record of the triangle (setup[k] of setup_scanlines): its sorted
+                  vertices and scanline range are used instead of being computed again
+    :return: ys, xs: (P,) pixel coordinates, span by span from the top;
+             attr_P: (P x (1 + D)) last position coordinate (the depth for 3D vertices)
+             followed by the attributes at every pixel
+    """
+    n = vertices.shape[1]
+    if setup is not None:
+        # Sorted vertices and range of scanlines from the triangle setup
+        V1, V2, V3 = setup.V
+        y_min, y_max = int(setup.y_min), int(setup.y_max)
+    else:
+        # Sort vertices by increasing y-coordinate for scanline rasterization, carrying along
+        # the edges the vertex position followed by its attributes
+        sorted_indices = np.argsort(vertices[:, 1])
+        V1, V2, V3 = np.hstack([vertices, attributes])[sorted_indices]
+
+        # Determine the vertical range of scanlines (clamped to image bounds)
+        y_min = int(max(0, np.floor(V1[1])))
+        y_max = int(min(height - 1, np.ceil(V3[1])))
+    C1, C2, C3 = V1[:n], V2[:n], V3[:n]
+    ys = np.arange(y_min, y_max + 1)
+    if ys.size == 0:
+        return ys, ys.copy(), np.empty((0, V1.size - n + 1))
+
+    # Interpolate point A and its attributes between C1 and C2 (top half) or C2 and C3 (bottom half)
+    top = (ys < C2[1])[:, None]
+    A = np.where(top, vector_interp_array(C1, C2, V1, V2, ys, 2), vector_interp_array(C2, C3, V2, V3, ys, 2))
+
+    # Interpolate point B and its attributes between C1 and C3
+    B = vector_interp_array(C1, C3, V1, V3, ys, 2)
+
+    # Ensure A is to the left of B (for left-to-right horizontal interpolation)
+    swap = (A[:, 0] > B[:, 0])[:, None]
+    A, B = np.where(swap, B, A), np.where(swap, A, B)
+
+    # Determine horizontal range of pixels of every span (clamped to image bounds)
+    x_min = np.maximum(0, np.floor(A[:, 0])).astype(int)
+    x_max = np.minimum(width - 1, np.ceil(B[:, 0])).astype(int)
+    counts = np.maximum(x_max - x_min + 1, 0)
+
+    # Expand the spans into pixels (row of each pixel, then its x coordinate)
+    row = np.repeat(np.arange(ys.size), counts)
+    xs = x_min[row] + np.arange(row.size) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Interpolate the depth and the attributes at every pixel of every span
+    attr_P = vector_interp_array(A[row], B[row], A[row, n - 1:], B[row, n - 1:], xs, 1)
+
+    return ys[row], xs, attr_P
+
+
+def scanline_pixels_batch(setup, width):
+    """
+    Scanline traversal of many triangles at once: the spans of all triangles of a setup are
+    found and interpolated with the same array operations as scanline_pixels, so every
+    triangle gets exactly its pixels and values, without a Python loop over the triangles.
+
+    :param setup: ScanlineSetup of the triangles (see setup_scanlines)
+    :param width: Width of the image (spans are clamped to it)
+    :return: tri: (P,) index of the triangle of every pixel (into setup);
+             ys, xs, attr_P: as in scanline_pixels, triangle by triangle in setup order
+    """
+    n = setup.n
+
+    # Scanlines of every triangle (triangle of each scanline, then its y coordinate)
+    rows = np.maximum(setup.y_max - setup.y_min + 1, 0)
+    tri = np.repeat(np.arange(len(setup)), rows)
+    ys = setup.y_min[tri] + np.arange(tri.size) - np.repeat(np.cumsum(rows) - rows, rows)
+    V1, V2, V3 = setup.V[tri, 0], setup.V[tri, 1], setup.V[tri, 2]
+    C1, C2, C3 = V1[:, :n], V2[:, :n], V3[:, :n]
+    if ys.size == 0:
+        return tri, ys, ys.copy(), np.empty((0, V1.shape[1] - n + 1))
+
+    # Interpolate point A and its attributes between C1 and C2 (top half) or C2 and C3 (bottom half)
+    top = (ys < C2[:, 1])[:, None]
+    A = np.where(top, vector_interp_array(C1, C2, V1, V2, ys, 2), vector_interp_array(C2, C3, V2, V3, ys, 2))
+
+    # Interpolate point B and its attributes between C1 and C3
+    B = vector_interp_array(C1, C3, V1, V3, ys, 2)
+
+    # Ensure A is to the left of B (for left-to-right horizontal interpolation)
+    swap = (A[:, 0] > B[:, 0])[:, None]
+    A, B = np.where(swap, B, A), np.where(swap, A, B)
+
+    # Determine horizontal range of pixels of every span (clamped to image bounds)
+    x_min = np.maximum(0, np.floor(A[:, 0])).astype(int)
+    x_max = np.minimum(width - 1, np.ceil(B[:, 0])).astype(int)
+    counts = np.maximum(x_max - x_min + 1, 0)
+
+    # Expand the spans into pixels (row of each pixel, then its x coordinate)
+    row = np.repeat(np.arange(ys.size), counts)
+    xs = x_min[row] + np.arange(row.size) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Interpolate the depth and the attributes at every pixel of every span
+    attr_P = vector_interp_array(A[row], B[row], A[row, n - 1:], B[row, n - 1:], xs, 1)
+
+    return tri[row], ys[row], xs, attr_P
+
+
+def fill_triangles(img, triangles, flat_colors, depths=None, zbuf=None, stats=None):
+    """
+    Fills many triangles with flat colors, writing directly into the image.
+
+    :param img: Image to draw on as a NumPy array (H x W x 3), modified in place
+    :param triangles: (n x 3 x 2) array of the x, y positions of every triangle's vertices
+    :param flat_colors: (n x 3) array of the color of every triangle (in the compute type)
+    :param depths: (n x 3) array of the depth of every triangle's vertices (with zbuf only)
+    :param zbuf: Optional DepthBuffer; without it the last triangle covering a pixel wins
+    :param stats: Optional RenderStats that counts the covered (tested) and written (shaded) pixels
+    :return: The same image with all triangles filled
+    """
+    H, W = img.shape[0], img.shape[1]
+
+    # Bounding box of every triangle (clamped to the image)
+    min_x = np.maximum(np.floor(np.min(triangles[:, :, 0], axis=1)).astype(int), 0)
+    max_x = np.minimum(np.ceil(np.max(triangles[:, :, 0], axis=1)).astype(int), W - 1)
+    min_y = np.maximum(np.floor(np.min(triangles[:, :, 1], axis=1)).astype(int), 0)
+    max_y = np.minimum(np.ceil(np.max(triangles[:, :, 1], axis=1)).astype(int), H - 1)
+    box_w = np.maximum(max_x - min_x + 1, 0)
+    box_h = np.maximum(max_y - min_y + 1, 0)
+    counts = box_w * box_h
+
+    # Split the triangles into chunks with a bounded number of candidate pixels
+    ends = np.cumsum(counts)
+    start = 0
+    while start < triangles.shape[0]:
+        base = ends[start - 1] if start > 0 else 0
+        stop = max(int(np.searchsorted(ends, base + BATCH_PIXELS, side='right')), start + 1)
+        _fill_chunk(img, triangles[start:stop], flat_colors[start:stop],
+                    min_x[start:stop], min_y[start:stop], box_w[start:stop], counts[start:stop],
+                    depths[start:stop] if zbuf is not None else None, zbuf, stats)
+        start = stop
+
+    return img
+
+
+def _fill_chunk(img, triangles, flat_colors, min_x, min_y, box_w, counts, depths=None, zbuf=None, stats=None):
+    """
+    Rasterizes a chunk of triangles with flat colors (helper of fill_triangles).
+    """
+    total = int(np.sum(counts))
+    if total == 0:
+        return
+
+    # One candidate per bounding-box pixel, tagged with the triangle it belongs to
+    tri = np.repeat(np.arange(triangles.shape[0]), counts)
+    local = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    xs = min_x[tri] + local % box_w[tri]
+    ys = min_y[tri] + local // box_w[tri]
+
+    # Unpack triangle vertices for every candidate
+    A = triangles[tri, 0]
+    B = triangles[tri, 1]
+    C = triangles[tri, 2]
+
+    # Helper function to compute the cross product in 2D (used for point-in-triangle test)
+    def cross(a, b, px, py):
+        return (b[:, 0]-a[:, 0])*(py-a[:, 1]) - (b[:, 1]-a[:, 1])*(px-a[:, 0])
+
+    # Compute the edge functions for all candidates
+    d1 = cross(A, B, xs, ys)
+    d2 = cross(B, C, xs, ys)
+    d3 = cross(C, A, xs, ys)
+
+    # Determine which candidates lie inside their triangle using sign consistency
+    has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
+    has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
+    inside = ~(has_neg & has_pos)
+
+    if zbuf is not None:
+        # Interpolate the depth with the (unnormalized) barycentric weights d2, d3, d1
+        area = d1 + d2 + d3
+        z = depths[tri]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_pix = (d2 * z[:, 0] + d3 * z[:, 1] + d1 * z[:, 2]) / area
+        z_pix = np.where(area == 0, np.mean(z, axis=1), z_pix)
+
+        # Keep the nearest fragment at each pixel, if it passes the depth test
+        winners = np.flatnonzero(inside)[zbuf.resolve(ys[inside], xs[inside], z_pix[inside])]
+    else:
+        # Keep the last triangle drawn at each pixel (painter's order)
+        tri, xs, ys = tri[inside], xs[inside], ys[inside]
+        pixel = ys * img.shape[1] + xs
+        _, winners = np.unique(pixel[::-1], return_index=True)
+        winners = pixel.shape[0] - 1 - winners
+
+    if stats is not None:
+        stats.add('pixels_tested', np.count_nonzero(inside))
+        stats.add('pixels_shaded', winners.size)
+
+    # Fill all winning pixels at once
+    img[ys[winners], xs[winners]] = to_framebuffer(flat_colors[tri[winners]], img.dtype)
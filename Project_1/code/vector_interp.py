@@ -1,3 +1,5 @@
+import numpy as np
+
 def vector_interp(p1, p2, V1, V2, coord, dim):
     """
     Calculates the interpolated vector value using linear interpolation.
@@ -32,3 +34,40 @@ def vector_interp(p1, p2, V1, V2, coord, dim):
     # Linearly interpolate between V1 and V2 based on t
     V = (1 - t) * V1 + t * V2
     return V
+
+
+def vector_interp_array(p1, p2, V1, V2, coord, dim):
+    """
+    Array version of vector_interp: interpolates many vectors with one set of array operations.
+
+    Every argument may carry a leading axis of length K (one interpolation per entry), or be a
+    single point/vector shared by all entries. Entries whose endpoints have the same x or y value
+    return V1, exactly like vector_interp.
+
+    :param p1: Point(s) 1, shape (2+,) or (K x 2+)
+    :param p2: Point(s) 2, shape (2+,) or (K x 2+)
+    :param V1: Vector(s) at p1, shape (D,) or (K x D)
+    :param V2: Vector(s) at p2, shape (D,) or (K x D)
+    :param coord: (K,) coordinates of the points p (either x or y)
+    :param dim: 1 if interpolating along x, 2 if along y
+    :return: (K x D) array of interpolated vectors
+    """
+    if dim not in (1, 2):
+        raise ValueError("dim must be 1 (x) or 2 (y)")
+    axis = dim - 1
+
+    p1 = np.asarray(p1, dtype=float)
+    p2 = np.asarray(p2, dtype=float)
+    V1 = np.asarray(V1, dtype=float)
+    V2 = np.asarray(V2, dtype=float)
+    coord = np.asarray(coord)
+
+    # Distance along the chosen axis and interpolation factor t for every entry
+    denominator = p2[..., axis] - p1[..., axis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (coord - p1[..., axis]) / denominator
+
+        # Linearly interpolate, falling back to V1 where the points share the coordinate
+        V = (1 - t)[:, None] * V1 + t[:, None] * V2
+    degenerate = np.reshape(np.abs(denominator) < 1e-10, (-1, 1))
+    return np.where(degenerate, V1, V)
@@ -0,0 +1,263 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from lookat_func import lookat
+from perspective_project_func import perspective_project
+from rasterize_func import rasterize
+from cull_func import cull_triangles
+from t_shading_func import t_shading
+from render_img_func import render_img
+from render_object_func import render_object
+from render_animation_func import render_animation, camera_pose, project_path
+from texture_cache_func import load_texture
+from scene_file_func import Scene, load_scene
+
+
+# ----------------------------------------------------------------------------
+# Benchmark harness (the same in every project)
+# ----------------------------------------------------------------------------
+
+def measure(name, fn, repeat=3, number=1, triangles=0, pixels=None):
+    """
+    Times one benchmark case.
+
+    fn is called once to warm up, then `repeat` times `number` calls are timed (the median
+    sample is reported, per call), and one more call runs under tracemalloc for the peak
+    memory allocated by the call. Anything fn prints is discarded.
+
+    Parameters:
+    - name: Name of the case.
+    - fn: Function without arguments running the case.
+    - repeat: Number of timing samples.
+    - number: Calls per timing sample (for very short cases).
+    - triangles: Triangles processed by one call.
+    - pixels: Pixels shaded by one call; None counts them in the result of the warm-up call
+      (see count_pixels).
+
+    Returns:
+    - Dict with the timings, the throughputs and the peak memory of the case.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = fn()
+        if pixels is None:
+            pixels = count_pixels(out)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    seconds = float(np.median(samples))
+    return {
+        'name': name,
+        'seconds': seconds,
+        'min_seconds': float(np.min(samples)),
+        'repeat': repeat,
+        'number': number,
+        'triangles': int(triangles),
+        'pixels': int(pixels),
+        'triangles_per_s': triangles / seconds if seconds > 0 else 0.0,
+        'pixels_per_s': pixels / seconds if seconds > 0 else 0.0,
+        'peak_bytes': int(peak),
+    }
+
+
+def count_pixels(img):
+    """
+    Number of pixels of an image that differ from the white background (1, or 255 for uint8
+    images). A case may also return its pixel count directly (e.g. summed over several
+    frames); anything else counts 0.
+    """
+    if isinstance(img, (int, np.integer)):
+        return int(img)
+    if not isinstance(img, np.ndarray) or img.ndim != 3:
+        return 0
+    return int(np.count_nonzero(np.any(img != (255 if img.dtype == np.uint8 else 1), axis=2)))
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compares results with a baseline run and prints the ratio of every case.
+
+    A case regresses when it is more than `tolerance` (relative) slower than in the baseline,
+    or when its peak memory grew by more than `tolerance`.
+
+    Parameters:
+    - results: List of case dicts (see measure).
+    - baseline: Contents of a JSON file written by an earlier run.
+    - tolerance: Allowed relative slowdown / memory growth.
+
+    Returns:
+    - List of the names of the regressed cases.
+    """
+    base = {case['name']: case for case in baseline['results']}
+    regressions = []
+    for case in results:
+        ref = base.get(case['name'])
+        if ref is None:
+            print(f"{case['name']:<32} (not in baseline)")
+            continue
+
+        time_ratio = case['seconds'] / ref['seconds'] if ref['seconds'] > 0 else 1.0
+        mem_ratio = case['peak_bytes'] / ref['peak_bytes'] if ref['peak_bytes'] > 0 else 1.0
+        regressed = time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(case['name'])
+        print(f"{case['name']:<32} time x{time_ratio:6.2f}  memory x{mem_ratio:6.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main(project, cases):
+    """
+    Command line entry point: runs the cases, writes the JSON report and optionally
+    compares it with a baseline (exit status 1 on regressions).
+
+    Parameters:
+    - project: Name of the project (stored in the report).
+    - cases: List of (name, fn, options) with the keyword options of measure.
+    """
+    parser = argparse.ArgumentParser(description=f"Benchmarks of {project}")
+    parser.add_argument('--repeat', type=int, default=3, help="timing samples per case")
+    parser.add_argument('--only', default=None, help="run only the cases whose name contains this text")
+    parser.add_argument('--out', default='benchmark.json', help="JSON report to write")
+    parser.add_argument('--baseline', default=None, help="JSON report of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = []
+    for name, fn, options in cases:
+        if args.only and args.only not in name:
+            continue
+        case = measure(name, fn, repeat=args.repeat, **options)
+        results.append(case)
+        print(f"{name:<32} {case['seconds'] * 1e3:10.3f} ms  {case['triangles_per_s']:12.0f} tri/s  "
+              f"{case['pixels_per_s']:12.0f} px/s  {case['peak_bytes'] / 2**20:8.2f} MiB")
+
+    report = {
+        'project': project,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved as {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+# ----------------------------------------------------------------------------
+# Project 2 cases (hw2.npy, first frame of the forward animation)
+# ----------------------------------------------------------------------------
+
+# Frames rendered by the animation case
+N_FRAMES = 10
+
+# Frames of the geometry-stage cases (the whole 5 s clip at 25 fps)
+N_CLIP = 125
+
+def build_cases():
+    data = load_scene("hw2.npy")
+    texImg = load_texture("stone-72_diffuse.jpg")
+
+    v_pos = data['v_pos'].T
+    v_uvs = data['v_uvs']
+    t_pos_idx = np.array(data['t_pos_idx'])
+    v_clr = np.ones_like(v_pos)
+    up = data['k_cam_up'].flatten()
+    plane_h, plane_w, focal = data['k_sensor_height'], data['k_sensor_width'], data['k_f']
+    n_tri = t_pos_idx.shape[0]
+
+    # Projected mesh, as in render_object
+    eye, target = camera_pose(data, 0, mode='forward')
+    R, t = lookat(eye, up, target)
+    projected_pts, depth = perspective_project(v_pos.T, focal, R, t)
+    pixel_coords = rasterize(projected_pts, plane_w, plane_h, 512, 512).T
+    vertices_2d = np.hstack([pixel_coords, depth.T.flatten()[:, None]])
+    faces_sorted = t_pos_idx[np.argsort(-np.mean(depth.flatten()[t_pos_idx], axis=1))]
+
+    def t_shading_all():
+        img = np.ones((512, 512, 3))
+        for tri in faces_sorted:
+            img = t_shading(img, vertices_2d[tri], v_uvs[tri], texImg, v_clr[tri])
+        return img
+
+    def render(**kw):
+        return lambda: render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, 512, 512, focal, eye, up, target,
+                                     v_uvs, texImg, **kw)
+
+    def geometry_frames():
+        # Geometry stage of a whole clip, one frame at a time
+        out = []
+        for frame in range(N_CLIP):
+            cam_pos, cam_target = camera_pose(data, frame, mode='forward')
+            R_f, t_f = lookat(cam_pos, up, cam_target)
+            out.append(perspective_project(v_pos.T, focal, R_f, t_f))
+        return out
+
+    def animation():
+        # Shaded pixels of all frames
+        return sum(count_pixels(img) for _, img in render_animation(data, texImg, n_frames=N_FRAMES, workers=1))
+
+    return [
+        ('load_npy', lambda: np.load("hw2.npy", allow_pickle=True).item(), dict(number=10)),
+        ('load_scene', lambda: Scene("hw2.scene"), dict(number=10)),
+        ('lookat', lambda: lookat(eye, up, target), dict(number=1000)),
+        ('perspective_project', lambda: perspective_project(v_pos.T, focal, R, t), dict(number=1000)),
+        ('geometry_per_frame', geometry_frames, dict(pixels=0)),
+        ('project_path', lambda: project_path(data, np.arange(N_CLIP), mode='forward'), dict(number=100, pixels=0)),
+        ('rasterize', lambda: rasterize(projected_pts, plane_w, plane_h, 512, 512), dict(number=1000)),
+        ('cull_triangles', lambda: cull_triangles(rasterize(projected_pts, plane_w, plane_h, 512, 512, clip=False),
+                                                  depth, t_pos_idx.T, 512, 512), dict(number=1000, triangles=n_tri)),
+        ('t_shading', t_shading_all, dict(triangles=n_tri)),
+        ('render_img', lambda: render_img(t_pos_idx, vertices_2d, v_clr, v_uvs, depth.T.flatten(), texImg),
+         dict(triangles=n_tri)),
+        ('render_object', render(), dict(triangles=n_tri)),
+        ('render_object_zbuffer_cull', render(zbuffer=True, cull='back'), dict(triangles=n_tri)),
+        ('render_object_cull_clusters', render(zbuffer=True, cull='back', clusters=True),
+         dict(triangles=n_tri)),
+        ('render_object_lod', render(lod=True), dict(triangles=n_tri)),
+        ('render_object_trilinear', render(tex_filter='trilinear'), dict(triangles=n_tri)),
+        ('render_object_uint8', render(precision='uint8'), dict(triangles=n_tri)),
+        ('render_object_numba', render(backend='numba'), dict(triangles=n_tri)),
+        ('render_animation', animation, dict(triangles=n_tri * N_FRAMES)),
+    ]
+
+
+if __name__ == "__main__":
+    main("Project_2", build_cases())
+
+
+
+
+# # Example usage (run from this folder)
+
+# # python benchmark.py --out baseline.json
+# # ... change the code ...
+# # python benchmark.py --out new.json --baseline baseline.json --tolerance 0.1
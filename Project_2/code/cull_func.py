@@ -0,0 +1,123 @@
+import numpy as np
+from typing import Optional
+
+# Supported culling modes: None (no culling), 'none' (only triangles that cannot produce any
+# pixel), 'back' (also back-facing ones), 'front' (also front-facing ones)
+CULL_MODES = (None, 'none', 'back', 'front')
+
+def cull_triangles(pixel_pts: np.ndarray, depth: np.ndarray, t_pos_idx: np.ndarray, res_w: int, res_h: int,
+                   mode: Optional[str] = 'back', stats: Optional[dict] = None) -> np.ndarray:
+    """
+    Decides for all triangles at once which ones have to be rasterized.
+
+    A triangle is rejected if
+    - all its vertices lie behind the camera (depth >= 0, the camera looks down -z),
+    - it lies entirely outside the image,
+    - it has zero area once its vertices are clamped onto the image (as rasterize does),
+    - it faces away from the camera ('back') or towards it ('front').
+
+    Facing is taken from the winding in pixel space: with the y axis pointing down, a
+    counter-clockwise (front-facing) triangle has a negative signed area. Triangles that
+    are only partly behind the camera are kept, since they are not clipped.
+
+    Parameters:
+    - pixel_pts: 2 x Nv pixel coordinates of the vertices, NOT clamped to the image
+      (rasterize(..., clip=False)).
+    - depth: Nv camera-space depths of the vertices (from perspective_project).
+    - t_pos_idx: 3 x Nt array of triangle indices (0-based).
+    - res_w, res_h: Resolution of the image.
+    - mode: One of CULL_MODES.
+    - stats: Optional dict; the number of triangles removed by each test is added to it
+      ('culled_behind', 'culled_offscreen', 'culled_degenerate', 'culled_facing'), together
+      with 'triangles_in' and 'triangles_out'.
+
+    Returns:
+    - Nt boolean mask of the triangles to keep.
+    """
+    if mode not in CULL_MODES:
+        raise ValueError(f"Unknown culling mode: {mode}")
+
+    pixel_pts = np.asarray(pixel_pts, dtype=float)
+    depth = np.asarray(depth, dtype=float).flatten()
+    t_pos_idx = np.asarray(t_pos_idx)
+    Nt = t_pos_idx.shape[1]
+
+    if mode is None:
+        keep = np.ones(Nt, dtype=bool)
+        _add_stats(stats, Nt, [('culled_behind', 0), ('culled_offscreen', 0), ('culled_degenerate', 0),
+                               ('culled_facing', 0)])
+        return keep
+
+    # Coordinates of the three vertices of every triangle (3 x Nt each)
+    x = pixel_pts[0, t_pos_idx]
+    y = pixel_pts[1, t_pos_idx]
+    z = depth[t_pos_idx]
+
+    # Step 1: Entirely behind the camera
+    behind = np.all(z >= 0, axis=0)
+
+    # Step 2: Entirely outside the image
+    offscreen = (np.all(x < 0, axis=0) | np.all(x > res_w - 1, axis=0) |
+                 np.all(y < 0, axis=0) | np.all(y > res_h - 1, axis=0))
+
+    # Step 3: Zero area after clamping onto the image
+    cx = np.clip(x, 0, res_w - 1)
+    cy = np.clip(y, 0, res_h - 1)
+    degenerate = _signed_area(cx, cy) == 0
+
+    # Step 4: Facing, from the winding of the unclamped triangle
+    area = _signed_area(x, y)
+    if mode == 'back':
+        facing = area > 0
+    elif mode == 'front':
+        facing = area < 0
+    else:
+        facing = np.zeros(Nt, dtype=bool)
+
+    # Count every rejected triangle once, under the first test that removes it
+    removed = np.zeros(Nt, dtype=bool)
+    counts = []
+    for name, test in [('culled_behind', behind), ('culled_offscreen', offscreen),
+                       ('culled_degenerate', degenerate), ('culled_facing', facing)]:
+        counts.append((name, int(np.count_nonzero(test & ~removed))))
+        removed |= test
+
+    keep = ~removed
+    _add_stats(stats, Nt, counts)
+    return keep
+
+
+def _signed_area(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Twice the signed area of triangles given by 3 x Nt vertex coordinates.
+    """
+    return (x[1] - x[0]) * (y[2] - y[0]) - (y[1] - y[0]) * (x[2] - x[0])
+
+
+def _add_stats(stats: Optional[dict], Nt: int, counts: list) -> None:
+    """
+    Accumulates the culling counters into stats (if given).
+    """
+    if stats is None:
+        return
+    for name, count in counts:
+        stats[name] = stats.get(name, 0) + count
+    stats['triangles_in'] = stats.get('triangles_in', 0) + Nt
+    stats['triangles_out'] = stats.get('triangles_out', 0) + Nt - sum(count for _, count in counts)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# # Two triangles in pixel coordinates: the first faces away from the camera, the second towards it
+# pixel_pts = np.array([
+#     [10, 10, 50, 60, 100, 100],   # x
+#     [50, 10, 10, 60, 100, 60]     # y
+# ])
+# depth = -np.ones(6)
+# t_pos_idx = np.array([[0, 3], [1, 4], [2, 5]])
+
+# stats = {}
+# keep = cull_triangles(pixel_pts, depth, t_pos_idx, 128, 128, mode='back', stats=stats)
+# print(keep, stats)
@@ -1,86 +1,43 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from PIL import Image
 import os
 
-from render_object_func import render_object
-from make_video_from_frames_func import make_video_from_frames
+from render_animation_func import render_animation, camera_path
+from make_video_from_frames_func import write_video
+from texture_cache_func import load_texture
+from scene_file_func import load_scene
 
 
-def generate_target_demo(demo_id, mode='forward' or 'target'):
+def generate_target_demo(demo_id, mode='forward' or 'target', n_frames=None, workers=None, save_frames=False):
     # Load data
-    data = np.load("hw2.npy", allow_pickle=True).item()
-    texImg = np.asarray(Image.open("stone-72_diffuse.jpg")) / 255.0
+    data = load_scene("hw2.npy")  # memory-mapped hw2.scene (converted once), shared by the workers
+    texImg = load_texture("stone-72_diffuse.jpg")  # uint8, memory-mapped (shared by the workers)
 
-    # Object data
-    v_pos = data['v_pos'].T
-    v_uvs = data['v_uvs']
-    t_pos_idx = np.array(data['t_pos_idx'])
-    v_clr = np.ones_like(v_pos)
+    # Output folder (only needed for the PNG frames)
+    if save_frames:
+        os.makedirs(f'demo_{demo_id}', exist_ok=True)
 
-    # Scene parameters
-    center = data['k_road_center']
-    radius = data['k_road_radius']
-    speed = data['car_velocity']
-    cam_offset = data['k_cam_car_rel_pos']
-    duration = data['k_duration']
-    fps = data['k_fps']
-    up = data['k_cam_up'].flatten()
-    focal = data['k_f']
-    plane_h = data['k_sensor_height']
-    plane_w = data['k_sensor_width']
-    res_h = res_w = 512
-    k_cam_target = data['k_cam_target']
+    # Cameras of all frames at once (for the log)
+    if n_frames is None:
+        n_frames = data['k_duration'] * data['k_fps']
+    cam_positions, targets = camera_path(data, np.arange(n_frames), mode='target')
 
+    def frames():
+        # Render the frames in parallel (in order) and pass them on as they arrive
+        for frame, img in render_animation(data, texImg, mode='target', n_frames=n_frames, workers=workers):
+            cam_pos, target = cam_positions[frame], targets[frame]
 
-    # Output folder
-    os.makedirs(f'demo_{demo_id}', exist_ok=True)
+            # Save frame (optional)
+            if save_frames:
+                plt.imsave(f'demo_{demo_id}/frame_{frame:03d}.png', img)
+            print(f"Frame {frame}, cam_pos: {cam_pos}, target: {target}")
 
-    total_frames = duration * fps
-    omega = speed / radius  # angular velocity (rad/s)
+            yield img
 
-    for frame in range(total_frames):
-        t = frame / fps
-        theta = omega * t
+    # Encode the video straight from the rendered frames
+    write_video(frames(), f"demo_{demo_id}_video")
 
-        # Car position on the circle
-        car_pos = center + radius * np.array([np.cos(theta), 0, np.sin(theta)])
 
-        # Velocity direction (tangent to the circle)
-        tangent = np.array([-np.sin(theta), 0, np.cos(theta)])
-        tangent /= np.linalg.norm(tangent)
-
-        # Camera world position
-        cam_pos = car_pos + cam_offset
-
-        # Camera look direction is at specified target
-        target = k_cam_target
-
-        # Render frame
-        img = render_object(
-            v_pos=v_pos,
-            v_clr=v_clr,
-            t_pos_idx=t_pos_idx,
-            plane_h=plane_h,
-            plane_w=plane_w,
-            res_h=res_h,
-            res_w=res_w,
-            focal=focal,
-            eye=cam_pos,
-            up=up,
-            target=target,
-            v_uvs=v_uvs,
-            texImg=texImg
-        )
-
-        # Save frame
-        plt.imsave(f'demo_{demo_id}/frame_{frame:03d}.png', img)
-        print(f"Frame {frame}, cam_pos: {cam_pos}, target: {target}, tangent: {tangent}")
-
-
-
-# Generate demo
-generate_target_demo(demo_id='target', mode='target')
-
-# Make video from the generated frames
-make_video_from_frames("demo_target", "demo_target_video")
\ No newline at end of file
+if __name__ == "__main__":
+    # Generate the demo and its video
+    generate_target_demo(demo_id='target', mode='target')
@@ -0,0 +1,81 @@
+import numpy as np
+
+class DepthBuffer:
+    def __init__(self, res_h: int, res_w: int) -> None:
+        """
+        Per-pixel depth buffer used for hidden-surface removal.
+
+        Fragments are compared by their distance from the camera plane, abs(depth), so it
+        works both with the positive depths of hw1.npy and with the negative camera-space z
+        produced by perspective_project. A fragment is visible if it is strictly nearer than
+        what is already stored, so on ties the first triangle drawn wins.
+
+        Parameters:
+        - res_h, res_w: Size of the image the buffer belongs to.
+        """
+        self.depth = np.full((res_h, res_w), np.inf)  # Nearest distance stored per pixel
+        self.tested = 0                               # Number of fragments depth-tested
+        self.passed = 0                               # Number of fragments that passed
+
+    def test(self, ys: np.ndarray, xs: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """
+        Early depth test for the fragments of one triangle (each pixel at most once).
+        The depth of the passing fragments is written to the buffer.
+
+        Parameters:
+        - ys, xs: (P,) pixel coordinates of the fragments.
+        - z: (P,) interpolated depth of the fragments.
+
+        Returns:
+        - (P,) boolean mask of the visible fragments.
+        """
+        dist = np.abs(z)
+        visible = dist < self.depth[ys, xs]
+        self.depth[ys[visible], xs[visible]] = dist[visible]
+
+        self.tested += visible.size
+        self.passed += int(np.count_nonzero(visible))
+        return visible
+
+    def test_pixel(self, y: int, x: int, z: float) -> bool:
+        """
+        Scalar version of test() for per-pixel rasterization loops.
+        """
+        dist = abs(z)
+        self.tested += 1
+        if dist < self.depth[y, x]:
+            self.depth[y, x] = dist
+            self.passed += 1
+            return True
+        return False
+
+    def resolve(self, ys: np.ndarray, xs: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """
+        Depth test for fragments of many triangles at once, where a pixel may appear several
+        times. Fragments must be given in drawing order. For every pixel only the nearest
+        fragment is kept (the earliest one on ties), and only if it is nearer than the
+        stored depth, which is then updated.
+
+        Parameters:
+        - ys, xs: (P,) pixel coordinates of the fragments.
+        - z: (P,) interpolated depth of the fragments.
+
+        Returns:
+        - (K,) indices of the visible fragments.
+        """
+        dist = np.abs(z)
+        pixel = ys * self.depth.shape[1] + xs
+
+        # Sort by pixel, then distance, then drawing order and keep the first of each pixel
+        order = np.lexsort((np.arange(pixel.size), dist, pixel))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = pixel[order[1:]] != pixel[order[:-1]]
+        nearest = order[first]
+
+        # Compare with what is already in the buffer
+        visible = nearest[dist[nearest] < self.depth[ys[nearest], xs[nearest]]]
+        self.depth[ys[visible], xs[visible]] = dist[visible]
+
+        self.tested += pixel.size
+        self.passed += visible.size
+        return visible
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import kernel_backend_func
+from kernel_backend_func import KernelBackend, NUMBA_AVAILABLE, get_backend
+from triangle_kernel_func import scanline_pixels, setup_scanlines
+from rasterize_func import rasterize
+from render_object_func import render_object
+from render_animation_func import camera_pose, project_path
+from texture_cache_func import load_texture
+
+# Tests of the kernel backends on the frames of the hw2.npy animations: the JIT kernels must
+# give the same coverage and the same images as the NumPy kernels. Their bodies are plain
+# Python when Numba is not installed (_jit is the identity), so they are checked here as
+# interpreted code; only the test of the compiled kernels needs Numba.
+# Run with: python -m pytest kernel_backend_func_test.py
+
+data = np.load("hw2.npy", allow_pickle=True).item()
+texImg = load_texture("stone-72_diffuse.jpg")
+v_pos = data['v_pos'].T
+v_clr = np.ones_like(v_pos)
+t_pos_idx = np.array(data['t_pos_idx'])
+up = data['k_cam_up'].flatten()
+frames = np.arange(0, data['k_duration'] * data['k_fps'], 5)
+
+JIT_KERNELS = ('_lerp', '_scanline', '_fetch')
+
+
+@pytest.fixture(scope="module")
+def interpreted():
+    """
+    Backend made of the JIT kernels run as Python (the py_func of every kernel if Numba
+    compiled them).
+    """
+    patch = pytest.MonkeyPatch()
+    for name in JIT_KERNELS:
+        kernel = getattr(kernel_backend_func, name)
+        patch.setattr(kernel_backend_func, name, getattr(kernel, 'py_func', kernel))
+    yield KernelBackend('numba (interpreted)', kernel_backend_func._scanline_pixels_jit,
+                        kernel_backend_func._texels_jit)
+    patch.undo()
+
+
+def render(frame, mode, backend, **kwargs):
+    eye, target = camera_pose(data, frame, mode)
+    return render_object(v_pos, v_clr, t_pos_idx, data['k_sensor_height'], data['k_sensor_width'], 512, 512,
+                         data['k_f'], eye, up, np.ravel(target), data['v_uvs'], texImg, backend=backend, **kwargs)
+
+
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_scanline_pixels(interpreted, mode):
+    projected, depths = project_path(data, frames, mode)
+    attributes = np.hstack([data['v_uvs'], v_clr])
+    for f in range(frames.size):
+        pixels = rasterize(projected[f], data['k_sensor_width'], data['k_sensor_height'], 512, 512).T
+        vertices = np.hstack([pixels, depths[f][:, None]])
+        setup = setup_scanlines(vertices, t_pos_idx, attributes, 512)
+        for k, face in enumerate(t_pos_idx):
+            for record in (None, setup[k]):
+                expected = scanline_pixels(vertices[face], attributes[face], 512, 512, record)
+                result = interpreted.scanline_pixels(vertices[face], attributes[face], 512, 512, record)
+                # Same pixels (coverage) in the same order, same interpolated depth, UVs and colors
+                for a, b in zip(expected, result):
+                    assert np.array_equal(a, b), (frames[f], k)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_texels(interpreted, dtype):
+    rng = np.random.default_rng(0)
+    ty = rng.integers(0, texImg.shape[0], 10000)
+    tx = rng.integers(0, texImg.shape[1], 10000)
+    for tex in (texImg, np.asarray(texImg) / 255.0):
+        expected = get_backend('numpy').texels(tex, ty, tx, dtype)
+        result = interpreted.texels(tex, ty, tx, dtype)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_render_object(interpreted, mode):
+    for frame in frames:
+        assert np.array_equal(render(frame, mode, interpreted), render(frame, mode, 'numpy')), frame
+
+
+@pytest.mark.parametrize("options", [dict(zbuffer=True), dict(precision='float32'), dict(precision='uint8'),
+                                     dict(tex_filter='trilinear'), dict(cull='back')])
+def test_render_object_options(interpreted, options):
+    for frame in frames[::5]:
+        expected = render(frame, 'target', 'numpy', **options)
+        result = render(frame, 'target', interpreted, **options)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected), frame
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="Numba is not installed")
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_compiled(mode):
+    assert get_backend('numba').name == 'numba'
+    for frame in frames:
+        assert np.array_equal(render(frame, mode, 'numba'), render(frame, mode, 'numpy')), frame
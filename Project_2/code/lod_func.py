@@ -0,0 +1,401 @@
+import heapq
+import itertools
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import List
+from world2view_func import world2view
+
+# Every level has about LOD_RATIO times the triangles of the previous one, down to LOD_MIN_TRIANGLES
+LOD_RATIO = 0.5
+LOD_MIN_TRIANGLES = 32
+
+# Collapses stop once the surface would deviate (rms, per unit area) by more than this
+# fraction of the diagonal of its bounding box
+LOD_MAX_DEVIATION = 0.01
+
+# Automatic selection: average screen area (in pixels) a triangle should at least cover
+LOD_PIXELS = 16.0
+
+# Weight of the texture coordinates in the error metric, relative to the size of the mesh
+# (a UV shift of 1 costs as much as moving across the whole bounding box)
+UV_WEIGHT = 1.0
+
+# LOD chains of recently seen meshes, keyed by a hash of their content (LRU order)
+LOD_CACHE_SIZE = 8
+_lod_cache = OrderedDict()
+
+class MeshLOD:
+    def __init__(self, v_pos: np.ndarray, v_uvs: np.ndarray, t_pos_idx: np.ndarray, vertex_ids: np.ndarray,
+                 error: float = 0.0) -> None:
+        """
+        One level of detail of a mesh, in the layout of render_object.
+
+        Parameters:
+        - v_pos: (3, Nv') vertex positions.
+        - v_uvs: (Nv', 2) texture coordinates.
+        - t_pos_idx: (3, Nt') triangle indices (0-based).
+        - vertex_ids: (Nv',) index of every vertex in the full mesh (the vertex it was kept or
+          merged into), e.g. to pick per-vertex colors: v_clr[vertex_ids].
+        - error: Largest (area-weighted) quadric error of the edge collapses that produced the
+          level, to compare levels (0 for the full mesh).
+        """
+        self.v_pos = v_pos
+        self.v_uvs = v_uvs
+        self.t_pos_idx = t_pos_idx
+        self.vertex_ids = vertex_ids
+        self.error = error
+
+    @property
+    def n_triangles(self) -> int:
+        return self.t_pos_idx.shape[1]
+
+    def __repr__(self) -> str:
+        return f"MeshLOD({self.v_pos.shape[1]} vertices, {self.n_triangles} triangles)"
+
+
+class LODChain:
+    def __init__(self, levels: List[MeshLOD], center: np.ndarray, radius: float) -> None:
+        """
+        Levels of detail of a mesh, from the full mesh (level 0) to the coarsest one, with the
+        bounding sphere of the mesh used to choose between them.
+
+        Parameters:
+        - levels: The MeshLOD of every level, by decreasing triangle count.
+        - center, radius: Bounding sphere of the full mesh.
+        """
+        self.levels = levels
+        self.center = center
+        self.radius = radius
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def __getitem__(self, level: int) -> MeshLOD:
+        return self.levels[level]
+
+    def __repr__(self) -> str:
+        return f"LODChain({[lod.n_triangles for lod in self.levels]} triangles)"
+
+
+def build_lods(pts: np.ndarray, uvs: np.ndarray, t_pos_idx: np.ndarray, ratio: float = LOD_RATIO,
+               min_triangles: int = LOD_MIN_TRIANGLES, cache: bool = True) -> LODChain:
+    """
+    Precomputes the levels of detail of a textured mesh with quadric-error edge collapses
+    (Garland & Heckbert, with the texture coordinates in the quadrics).
+
+    Vertices with the same position and texture coordinates are merged first, so the
+    triangles share their edges. Every vertex then gets the sum of the quadrics of its
+    triangles over (x, y, z, u, v), and the edge whose collapse adds the least error is
+    collapsed first, the merged vertex moving to the position and UV that minimize the
+    error. Vertices on open edges, which include the UV seams (a seam splits the vertices),
+    are locked: they never move, so the outline and the texture layout are kept. Collapses
+    that would fold a triangle over in space or in UV space, or make the surface
+    non-manifold, are skipped. Snapshots of the run give the levels, and the chain is cached
+    by the content of the mesh (see calc_normals_func).
+
+    Vertex normals are recomputed from every level, so coarse levels are smooth where the
+    full mesh only repeats vertices to get flat (faceted) normals.
+
+    Parameters:
+    - pts: 3 x Nv array of vertex positions.
+    - uvs: Nv x 2 array of texture coordinates.
+    - t_pos_idx: 3 x Nt array of triangle indices (0-based).
+    - ratio: Triangle count of every level relative to the previous one.
+    - min_triangles: No level is made below this triangle count. The chain also ends when
+      no further collapse is allowed or the next one would exceed LOD_MAX_DEVIATION.
+    - cache: If False, the cache is neither read nor updated.
+
+    Returns:
+    - The LODChain; level 0 is the given mesh itself.
+    """
+    pts = np.ascontiguousarray(pts, dtype=np.float64)
+    uvs = np.ascontiguousarray(uvs, dtype=np.float64)
+    t_pos_idx = np.ascontiguousarray(t_pos_idx)
+
+    if cache:
+        key = _mesh_key(pts, uvs, t_pos_idx, ratio, min_triangles)
+        if key in _lod_cache:
+            _lod_cache.move_to_end(key)
+            return _lod_cache[key]
+
+    # Bounding sphere of the full mesh
+    lo, hi = np.min(pts, axis=1), np.max(pts, axis=1)
+    center = (lo + hi) / 2
+    radius = float(np.max(np.linalg.norm(pts - center[:, None], axis=0))) if pts.shape[1] else 0.0
+
+    levels = [MeshLOD(pts, uvs, t_pos_idx, np.arange(pts.shape[1]))]
+
+    # Step 1: Merge the vertices with the same position and texture coordinates and drop the
+    # triangles with invalid or repeated indices
+    valid = np.all((t_pos_idx >= 0) & (t_pos_idx < pts.shape[1]), axis=0)
+    _, first, weld = np.unique(np.hstack([pts.T, uvs]), axis=0, return_index=True, return_inverse=True)
+    faces = weld.ravel()[t_pos_idx[:, valid].T]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+
+    # Step 2: Collapse edges, taking a snapshot at every target triangle count
+    targets = []
+    n = faces.shape[0] * ratio
+    while n >= min_triangles and ratio > 0:
+        targets.append(int(n))
+        n *= ratio
+    if targets:
+        # Error bound: the quadrics are weighted by area, so scale the squared deviation by it
+        diagonal = float(np.linalg.norm(hi - lo))
+        corners = pts.T[first][faces]
+        area = 0.5 * np.sum(np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1))
+        max_cost = (LOD_MAX_DEVIATION * diagonal) ** 2 * area
+        for F, pos, uv, error in _decimate(pts.T[first], uvs[first], faces, targets, max(UV_WEIGHT * diagonal, 1e-12),
+                                           max_cost):
+            used, F = np.unique(F, return_inverse=True)
+            levels.append(MeshLOD(np.ascontiguousarray(pos[used].T), uv[used], F.reshape(-1, 3).T, first[used], error))
+
+    chain = LODChain(levels, center, radius)
+    if cache:
+        _lod_cache[key] = chain
+        while len(_lod_cache) > LOD_CACHE_SIZE:
+            _lod_cache.popitem(last=False)
+
+    return chain
+
+
+def select_lod(chain: LODChain, R: np.ndarray, t: np.ndarray, focal: float, plane_w: float, plane_h: float,
+               res_w: int, res_h: int, pixels: float = LOD_PIXELS) -> int:
+    """
+    Chooses the level of detail from the projected size of the bounding sphere: the finest
+    level whose triangles cover at least `pixels` pixels each on average, i.e. with at most
+    (screen area of the sphere) / pixels triangles. The full mesh is used when the camera is
+    inside the sphere or the sphere is (partly) behind it.
+
+    Parameters:
+    - chain: Levels of the mesh (build_lods).
+    - R, t: Camera rotation and position (lookat).
+    - focal, plane_w, plane_h, res_w, res_h: Projection and resolution, as in rasterize.
+    - pixels: Average screen area of a triangle below which a coarser level is used.
+
+    Returns:
+    - The level (index into chain).
+    """
+    c = world2view(np.reshape(chain.center, (3, 1)), R, t)[0]
+    D = np.linalg.norm(c)
+    if c[2] + chain.radius >= 0 or D <= chain.radius:
+        return 0
+
+    # Angular radius of the sphere, then its screen area (at most the whole image)
+    r_px = focal * max(res_w / plane_w, res_h / plane_h) * chain.radius / np.sqrt(D ** 2 - chain.radius ** 2)
+    area = min(np.pi * r_px ** 2, res_w * res_h)
+
+    for level, lod in enumerate(chain.levels):
+        if lod.n_triangles * pixels <= area:
+            return level
+    return len(chain) - 1
+
+
+def _decimate(pos: np.ndarray, uv: np.ndarray, faces: np.ndarray, targets: List[int], scale: float,
+              max_cost: float):
+    """
+    Greedy quadric-error edge collapses on an indexed mesh (helper of build_lods). Yields
+    (faces, positions, uvs, error) whenever the triangle count reaches the next target (or
+    once more, with the final mesh, when no collapse below max_cost is left); faces index
+    the vertex arrays.
+    """
+    pos, uv = pos.copy(), uv.copy()
+    Nv, Nt = pos.shape[0], faces.shape[0]
+    faces = faces.copy()
+
+    # Step 1: Quadric of every triangle over (x, y, z, s*u, s*v), weighted by its area
+    P = np.hstack([pos, scale * uv])
+    p0, p1, p2 = P[faces[:, 0]], P[faces[:, 1]], P[faces[:, 2]]
+    e1 = _normalize(p1 - p0)
+    e2 = p2 - p0
+    e2 = _normalize(e2 - np.sum(e2 * e1, axis=1, keepdims=True) * e1)
+    area = 0.5 * np.linalg.norm(np.cross(pos[faces[:, 1]] - pos[faces[:, 0]], pos[faces[:, 2]] - pos[faces[:, 0]]),
+                                axis=1)
+    d1, d2 = np.sum(p0 * e1, axis=1), np.sum(p0 * e2, axis=1)
+    A = np.eye(5) - e1[:, :, None] * e1[:, None, :] - e2[:, :, None] * e2[:, None, :]
+    b = d1[:, None] * e1 + d2[:, None] * e2 - p0
+    c = np.sum(p0 * p0, axis=1) - d1 ** 2 - d2 ** 2
+
+    # Quadric of every vertex: the sum over its triangles
+    QA, Qb, Qc = np.zeros((Nv, 5, 5)), np.zeros((Nv, 5)), np.zeros(Nv)
+    for k in range(3):
+        np.add.at(QA, faces[:, k], area[:, None, None] * A)
+        np.add.at(Qb, faces[:, k], area[:, None] * b)
+        np.add.at(Qc, faces[:, k], area * c)
+
+    # Step 2: Edges, and the vertices on open (or non-manifold) edges, which stay in place
+    edges = np.sort(np.vstack([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    locked = np.zeros(Nv, dtype=bool)
+    locked[edges[counts != 2].ravel()] = True
+
+    faces_of = [set() for _ in range(Nv)]
+    for f, (i, j, k) in enumerate(faces):
+        faces_of[i].add(f)
+        faces_of[j].add(f)
+        faces_of[k].add(f)
+    alive = np.ones(Nt, dtype=bool)
+    version = np.zeros(Nv, dtype=int)
+    order = itertools.count()  # tie-breaker of equal costs
+
+    def candidates(a, b):
+        # Cost and target of collapsing the edges (a[i], b[i]), all at once
+        cost, target = _collapse_cost(QA[a] + QA[b], Qb[a] + Qb[b], Qc[a] + Qc[b], P[a], P[b], locked[a], locked[b])
+        return [(cost[i], next(order), int(a[i]), int(b[i]), version[a[i]], version[b[i]], target[i])
+                for i in range(a.size) if np.isfinite(cost[i])]
+
+    heap = candidates(edges[:, 0], edges[:, 1])
+    heapq.heapify(heap)
+
+    # Step 3: Collapse the cheapest edges
+    error = 0.0
+    target_idx = 0
+    n_faces = last = Nt
+    while target_idx < len(targets):
+        if not heap or heap[0][0] > max_cost:
+            if n_faces < last:
+                yield faces[alive], pos, uv, error
+            return
+        cost, _, a, b, va, vb, v = heapq.heappop(heap)
+        if version[a] != va or version[b] != vb:
+            continue
+
+        # Keep the locked vertex (if any) as a
+        if locked[b]:
+            a, b = b, a
+        if not _can_collapse(a, b, v, faces, faces_of, P):
+            continue
+
+        # Merge b into a: the triangles of the edge vanish, the others move to a
+        for f in list(faces_of[b]):
+            tri = faces[f]
+            if a in tri:
+                alive[f] = False
+                n_faces -= 1
+                for w in tri:
+                    faces_of[w].discard(f)
+            else:
+                tri[tri == b] = a
+                faces_of[a].add(f)
+        faces_of[b] = set()
+        P[a], pos[a], uv[a] = v, v[:3], v[3:] / scale
+        QA[a] += QA[b]
+        Qb[a] += Qb[b]
+        Qc[a] += Qc[b]
+        version[a] += 1
+        version[b] += 1
+        error = max(error, cost)
+
+        # New costs of the edges around a
+        ring = np.array(sorted({w for f in faces_of[a] for w in faces[f]} - {a}), dtype=int)
+        for item in candidates(np.full(ring.size, a), ring):
+            heapq.heappush(heap, item)
+
+        while target_idx < len(targets) and n_faces <= targets[target_idx]:
+            yield faces[alive], pos, uv, error
+            last = n_faces
+            target_idx += 1
+
+
+def _collapse_cost(A: np.ndarray, b: np.ndarray, c: np.ndarray, pa: np.ndarray, pb: np.ndarray,
+                   lock_a: np.ndarray, lock_b: np.ndarray):
+    """
+    Error and position of the merged vertex for E edges with summed quadrics (A, b, c): the
+    minimizer of the quadric if it is well defined, else the better of the endpoints and the
+    midpoint; a locked endpoint stays where it is (inf cost if both are locked).
+    """
+    E = A.shape[0]
+    cand = np.stack([pa, pb, (pa + pb) / 2, (pa + pb) / 2], axis=1)     # E x 4 x 5
+
+    # Minimizer of v^T A v + 2 b^T v + c where A is well conditioned
+    solvable = np.linalg.cond(A) < 1e8
+    if np.any(solvable):
+        cand[solvable, 3] = np.linalg.solve(A[solvable], -b[solvable][:, :, None])[:, :, 0]
+
+    err = np.einsum('eki,eij,ekj->ek', cand, A, cand) + 2 * np.einsum('eki,ei->ek', cand, b) + c[:, None]
+    err = np.maximum(err, 0)
+    err[lock_a, 1:] = np.inf
+    err[lock_b, 0] = np.inf
+    err[lock_b, 2:] = np.inf
+    best = np.argmin(err, axis=1)
+    return err[np.arange(E), best], cand[np.arange(E), best]
+
+
+def _can_collapse(a: int, b: int, v: np.ndarray, faces: np.ndarray, faces_of: list, P: np.ndarray) -> bool:
+    """
+    Checks that merging b into a at v keeps the surface manifold (link condition) and folds
+    no triangle over, in space or in UV space.
+    """
+    shared = faces_of[a] & faces_of[b]
+    ring_a = {w for f in faces_of[a] for w in faces[f]}
+    ring_b = {w for f in faces_of[b] for w in faces[f]}
+    opposite = {w for f in shared for w in faces[f]} - {a, b}
+    if (ring_a & ring_b) - {a, b} != opposite:
+        return False
+
+    # Triangles that move (all at once)
+    moving = np.array(sorted((faces_of[a] | faces_of[b]) - shared), dtype=int)
+    if moving.size == 0:
+        return True
+    tri = faces[moving]
+    old = P[tri]                                                             # K x 3 x 5
+    new = np.where(((tri == a) | (tri == b))[:, :, None], v, old)
+
+    # Normal and UV winding before and after the move
+    n_old = np.cross(old[:, 1, :3] - old[:, 0, :3], old[:, 2, :3] - old[:, 0, :3])
+    n_new = np.cross(new[:, 1, :3] - new[:, 0, :3], new[:, 2, :3] - new[:, 0, :3])
+    if np.any(np.sum(n_old * n_new, axis=1) <= 1e-12 * np.sum(n_old * n_old, axis=1)):
+        return False
+    uv_old, uv_new = _uv_area(old[:, :, 3:]), _uv_area(new[:, :, 3:])
+    return not np.any((uv_old * uv_new < 0) | ((uv_new == 0) & (uv_old != 0)))
+
+
+def _uv_area(uv: np.ndarray) -> np.ndarray:
+    """
+    Twice the signed areas of triangles in texture space (K x 3 x 2).
+    """
+    return ((uv[:, 1, 0] - uv[:, 0, 0]) * (uv[:, 2, 1] - uv[:, 0, 1]) -
+            (uv[:, 1, 1] - uv[:, 0, 1]) * (uv[:, 2, 0] - uv[:, 0, 0]))
+
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    """
+    Rows of v scaled to unit length (zero rows stay zero).
+    """
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return np.divide(v, n, out=np.zeros_like(v), where=n > 1e-300)
+
+
+def clear_lod_cache() -> None:
+    """
+    Forget all cached LOD chains.
+    """
+    _lod_cache.clear()
+
+
+def _mesh_key(pts: np.ndarray, uvs: np.ndarray, t_pos_idx: np.ndarray, ratio: float, min_triangles: int) -> tuple:
+    """
+    Cache key of a mesh: shapes, dtypes, chain parameters and a hash of the raw data.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pts.tobytes())
+    h.update(uvs.tobytes())
+    h.update(t_pos_idx.tobytes())
+    return (pts.shape, uvs.shape, t_pos_idx.shape, t_pos_idx.dtype.str, ratio, min_triangles, h.hexdigest())
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# from scene_file_func import load_scene
+# from lookat_func import lookat
+
+# data = load_scene("hw3.npy")
+# chain = build_lods(data["v_pos"], data["v_uvs"], data["t_pos_idx"].T)
+# print(chain)
+
+# # Level for the camera of the scene at full and at 1/8 resolution
+# R, t = lookat(data["cam_pos"].flatten(), data["up"].flatten(), data["target"].flatten())
+# for res in (512, 64):
+#     print(res, select_lod(chain, R, t, data["focal"], data["plane_w"], data["plane_h"], res, res))
@@ -43,6 +43,44 @@ def lookat(eye: np.ndarray, up: np.ndarray, target: np.ndarray) -> Tuple[np.ndar
     return R, t
 
 
+def lookat_batch(eye: np.ndarray, up: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the view transformations of many cameras at once (e.g. every frame of an animation).
+
+    Parameters:
+        eye (np.ndarray): Camera positions (shape: F×3, or 3, for a fixed camera position)
+        up (np.ndarray): Up vectors (shape: F×3, or 3, shared by all cameras)
+        target (np.ndarray): Target points (shape: F×3, or 3, shared by all cameras)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]:
+            R (F×3×3): Rotation matrices from world to camera coordinates (stacked)
+            t (F×3): Translation vectors (camera positions)
+
+    Camera f gives the same R[f], t[f] as lookat(eye[f], up[f], target[f]).
+    """
+    # Broadcast the inputs to F×3 arrays
+    eye, up, target = np.broadcast_arrays(np.asarray(eye, dtype=float).reshape(-1, 3),
+                                          np.asarray(up, dtype=float).reshape(-1, 3),
+                                          np.asarray(target, dtype=float).reshape(-1, 3))
+
+    # Camera axes of all cameras, as in lookat
+    forward = target - eye
+    forward = forward / np.linalg.norm(forward, axis=1, keepdims=True)
+
+    right = np.cross(forward, up)
+    right = right / np.linalg.norm(right, axis=1, keepdims=True)
+
+    up = np.cross(right, forward)
+    up = up / np.linalg.norm(up, axis=1, keepdims=True)
+
+    # The axes are the columns of every rotation matrix
+    R = np.stack([right, up, -forward], axis=2)
+    t = eye.copy()
+
+    return R, t
+
+
 # # Example usage (comment or uncomment as needed)
 
 # # Camera positioned at (2, 3, 5)
@@ -69,3 +107,12 @@ def lookat(eye: np.ndarray, up: np.ndarray, target: np.ndarray) -> Tuple[np.ndar
 
 # print("Camera-space coordinates of target point:")
 # print(p_camera)
+
+# ########################
+
+# # Cameras of 4 frames on a circle around the origin, all looking at it
+# theta = np.linspace(0, np.pi / 2, 4)
+# eyes = np.stack([5 * np.cos(theta), np.full(4, 2.0), 5 * np.sin(theta)], axis=1)
+# R_all, t_all = lookat_batch(eyes, up, target)
+
+# print("Stacked rotations:", R_all.shape, "translations:", t_all.shape)
@@ -1,14 +1,55 @@
 import os
+import re
 import imageio.v2 as imageio
+from precision_func import to_uint8
 
-# Makes videos from the generated frames
-def make_video_from_frames(folder, output_name, fps=25):
-    frames = []
-    for i in range(125):
-        filename = os.path.join(folder, f"frame_{i:03d}.png")
-        image = imageio.imread(filename)
-        frames.append(image)
+# Streams frames into a video file, one at a time
+def write_video(frames, output_name, fps=25):
+    """
+    Encodes frames into an .mp4 video while they arrive.
+
+    Every frame is handed to the encoder as soon as the iterator produces it, so only one
+    frame is held in memory at a time, whatever the length or resolution of the video.
+
+    Parameters:
+        frames (iterable): Images (H x W x 3), either floats in [0, 1] or uint8 (see to_uint8)
+        output_name (str): Path of the video without the .mp4 extension
+        fps (int): Frames per second
 
+    Returns:
+        int: Number of frames written
+    """
     output_path = f"{output_name}.mp4"
-    imageio.mimsave(output_path, frames, fps=fps)
-    print(f"Video saved as {output_path}")
\ No newline at end of file
+    count = 0
+    with imageio.get_writer(output_path, fps=fps) as writer:
+        for frame in frames:
+            writer.append_data(to_uint8(frame))
+            count += 1
+
+    print(f"Video saved as {output_path}")
+    return count
+
+
+def iter_frames(folder, n_frames=None):
+    """
+    Reads the frame_XXX.png files of a folder one by one, in frame order.
+
+    Parameters:
+        folder (str): Folder with the frames
+        n_frames (int): Number of frames to read (default: all frames in the folder)
+
+    Yields:
+        np.ndarray: The frames
+    """
+    names = sorted((f for f in os.listdir(folder) if re.fullmatch(r"frame_\d+\.png", f)),
+                   key=lambda f: int(f[6:-4]))
+    if n_frames is not None:
+        names = names[:n_frames]
+
+    for name in names:
+        yield imageio.imread(os.path.join(folder, name))
+
+
+# Makes videos from the generated frames
+def make_video_from_frames(folder, output_name, fps=25, n_frames=None):
+    return write_video(iter_frames(folder, n_frames), output_name, fps=fps)
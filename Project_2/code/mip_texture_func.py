@@ -0,0 +1,207 @@
+import numpy as np
+import weakref
+from collections import OrderedDict
+from typing import List, Tuple
+from texture_cache_func import texels
+
+# Mip pyramids of recently used textures, keyed by texture identity (LRU order)
+MIP_CACHE_SIZE = 4
+_mip_cache = OrderedDict()
+
+# Supported filters: nearest texel of the nearest level, bilinear in the nearest level,
+# or bilinear in the two nearest levels blended together (trilinear)
+FILTERS = ('nearest', 'bilinear', 'trilinear')
+
+class MipTexture:
+    def __init__(self, image: np.ndarray, filter: str = 'trilinear') -> None:
+        """
+        Texture with a mip pyramid: level 0 is the image itself, every next level halves
+        both sizes (2x2 box filter) down to a single texel.
+
+        Level 0 is not copied, so a uint8 texture (e.g. memory-mapped by load_texture) stays
+        uint8; texel fetches are scaled to [0, 1] (see texels).
+
+        Texture coordinates (s, t) run over [0, 1] along the columns and the rows of the
+        image, i.e. texel (s * (W - 1), t * (H - 1)), the same mapping the shaders use for
+        their nearest-neighbour fetches. Indexing (tex[y, x]) and .shape refer to level 0, so
+        a MipTexture can be passed wherever a texture array is expected.
+
+        Parameters:
+        - image: (H, W, C) texture image.
+        - filter: One of FILTERS.
+        """
+        if filter not in FILTERS:
+            raise ValueError(f"Unknown texture filter: {filter}")
+        self.filter = filter
+        self.levels: List[np.ndarray] = [np.asarray(image)]
+
+        # Build the pyramid once (in [0, 1], also for uint8 textures)
+        level = np.asarray(image, dtype=np.float64)
+        if self.levels[0].dtype == np.uint8:
+            level /= 255.0
+        while max(level.shape[0], level.shape[1]) > 1:
+            # Replicate the last row/column of odd sizes, then average 2x2 blocks
+            if level.shape[0] % 2:
+                level = np.concatenate([level, level[-1:]], axis=0)
+            if level.shape[1] % 2:
+                level = np.concatenate([level, level[:, -1:]], axis=1)
+            level = 0.25 * (level[0::2, 0::2] + level[1::2, 0::2] + level[0::2, 1::2] + level[1::2, 1::2])
+            self.levels.append(level)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """
+        Shape of level 0.
+        """
+        return self.levels[0].shape
+
+    def __getitem__(self, key):
+        """
+        Plain indexing into level 0 (nearest-neighbour fetches of the reference shaders).
+        """
+        return self.levels[0][key]
+
+    def lod(self, dsdx, dsdy, dtdx, dtdy) -> np.ndarray:
+        """
+        Level of detail from the derivatives of (s, t) with respect to the pixel x and y:
+        log2 of the number of level-0 texels covered by one pixel step (0 = magnified).
+
+        Parameters:
+        - dsdx, dsdy, dtdx, dtdy: Scalars or (P,) arrays of derivatives.
+
+        Returns:
+        - Level(s) of detail clamped to [0, number of levels - 1].
+        """
+        h, w = self.shape[0] - 1, self.shape[1] - 1
+        rho_x = np.hypot(np.asarray(dsdx) * w, np.asarray(dtdx) * h)
+        rho_y = np.hypot(np.asarray(dsdy) * w, np.asarray(dtdy) * h)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lod = np.log2(np.maximum(rho_x, rho_y))
+        return np.clip(np.nan_to_num(lod, nan=0.0, neginf=0.0), 0, len(self.levels) - 1)
+
+    def sample(self, s: np.ndarray, t: np.ndarray, lod=None) -> np.ndarray:
+        """
+        Samples the texture at many points at once with the texture's filter.
+
+        Parameters:
+        - s, t: (P,) texture coordinates in [0, 1] (clamped).
+        - lod: Level of detail, scalar or (P,) (see lod()); None samples level 0.
+
+        Returns:
+        - (P, C) array of texture colors.
+        """
+        s = np.clip(np.asarray(s, dtype=np.float64), 0, 1)
+        t = np.clip(np.asarray(t, dtype=np.float64), 0, 1)
+        lod = np.broadcast_to(np.asarray(0.0 if lod is None else lod, dtype=np.float64), s.shape)
+
+        if self.filter == 'trilinear':
+            # Blend the two nearest levels
+            base = np.floor(lod).astype(int)
+            frac = (lod - base)[:, None]
+            lo = self._sample_levels(s, t, base, bilinear=True)
+            if not np.any(frac > 0):
+                return lo
+            hi = self._sample_levels(s, t, np.minimum(base + 1, len(self.levels) - 1), bilinear=True)
+            return (1 - frac) * lo + frac * hi
+
+        # Nearest level
+        level = np.floor(lod + 0.5).astype(int)
+        return self._sample_levels(s, t, level, bilinear=(self.filter == 'bilinear'))
+
+    def _sample_levels(self, s: np.ndarray, t: np.ndarray, level: np.ndarray, bilinear: bool) -> np.ndarray:
+        """
+        Samples every point in its own level, one vectorized fetch per level present.
+        """
+        out = np.empty((s.shape[0], self.shape[2]), dtype=np.float64)
+        for k in np.unique(level):
+            sel = level == k
+            out[sel] = self._sample_level(self.levels[k], s[sel], t[sel], bilinear)
+        return out
+
+    @staticmethod
+    def _sample_level(tex: np.ndarray, s: np.ndarray, t: np.ndarray, bilinear: bool) -> np.ndarray:
+        """
+        Nearest or bilinear fetch from one level.
+        """
+        h, w = tex.shape[0], tex.shape[1]
+        x = s * (w - 1)
+        y = t * (h - 1)
+        x0 = x.astype(int)
+        y0 = y.astype(int)
+        if not bilinear:
+            return texels(tex, y0, x0)
+
+        x1 = np.minimum(x0 + 1, w - 1)
+        y1 = np.minimum(y0 + 1, h - 1)
+        fx = (x - x0)[:, None]
+        fy = (y - y0)[:, None]
+        top = (1 - fx) * texels(tex, y0, x0) + fx * texels(tex, y0, x1)
+        bottom = (1 - fx) * texels(tex, y1, x0) + fx * texels(tex, y1, x1)
+        return (1 - fy) * top + fy * bottom
+
+
+def get_mip_texture(image: np.ndarray, filter: str = 'trilinear') -> MipTexture:
+    """
+    Returns the MipTexture of an image, building its pyramid only the first time the same
+    image object (and filter) is seen.
+
+    Parameters:
+    - image: (H, W, C) texture image, or a MipTexture (returned as is).
+    - filter: One of FILTERS.
+
+    Returns:
+    - The cached MipTexture.
+    """
+    if isinstance(image, MipTexture):
+        return image
+
+    key = (id(image), filter)
+    entry = _mip_cache.get(key)
+    if entry is not None and entry[0]() is image:
+        _mip_cache.move_to_end(key)
+        return entry[1]
+
+    mip = MipTexture(image, filter)
+    _mip_cache[key] = (weakref.ref(image), mip)
+    while len(_mip_cache) > MIP_CACHE_SIZE:
+        _mip_cache.popitem(last=False)
+    return mip
+
+
+def uv_gradients(x: np.ndarray, y: np.ndarray, s: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Derivatives of the texture coordinates with respect to the pixel coordinates over
+    triangles. The shaders interpolate (s, t) linearly in screen space, so the derivatives
+    are exact and the same at every pixel of a triangle.
+
+    Parameters:
+    - x, y: (..., 3) pixel coordinates of the triangle vertices.
+    - s, t: (..., 3) texture coordinates of the triangle vertices.
+
+    Returns:
+    - dsdx, dsdy, dtdx, dtdy: Arrays of shape (...); zero for degenerate triangles.
+    """
+    x, y, s, t = (np.asarray(a, dtype=np.float64) for a in (x, y, s, t))
+    x1, x2 = x[..., 1] - x[..., 0], x[..., 2] - x[..., 0]
+    y1, y2 = y[..., 1] - y[..., 0], y[..., 2] - y[..., 0]
+    s1, s2 = s[..., 1] - s[..., 0], s[..., 2] - s[..., 0]
+    t1, t2 = t[..., 1] - t[..., 0], t[..., 2] - t[..., 0]
+
+    det = x1 * y2 - x2 * y1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = np.where(det != 0, 1.0 / det, 0.0)
+    return ((s1 * y2 - s2 * y1) * inv, (s2 * x1 - s1 * x2) * inv,
+            (t1 * y2 - t2 * y1) * inv, (t2 * x1 - t1 * x2) * inv)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# # Checkerboard texture seen at 1/8 of its size: nearest sampling aliases, trilinear averages
+# tex = np.kron((np.indices((64, 64)).sum(axis=0) % 2)[..., None], np.ones((1, 1, 3)))
+# s, t = np.meshgrid(np.linspace(0, 1, 8), np.linspace(0, 1, 8))
+# mip = get_mip_texture(tex)
+# lod = mip.lod(1 / 7, 0, 0, 1 / 7)
+# print("level of detail:", lod)
+# print(mip.sample(s.ravel(), t.ravel(), lod)[:8, 0])
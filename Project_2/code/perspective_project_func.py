@@ -33,6 +33,40 @@ def perspective_project(pts: np.ndarray, focal: float,
     return projected_pts, depths
 
 
+def perspective_project_batch(pts: np.ndarray, focal: float,
+                              R: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projects 3D points for many cameras at once (e.g. all frames of an animation, see lookat_batch).
+    All points are transformed to the coordinates of all cameras in one einsum.
+
+    Parameters:
+        pts (np.ndarray): 3×N matrix of 3D points in world coordinates
+        focal (float): Focal length (distance from camera center to image plane)
+        R (np.ndarray): F×3×3 rotation matrices (world-to-camera)
+        t (np.ndarray): F×3 translation vectors (camera positions)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (F×2×N image coordinates, F×N depths); index f gives the
+        result of perspective_project for camera f
+    """
+
+    # Ensure shapes
+    pts = np.asarray(pts)
+    if pts.shape[0] != 3:
+        pts = pts.T
+    R = np.asarray(R).reshape(-1, 3, 3)
+    t = np.asarray(t).reshape(-1, 3, 1)
+
+    # Transform to the camera coordinates of every camera: R[f] @ (pts - t[f])
+    camera_pts = np.einsum('fij,fjn->fin', R, pts[None, :, :] - t)
+    depths = camera_pts[:, 2, :]
+
+    # Perspective projection
+    projected_pts = focal * camera_pts[:, :2, :] / depths[:, None, :]
+
+    return projected_pts, depths
+
+
 # # Example usage (comment or uncomment as needed)
 
 # # Sample 3D points (3×N matrix)
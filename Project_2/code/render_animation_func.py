@@ -0,0 +1,300 @@
+import os
+import numpy as np
+from multiprocessing import Pool, shared_memory
+
+from render_object_func import render_object
+from meshlet_func import Meshlets, build_meshlets
+from lod_func import build_lods
+from lookat_func import lookat_batch
+from perspective_project_func import perspective_project_batch
+from scene_file_func import Scene, load_scene
+
+# State of a worker process (set once by _init_worker)
+_worker = {}
+
+# Object arrays taken from the scene (see _mesh_arrays)
+MESH_ARRAYS = ('v_pos', 'v_uvs', 't_pos_idx')
+
+def camera_pose(data, frame, mode='forward'):
+    """
+    Computes the camera of one frame of the car animation.
+
+    The car drives on a circle with constant speed and the camera rides along at a fixed
+    offset. In 'forward' mode the camera looks in the direction of motion, in 'target' mode
+    it keeps looking at the fixed target point of the scene.
+
+    Parameters:
+        data (dict): Scene data of hw2.npy (e.g. load_scene("hw2.npy"))
+        frame (int): Frame number
+        mode (str): 'forward' or 'target'
+
+    Returns:
+        tuple: (cam_pos, target), both (3,) arrays
+    """
+    if mode not in ('forward', 'target'):
+        raise ValueError(f"Unknown camera mode: {mode}")
+
+    t = frame / data['k_fps']
+    theta = data['car_velocity'] / data['k_road_radius'] * t  # angular velocity (rad/s) x time
+
+    # Car position on the circle
+    car_pos = data['k_road_center'] + data['k_road_radius'] * np.array([np.cos(theta), 0, np.sin(theta)])
+
+    # Velocity direction (tangent to the circle)
+    tangent = np.array([-np.sin(theta), 0, np.cos(theta)])
+    tangent /= np.linalg.norm(tangent)
+
+    # Camera world position
+    cam_pos = car_pos + data['k_cam_car_rel_pos']
+
+    if mode == 'forward':
+        # Camera looks in the direction of the tangent
+        target = cam_pos + tangent
+    else:
+        # Camera looks at the specified target
+        target = data['k_cam_target']
+
+    return cam_pos, target
+
+
+def camera_path(data, frames, mode='forward'):
+    """
+    Computes the cameras of many frames of the car animation at once (vectorized camera_pose).
+
+    Parameters:
+        data (dict): Scene data of hw2.npy (e.g. load_scene("hw2.npy"))
+        frames (np.ndarray): Frame numbers (shape: F)
+        mode (str): 'forward' or 'target'
+
+    Returns:
+        tuple: (cam_pos, target), both F×3 arrays
+    """
+    if mode not in ('forward', 'target'):
+        raise ValueError(f"Unknown camera mode: {mode}")
+
+    t = np.asarray(frames, dtype=float) / data['k_fps']
+    theta = (data['car_velocity'] / data['k_road_radius'] * t)[:, None]  # F×1 angles
+    zeros = np.zeros_like(theta)
+
+    # Car positions on the circle
+    car_pos = data['k_road_center'] + data['k_road_radius'] * np.hstack([np.cos(theta), zeros, np.sin(theta)])
+
+    # Velocity directions (tangents to the circle)
+    tangent = np.hstack([-np.sin(theta), zeros, np.cos(theta)])
+    tangent /= np.linalg.norm(tangent, axis=1, keepdims=True)
+
+    # Camera world positions
+    cam_pos = car_pos + data['k_cam_car_rel_pos']
+
+    if mode == 'forward':
+        # Cameras look in the direction of the tangents
+        target = cam_pos + tangent
+    else:
+        # Cameras look at the specified target
+        target = np.broadcast_to(np.reshape(data['k_cam_target'], (1, 3)), cam_pos.shape).copy()
+
+    return cam_pos, target
+
+
+def project_path(data, frames, mode='forward'):
+    """
+    Geometry stage of a whole clip: camera path, batched lookat and batched projection of the
+    object for all frames in single vectorized calls.
+
+    Parameters:
+        data (dict): Scene data of hw2.npy (e.g. load_scene("hw2.npy"))
+        frames (np.ndarray): Frame numbers (shape: F)
+        mode (str): 'forward' or 'target'
+
+    Returns:
+        tuple: (projected_pts, depths) of shapes F×2×N and F×N (N vertices of the object);
+               frame f is the projection render_object computes for camera_pose(data, frames[f])
+    """
+    cam_pos, target = camera_path(data, frames, mode)
+    R, t = lookat_batch(cam_pos, data['k_cam_up'], target)
+    return perspective_project_batch(data['v_pos'], data['k_f'], R, t)
+
+
+def render_animation(data, texImg, mode='forward', n_frames=None, workers=None, res_h=512, res_w=512,
+                     zbuffer=False, cull=None, tex_filter=None, precision=None,
+                     backend=None, clusters=None, lod=None):
+    """
+    Renders the frames of the car animation in a pool of worker processes.
+
+    Every frame only depends on its camera pose, so frames are rendered independently.
+    The geometry stage of all frames (camera path, lookat and projection) runs up front in
+    single vectorized calls (see project_path). The mesh arrays, the projected vertices and
+    the texture are copied once into shared memory, where all workers read them without
+    copies of their own, instead of being sent along with every task. The mesh arrays of a
+    scene opened with load_scene (when they are plain views of its file) and a texture from
+    load_texture are not copied at all: every worker maps their files. Frames are yielded in
+    order, as soon as they (and all frames before them) are ready.
+
+    Parameters:
+        data (dict): Scene data of hw2.npy (e.g. load_scene("hw2.npy"))
+        texImg (np.ndarray): Texture image, floats in [0, 1] or uint8 (e.g. from load_texture)
+        mode (str): 'forward' or 'target' (see camera_pose)
+        n_frames (int): Number of frames to render (default: duration * fps of the scene)
+        workers (int): Number of worker processes (default: one per CPU; 1 renders in this process)
+        res_h, res_w (int): Resolution of the frames
+        zbuffer (bool): Resolve visibility with a depth buffer (see render_object)
+        cull (str): Culling mode (see render_object)
+        tex_filter (str): Texture filter (see render_object); every process builds the mip
+                          pyramid of the shared texture once
+        precision (str): Data-type policy (see render_object); with 'uint8' the frames sent
+                         back by the workers are 8 times smaller than float64 frames
+        backend (str): Kernel backend (see render_object); every process compiles or loads the
+                       cached kernels itself
+        clusters (bool): Cluster culling (see render_object, needs cull); the clusters are built
+                         once for the whole clip
+        lod (bool): Level of detail (see render_object); the chain is built once for the whole
+                    clip and every frame picks its level. Frames that use a simplified level are
+                    projected by their worker
+
+    Yields:
+        tuple: (frame, image) for frame = 0, 1, ..., n_frames - 1
+    """
+    if clusters is not None and clusters is not False and cull is None:
+        raise ValueError("Cluster culling needs a culling mode (cull='none', 'back' or 'front')")
+    if n_frames is None:
+        n_frames = data['k_duration'] * data['k_fps']
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Object data and texture
+    arrays = _mesh_arrays(data)
+    arrays['texImg'] = np.ascontiguousarray(texImg)
+
+    # Geometry stage of the whole clip: F×2×N projected vertices and F×N depths
+    arrays['projected_pts'], arrays['depths'] = project_path(data, np.arange(n_frames), mode)
+
+    # Cluster culling and the level of detail also need the camera of every frame
+    use_clusters = cull is not None and clusters is not None and clusters is not False
+    use_lod = lod is not None and lod is not False
+    if use_clusters or use_lod:
+        arrays['cam_pos'], arrays['targets'] = camera_path(data, np.arange(n_frames), mode)
+    if lod is True:
+        lod = build_lods(arrays['v_pos'].T, arrays['v_uvs'], arrays['t_pos_idx'].T)
+    if not use_clusters:
+        clusters = None
+    elif not isinstance(clusters, Meshlets) and not use_lod:
+        # One set of clusters for the clip (with lod, the workers build them for every level)
+        clusters = build_meshlets(arrays['v_pos'].T, arrays['t_pos_idx'].T)
+
+    # A memory-mapped scene (load_scene) or texture (load_texture) is mapped again by every
+    # worker instead of being copied: all processes share the page cache of its file. Only
+    # the mesh arrays that are views of the file qualify; any other layout would be converted,
+    # i.e. copied, by every worker, so those go to shared memory like the other arrays
+    mapped = isinstance(texImg, np.memmap) and texImg.filename is not None
+    mapped_mesh = tuple(name for name in MESH_ARRAYS
+                        if isinstance(data, Scene) and np.shares_memory(arrays[name], data[name]))
+    scene = {
+        'scene_file': data.path if mapped_mesh else None,
+        'mapped_mesh': mapped_mesh,
+        'texture_file': texImg.filename if mapped else None,
+        'params': dict(plane_h=data['k_sensor_height'], plane_w=data['k_sensor_width'], res_h=res_h,
+                       res_w=res_w, focal=data['k_f'], up=np.array(data['k_cam_up']), zbuffer=zbuffer,
+                       cull=cull, tex_filter=tex_filter, precision=precision,
+                       backend=backend, clusters=clusters, lod=lod if use_lod else None),
+    }
+
+    # Single process: no shared memory needed
+    if workers <= 1:
+        _worker['arrays'] = arrays
+        _worker['scene'] = scene
+        try:
+            for frame in range(n_frames):
+                yield frame, _render_frame(frame)
+        finally:
+            _worker.clear()
+        return
+
+    # Step 1: Copy the mesh and the texture into shared memory (once; mapped files are not copied)
+    blocks = []
+    specs = {}
+    try:
+        for name, arr in arrays.items():
+            if (name == 'texImg' and mapped) or name in mapped_mesh:
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            blocks.append(shm)
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+
+            # The parent keeps the shared array as well (no second copy while rendering)
+            arrays[name] = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            arrays[name][...] = arr
+
+        # Step 2: Render the frames in parallel, collecting them in order
+        with Pool(workers, initializer=_init_worker, initargs=(specs, scene)) as pool:
+            for frame, img in enumerate(pool.imap(_render_frame, range(n_frames))):
+                yield frame, img
+    finally:
+        arrays.clear()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def _mesh_arrays(data, names=MESH_ARRAYS):
+    """
+    Object data in the layout render_object expects (views of the scene arrays when their
+    layout already matches, e.g. for a Scene, copies otherwise), only for the given names.
+    """
+    convert = {
+        'v_pos': lambda: np.ascontiguousarray(data['v_pos'].T, dtype=np.float64),
+        'v_uvs': lambda: np.ascontiguousarray(data['v_uvs'], dtype=np.float64),
+        't_pos_idx': lambda: np.ascontiguousarray(data['t_pos_idx']),
+    }
+    return {name: convert[name]() for name in names}
+
+
+def _init_worker(specs, scene):
+    """
+    Attaches a worker process to the shared mesh and texture arrays (or maps the scene and
+    texture files).
+    """
+    _worker['blocks'] = []
+    _worker['arrays'] = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker['blocks'].append(shm)
+        _worker['arrays'][name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    if scene['scene_file'] is not None:
+        _worker['arrays'].update(_mesh_arrays(load_scene(scene['scene_file']), scene['mapped_mesh']))
+    if scene['texture_file'] is not None:
+        _worker['arrays']['texImg'] = np.load(scene['texture_file'], mmap_mode='r')
+    _worker['scene'] = scene
+
+
+def _render_frame(frame):
+    """
+    Renders one frame of the animation (runs in a worker).
+    """
+    arrays = _worker['arrays']
+    scene = _worker['scene']
+
+    return render_object(
+        v_pos=arrays['v_pos'],
+        v_clr=np.ones_like(arrays['v_pos']),
+        t_pos_idx=arrays['t_pos_idx'],
+        projection=(arrays['projected_pts'][frame], arrays['depths'][frame]),
+        eye=arrays['cam_pos'][frame] if 'cam_pos' in arrays else None,
+        target=arrays['targets'][frame] if 'targets' in arrays else None,
+        v_uvs=arrays['v_uvs'],
+        texImg=arrays['texImg'],
+        **scene['params']
+    )
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# from texture_cache_func import load_texture
+
+# data = load_scene("hw2.npy")
+# texImg = load_texture("stone-72_diffuse.jpg")
+
+# # Render the first 10 frames of the forward animation on 4 processes
+# for frame, img in render_animation(data, texImg, mode='forward', n_frames=10, workers=4):
+#     print(frame, img.shape)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from lookat_func import lookat, lookat_batch
+from perspective_project_func import perspective_project, perspective_project_batch
+from render_animation_func import camera_pose, camera_path, project_path, render_animation
+
+# Tests of the batched geometry stage of the animations: for every frame of the hw2.npy clip,
+# the batched camera path, lookat and projection must give what the per-frame functions give.
+# Run with: python -m pytest render_animation_func_test.py
+
+data = np.load("hw2.npy", allow_pickle=True).item()
+frames = np.arange(data['k_duration'] * data['k_fps'])
+up = data['k_cam_up'].flatten()
+
+# Batched and per-frame results only differ in the rounding of the vectorized reductions
+TOL = dict(rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_camera_path(mode):
+    cam_pos, target = camera_path(data, frames, mode)
+    assert cam_pos.shape == target.shape == (frames.size, 3)
+    for f in frames:
+        cam_pos_f, target_f = camera_pose(data, f, mode)
+        np.testing.assert_allclose(cam_pos[f], np.ravel(cam_pos_f), **TOL)
+        np.testing.assert_allclose(target[f], np.ravel(target_f), **TOL)
+
+
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_lookat_batch(mode):
+    cam_pos, target = camera_path(data, frames, mode)
+    R, t = lookat_batch(cam_pos, up, target)
+    assert R.shape == (frames.size, 3, 3) and t.shape == (frames.size, 3)
+    for f in frames:
+        cam_pos_f, target_f = camera_pose(data, f, mode)
+        R_f, t_f = lookat(cam_pos_f, up, target_f)
+        np.testing.assert_allclose(R[f], R_f, **TOL)
+        np.testing.assert_allclose(t[f], t_f, **TOL)
+
+
+@pytest.mark.parametrize("mode", ['forward', 'target'])
+def test_perspective_project_batch(mode):
+    cam_pos, target = camera_path(data, frames, mode)
+    projected, depths = perspective_project_batch(data['v_pos'], data['k_f'], *lookat_batch(cam_pos, up, target))
+    assert projected.shape == (frames.size, 2, data['v_pos'].shape[1])
+    assert depths.shape == (frames.size, data['v_pos'].shape[1])
+
+    path_projected, path_depths = project_path(data, frames, mode)
+    for f in frames:
+        cam_pos_f, target_f = camera_pose(data, f, mode)
+        R_f, t_f = lookat(cam_pos_f, up, target_f)
+        projected_f, depths_f = perspective_project(data['v_pos'], data['k_f'], R_f, t_f)
+        for p, d in ((projected, depths), (path_projected, path_depths)):
+            np.testing.assert_allclose(p[f], projected_f, **TOL)
+            np.testing.assert_allclose(d[f], depths_f, **TOL)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        camera_path(data, frames, 'orbit')
+
+
+def test_clusters_need_cull():
+    with pytest.raises(ValueError):
+        next(render_animation(data, np.zeros((4, 4, 3), dtype=np.uint8), n_frames=1, workers=1, clusters=True))
@@ -1,7 +1,13 @@
 import numpy as np
-from t_shading_func import t_shading
+from t_shading_func import t_shading_batch
+from triangle_kernel_func import setup_scanlines
+from depth_buffer_func import DepthBuffer
+from render_stats_func import stage, add
+from precision_func import get_precision
+from kernel_backend_func import get_backend
 
-def render_img(faces, vertices, vcolors, uvs, depth, texImg):
+def render_img(faces, vertices, vcolors, uvs, depth, texImg, zbuffer=False, stats=None, precision=None,
+               backend=None):
     """
     Renders a 3D scene by applying shading to triangles in the image.
 
@@ -12,33 +18,69 @@ def render_img(faces, vertices, vcolors, uvs, depth, texImg):
     :param uvs: A (m x 2) array of UV texture coordinates for each vertex
     :param depth: A (m,) array of depth values for each vertex
     :param texImg: The texture image (as a NumPy array) to apply if texture shading is used
-    :return: The rendered image with applied shading
+    :param zbuffer: If True, visibility is resolved per pixel with a depth buffer instead of
+                    sorting the triangles by mean depth (painter's algorithm)
+    :param stats: Optional RenderStats (see render_stats_func) that receives the time of every
+                  stage (sorting, setup, shading, output), the triangle and pixel counters and,
+                  if it has a log callback, the per-triangle diagnostics. Without it nothing is
+                  printed.
+    :param precision: Data-type policy (a name of PRECISIONS or a Precision, see precision_func):
+                      type of the shading math and of the image (default float64)
+    :param backend: Kernel backend of t_shading_batch (see kernel_backend_func): None or 'numpy'
+                    for the NumPy kernels, 'numba' for JIT-compiled kernels (the NumPy ones if
+                    Numba is not installed), 'auto' for the fastest available, or a KernelBackend
+    :return: The rendered image with applied shading (floats in [0, 1], or uint8 in [0, 255])
     """
     M, N = 512, 512  # Canvas dimensions
-    img = np.ones((M, N, 3))  # Create a white canvas
+    precision = get_precision(precision)
+    img = precision.new_image(M, N)  # Create a white canvas
+    kernels = get_backend(backend)
+    if stats is not None and backend == 'numba' and kernels.name != 'numba':
+        stats.message("Numba is not installed, using the NumPy kernels")
 
-    # Calculate the depth of each triangle by averaging the depths of its vertices
-    triangle_depths = np.mean(depth.flatten()[faces], axis=1)
+    with stage(stats, 'sorting'):
+        if zbuffer:
+            # Depth buffer: triangles can be drawn in any order
+            zbuf = DepthBuffer(M, N)
+            faces_sorted = faces
+        else:
+            zbuf = None
 
-    # Sort triangles by depth in descending order (farther triangles are rendered first)
-    sorted_indices = np.argsort(-triangle_depths)
-    faces_sorted = faces[sorted_indices]
+            # Calculate the depth of each triangle by averaging the depths of its vertices
+            triangle_depths = np.mean(depth.flatten()[faces], axis=1)
 
-    # Iterate through the sorted triangles to render them
-    for i in range(faces_sorted.shape[0]):
-        triangle_indices = faces_sorted[i].flatten()  # Get the vertex indices for the current triangle
-        verts_2d = vertices[triangle_indices]     # 2D coordinates of the triangle's vertices
-        colors = vcolors[triangle_indices]        # Vertex colors for the triangle
-        uv_coords = uvs[triangle_indices]         # UV coordinates for the triangle's vertices
+            # Sort triangles by depth in descending order (farther triangles are rendered first)
+            sorted_indices = np.argsort(-triangle_depths)
+            faces_sorted = faces[sorted_indices]
 
-        # Print the details of the triangle being rendered
-        print(f"Rendering triangle {i} with indices: {triangle_indices}")
-        print(f"verts: {verts_2d}")
+    # Scanline setup of all triangles at once (vertices sorted by y with their UVs and colors,
+    # range of scanlines), read by t_shading_batch
+    with stage(stats, 'setup'):
+        setup = setup_scanlines(vertices, faces_sorted, np.hstack([uvs, vcolors]), M)
 
-        # Apply shading to the triangle
-        img = t_shading(img, verts_2d, uv_coords, texImg, colors) 
+    # Per-triangle diagnostics only when asked for (formatting them costs more than the shading)
+    verbose = stats is not None and stats.verbose
 
-    print("Total triangles rendered:", faces_sorted.shape[0])  # Print the number of triangles rendered
-    print("Faces shape:", faces.shape)  # Print the shape of the faces array
+    with stage(stats, 'shading'):
+        # Report the details of the triangles being rendered
+        if verbose:
+            for i in range(faces_sorted.shape[0]):
+                triangle_indices = faces_sorted[i].flatten()
+                stats.message(f"Rendering triangle {i} with indices: {triangle_indices}")
+                stats.message(f"verts: {vertices[triangle_indices]}")
+
+        # Gouraud shading and texture mapping of all sorted triangles in one pass (later
+        # triangles overwrite earlier ones)
+        img = t_shading_batch(img, vertices, faces_sorted, uvs, texImg, vcolors, zbuf=zbuf, stats=stats,
+                              dtype=precision.compute, backend=kernels, setup=setup)
+    add(stats, 'triangles_drawn', faces_sorted.shape[0])
+
+    if stats is not None:
+        with stats.stage('output'):
+            stats.count_visible(img)
+        if verbose:
+            stats.message(f"Total triangles rendered: {faces_sorted.shape[0]}")  # Number of triangles rendered
+            stats.message(f"Faces shape: {faces.shape}")  # Shape of the faces array
+            stats.message(stats.summary())
 
     return img  
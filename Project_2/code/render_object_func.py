@@ -5,11 +5,18 @@ from world2view_func import world2view
 from perspective_project_func import perspective_project
 from rasterize_func import rasterize
 from render_img_func import render_img
+from cull_func import cull_triangles
+from meshlet_func import Meshlets, build_meshlets, cull_meshlets
+from lod_func import LODChain, build_lods, select_lod
+from mip_texture_func import get_mip_texture
+from render_stats_func import stage, add
 
 import matplotlib.pyplot as plt
 from PIL import Image
 
-def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target, v_uvs, texImg):
+def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target, v_uvs, texImg,
+                  zbuffer=False, cull=None, stats=None, tex_filter=None, projection=None, precision=None,
+                  backend=None, clusters=None, lod=None):
     """
     Renders a textured 3D object from a specified camera viewpoint using a pinhole camera model.
 
@@ -27,34 +34,122 @@ def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal
         target (np.ndarray): Point the camera is looking at (3,)
         v_uvs (np.ndarray): Nx2 array of UV coordinates for each vertex
         texImg (np.ndarray): Texture image to apply
+        zbuffer (bool): Resolve visibility with a depth buffer instead of painter's sorting
+        cull (str): Culling mode applied before rasterization (see cull_func): None to draw every
+                    triangle, 'none' to drop only triangles behind the camera, off-screen or of
+                    zero area, 'back' / 'front' to drop back- / front-facing triangles as well
+        stats (RenderStats): Optional instrumentation (see render_stats_func): wall time of every
+                             stage (lod, lookat, projection, rasterize, culling, sorting, setup,
+                             shading, output), triangle and pixel counters (culling details included)
+                             and, with a log callback, the diagnostic messages. Without it the
+                             render is silent and nothing is measured
+        tex_filter (str): None for nearest-neighbour fetches from the full-size texture, or
+                          'nearest' / 'bilinear' / 'trilinear' to sample a mip pyramid of the
+                          texture at the level of detail of every triangle (see mip_texture_func);
+                          the pyramid is built once per texture
+        projection (tuple): Optional (projected_pts, depth) of the vertices, 2×N and N, already
+                            computed for this camera (e.g. one frame of perspective_project_batch);
+                            the lookat and projection stages are skipped and eye, up and target
+                            are only used by the cluster culling and the level of detail (a
+                            simplified level is projected again)
+        precision (str): Data-type policy of the render, a name of PRECISIONS or a Precision
+                         (see precision_func); None renders in float64
+        backend (str): Kernels of the texture shading (see kernel_backend_func): None or 'numpy',
+                       'numba' for the JIT-compiled kernels (the NumPy ones if Numba is not
+                       installed) or 'auto'; the images are the same
+        clusters (bool): With culling, True (or the Meshlets of the mesh, see meshlet_func) to
+                         first reject whole clusters of triangles against the view frustum and
+                         with their normal cones ('back' / 'front'); only the triangles of the
+                         remaining clusters are culled one by one. The clusters are built once
+                         per mesh. The image is the same, except for tiny triangles seen edge-on
+                         whose winding only flips when their vertices are rounded to whole pixels.
+                         Without cull a ValueError is raised
+        lod (bool): Level of detail (see lod_func): True (or the LODChain of the mesh) to render
+                    the simplified level that suits the projected size of the mesh on screen,
+                    an int to force a level (0 is the full mesh). The chain is built once per
+                    mesh; texture coordinates are kept and vertex colors are taken from the
+                    vertex each simplified vertex was merged into. None renders the full mesh
 
     Returns:
-        np.ndarray: res_h × res_w × 3 RGB image with the textured object rendered
+        np.ndarray: res_h × res_w × 3 RGB image with the textured object rendered (floats in
+                    [0, 1], or uint8 in [0, 255] for the 'uint8' precision)
     """
+    if clusters is not None and clusters is not False and cull is None:
+        raise ValueError("Cluster culling needs a culling mode (cull='none', 'back' or 'front')")
+
+    # Mipmapped texture (cached, so the pyramid is only built for a new texture)
+    if tex_filter is not None:
+        texImg = get_mip_texture(texImg, tex_filter)
+
+    # Level of detail of the mesh for this view
+    if lod is not None and lod is not False:
+        with stage(stats, 'lod'):
+            chain = lod if isinstance(lod, LODChain) else build_lods(v_pos.T, v_uvs, t_pos_idx.T)
+            if isinstance(lod, (bool, LODChain)):
+                R, t = lookat(eye, up, target)
+                level = select_lod(chain, R, t, focal, plane_w, plane_h, res_w, res_h)
+            else:
+                level = min(max(int(lod), 0), len(chain) - 1)
+        if stats is not None:
+            stats.message(f"LOD {level} of {len(chain)}: {chain[level].n_triangles} triangles")
+        if level > 0:
+            mesh = chain[level]
+            v_pos, v_uvs, t_pos_idx = mesh.v_pos.T, mesh.v_uvs, mesh.t_pos_idx.T
+            v_clr = np.asarray(v_clr)[mesh.vertex_ids]
+            projection = None  # computed for the full mesh
+
     # Step 1: Create blank white canvas
     image = np.ones((res_h, res_w, 3), dtype=np.float32)
-
-    # Step 2: Compute view transformation (rotation and translation)
-    R, t = lookat(eye, up, target)
-
-    # Step 3: Transform to camera coordinates and perspective project them
-    projected_pts, depth = perspective_project(v_pos.T, focal, R, t)
-
+    add(stats, 'triangles_submitted', t_pos_idx.shape[0])
+
+    if projection is not None:
+        # Steps 2-3 already done for the whole clip
+        projected_pts, depth = projection
+        if cull is not None and clusters is not None and clusters is not False:
+            R, t = lookat(eye, up, target)
+    else:
+        # Step 2: Compute view transformation (rotation and translation)
+        with stage(stats, 'lookat'):
+            R, t = lookat(eye, up, target)
+
+        # Step 3: Transform to camera coordinates and perspective project them
+        with stage(stats, 'projection'):
+            projected_pts, depth = perspective_project(v_pos.T, focal, R, t)
 
     # Step 4: Rasterize 2D points to image pixels
-    pixel_coords = rasterize(projected_pts, plane_w, plane_h, res_w, res_h).T  # Nx2
-
-    print("Depth stats:", depth.min(), depth.max())
-    print("Pixel coords stats: x", pixel_coords[0].min(), pixel_coords[0].max(), "y", pixel_coords[1].min(), pixel_coords[1].max())
-
-
-
-    # Step 5: Prepare vertex array for render_img (combine x, y with z-depth)
-    # 'pixel_coords' is Nx2 (x, y), 'depth.T.flatten()' is Nx1 -> concat to Nx3
-    vertices_2d = np.hstack([pixel_coords, depth.T.flatten()[:, None]])  # Nx3
+    with stage(stats, 'rasterize'):
+        pixel_coords = rasterize(projected_pts, plane_w, plane_h, res_w, res_h).T  # Nx2
+
+        # Step 5: Prepare vertex array for render_img (combine x, y with z-depth)
+        # 'pixel_coords' is Nx2 (x, y), 'depth.T.flatten()' is Nx1 -> concat to Nx3
+        vertices_2d = np.hstack([pixel_coords, depth.T.flatten()[:, None]])  # Nx3
+
+    if stats is not None and stats.verbose:
+        stats.message(f"Depth stats: {depth.min()} {depth.max()}")
+        stats.message(f"Pixel coords stats: x {pixel_coords[0].min()} {pixel_coords[0].max()} "
+                      f"y {pixel_coords[1].min()} {pixel_coords[1].max()}")
+
+    # Culling: drop the clusters (optionally) and the triangles that cannot (or should not)
+    # be seen, all at once
+    if cull is not None:
+        with stage(stats, 'culling'):
+            submitted = t_pos_idx.shape[0]
+            if clusters is not None and clusters is not False:
+                meshlets = clusters if isinstance(clusters, Meshlets) else build_meshlets(v_pos.T, t_pos_idx.T)
+                if meshlets.n_triangles != t_pos_idx.shape[0]:
+                    raise ValueError("The clusters were built for another mesh (use clusters=True with lod)")
+                visible = cull_meshlets(meshlets, R, t, focal, plane_w, plane_h, res_w, res_h, mode=cull,
+                                        stats=stats.counters if stats is not None else None)
+                t_pos_idx = t_pos_idx[meshlets.triangle_mask(visible)]
+            keep = cull_triangles(rasterize(projected_pts, plane_w, plane_h, res_w, res_h, clip=False), depth,
+                                  t_pos_idx.T, res_w, res_h, mode=cull,
+                                  stats=stats.counters if stats is not None else None)
+            t_pos_idx = t_pos_idx[keep]
+        add(stats, 'triangles_culled', submitted - np.count_nonzero(keep))
 
     # Step 6: Render triangles using texture mapping
-    image = render_img(t_pos_idx, vertices_2d, v_clr, v_uvs, depth.T.flatten(), texImg)
+    image = render_img(t_pos_idx, vertices_2d, v_clr, v_uvs, depth.T.flatten(), texImg, zbuffer=zbuffer, stats=stats,
+                       precision=precision, backend=backend)
 
     return image
 
@@ -0,0 +1,24 @@
+import numpy as np
+from render_object_func import render_object
+from render_animation_func import camera_pose
+from texture_cache_func import load_texture
+
+# Regression test of render_object on hw2.npy: frame 90 of the forward clip must stay the
+# image of the original renderer, pinned in reference_images.npz (rounded to 8 bits). Half a
+# level of slack lets rounding of the float math pass, but not a texel or a pixel changing
+# hands.
+# Run with: python -m pytest render_object_func_test.py
+
+data = np.load("hw2.npy", allow_pickle=True).item()
+texture = load_texture("stone-72_diffuse.jpg")
+reference = np.load("reference_images.npz")
+
+
+def test_reference_frame():
+    cam_pos, target = camera_pose(data, 90, 'forward')
+    v_pos = data["v_pos"].T
+    img = render_object(v_pos, np.ones_like(v_pos), data["t_pos_idx"], data["k_sensor_height"],
+                        data["k_sensor_width"], 512, 512, data["k_f"], np.ravel(cam_pos),
+                        data["k_cam_up"].flatten(), np.ravel(target), data["v_uvs"], texture)
+    error = np.abs(img.astype(np.float64) * 255 - reference["90"])
+    assert np.count_nonzero(error > 0.5 + 1e-3) == 0
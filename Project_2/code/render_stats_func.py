@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Optional
+from precision_func import white
+
+class RenderStats:
+    def __init__(self, log: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Opt-in instrumentation of a render: wall time per pipeline stage, counters and
+        diagnostic messages. Pass an instance as `stats` to the render functions; without it
+        they measure nothing and print nothing.
+
+        Counters used by the pipelines:
+        - triangles_submitted, triangles_culled, triangles_drawn: triangles given to the
+          pipeline, rejected before rasterization, and sent to the shading stage.
+        - pixels_tested: fragments covered by a triangle (before the depth test).
+        - pixels_shaded: fragments that were textured / lit and written.
+        - pixels_visible: pixels of the final image that differ from the background.
+        - culled_*, triangles_in, triangles_out: details of the culling stage (see cull_func).
+        - culled_clusters_*, clusters_in, clusters_out: whole clusters rejected before the
+          per-triangle culling (see meshlet_func).
+
+        Parameters:
+        - log: Callable receiving the diagnostic messages (e.g. print); None drops them.
+        """
+        self.times: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.log = log
+
+    @property
+    def verbose(self) -> bool:
+        """
+        True if diagnostic messages are wanted (formatting them can be skipped otherwise).
+        """
+        return self.log is not None
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager adding the wall time of its block to the time of a stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, name: str, n: int = 1) -> None:
+        """
+        Adds n to a counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def message(self, text: str) -> None:
+        """
+        Passes a diagnostic message to the log callback (if any).
+        """
+        if self.log is not None:
+            self.log(text)
+
+    def count_visible(self, img: np.ndarray, background: Optional[float] = None) -> None:
+        """
+        Counts the pixels of the final image that differ from the background (default: white
+        in the type of the image, see precision).
+        """
+        if background is None:
+            background = white(img.dtype)
+        self.add('pixels_visible', np.count_nonzero(np.any(img != background, axis=2)))
+
+    @property
+    def overdraw(self) -> float:
+        """
+        Shaded fragments per visible pixel (1.0 = every pixel shaded once).
+        """
+        visible = self.counters.get('pixels_visible', 0)
+        return self.counters.get('pixels_shaded', 0) / visible if visible else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Times, counters and overdraw ratio as a plain (JSON serializable) dict.
+        """
+        return {'times': dict(self.times), 'counters': dict(self.counters), 'overdraw': self.overdraw}
+
+    def summary(self) -> str:
+        """
+        Human-readable report of the times and counters.
+        """
+        lines = [f"{name:<20} {seconds * 1e3:10.3f} ms" for name, seconds in self.times.items()]
+        lines += [f"{name:<20} {value:10d}" for name, value in self.counters.items()]
+        lines.append(f"{'overdraw':<20} {self.overdraw:10.3f}")
+        return "\n".join(lines)
+
+
+def stage(stats: Optional[RenderStats], name: str):
+    """
+    Times a stage with an optional RenderStats (does nothing without one).
+    """
+    return stats.stage(name) if stats is not None else nullcontext()
+
+
+def add(stats: Optional[RenderStats], name: str, n: int = 1) -> None:
+    """
+    Adds to a counter of an optional RenderStats (does nothing without one).
+    """
+    if stats is not None:
+        stats.add(name, n)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# stats = RenderStats(log=print)
+# with stats.stage('shading'):
+#     stats.add('pixels_shaded', 120)
+#     stats.message("shading done")
+# stats.add('pixels_visible', 100)
+# print(stats.summary())
@@ -1,65 +1,163 @@
 import numpy as np
-from vector_interp_func import vector_interp
+from mip_texture_func import MipTexture, uv_gradients
+from kernel_backend_func import get_backend
+from precision_func import to_framebuffer
+from triangle_kernel_func import BATCH_PIXELS, setup_scanlines, scanline_pixels_batch
 
-def t_shading(img, vertices, uv, textImg, colors):
+def t_shading(img, vertices, uv, textImg, colors, zbuf=None, stats=None, dtype=np.float64, backend=None,
+              setup=None):
     """
     Applies Gouraud shading and texture mapping to a triangle using barycentric interpolation.
 
+    The triangle is rasterized scanline by scanline, but all scanline endpoints and all
+    spans of pixels are interpolated as arrays (UVs and colors together), so the whole
+    triangle is shaded with a single fancy-indexed texture fetch.
+
     :param img: The output image to be textured (HxWx3)
     :param vertices: A (3 x 3) array of triangle vertex positions (x, y, z)
     :param uv: A (3 x 2) array of UV texture coordinates corresponding to each vertex
     :param textImg: The texture image (as a NumPy array)
     :param colors: A (3 x 3) array of RGB vertex colors
+    :param zbuf: Optional DepthBuffer; hidden pixels are rejected before the texture fetch
+    :param stats: Optional RenderStats that counts the tested and shaded pixels
+    :param dtype: Type of the shading math (texels and colors, see precision_func); positions
+                  and UVs are always interpolated in float64
+    :param backend: Kernel backend (see kernel_backend_func): None or 'numpy', 'numba' or 'auto'
+    :param setup: Optional scanline setup record of the triangle (see setup_scanlines in
+                  triangle_kernel_func), e.g. from a setup of all triangles done by render_img
     :return: Image with shaded + textured triangle
     """
     vertices = vertices.astype(float)
     uv = uv.astype(float)
     colors = colors.astype(float)
 
-    # Sort vertices by y-coordinate for scanline rasterization
-    sorted_indices = np.argsort(vertices[:, 1])
-    C1, C2, C3 = vertices[sorted_indices]
-    uv1, uv2, uv3 = uv[sorted_indices]
-    col1, col2, col3 = colors[sorted_indices]
+    # Pixels of all spans with their interpolated depth, UV and color (see triangle_kernel_func)
+    kernels = get_backend(backend)
+    ys, xs, attr_P = kernels.scanline_pixels(vertices, np.hstack([uv, colors]), img.shape[0], img.shape[1], setup)
+    if ys.size == 0:
+        return img
+    z_P = attr_P[:, 0]
+    uv_P = attr_P[:, 1:3]
+    col_P = attr_P[:, 3:]
 
-    y_min = int(max(0, np.floor(C1[1])))
-    y_max = int(min(img.shape[0] - 1, np.ceil(C3[1])))
+    valid = ~(np.any(np.isnan(uv_P), axis=1) | np.any(uv_P < 0, axis=1) | np.any(uv_P > 1, axis=1))
 
-    for y in range(y_min, y_max + 1):
-        if y < C2[1]:
-            A = vector_interp(C1, C2, C1, C2, y, 2)
-            uv_A = vector_interp(C1, C2, uv1, uv2, y, 2)
-            col_A = vector_interp(C1, C2, col1, col2, y, 2)
-        else:
-            A = vector_interp(C2, C3, C2, C3, y, 2)
-            uv_A = vector_interp(C2, C3, uv2, uv3, y, 2)
-            col_A = vector_interp(C2, C3, col2, col3, y, 2)
+    # Early depth test (only for the pixels that would be drawn)
+    if stats is not None:
+        stats.add('pixels_tested', np.count_nonzero(valid))
+    if zbuf is not None:
+        valid[valid] = zbuf.test(ys[valid], xs[valid], z_P[valid])
+    if stats is not None:
+        stats.add('pixels_shaded', np.count_nonzero(valid))
+
+    ys, xs, uv_P, col_P = ys[valid], xs[valid], uv_P[valid], col_P[valid]
+
+    if isinstance(textImg, MipTexture):
+        # Filtered fetch, level of detail from the (constant) UV derivatives of the triangle
+        lod = textImg.lod(*uv_gradients(vertices[:, 0], vertices[:, 1], uv[:, 0], uv[:, 1]))
+        tex_color = textImg.sample(uv_P[:, 0], uv_P[:, 1], lod).astype(dtype, copy=False)
+    else:
+        tex_x = np.clip(uv_P[:, 0] * (textImg.shape[1] - 1), 0, textImg.shape[1] - 1).astype(int)
+        tex_y = np.clip(uv_P[:, 1] * (textImg.shape[0] - 1), 0, textImg.shape[0] - 1).astype(int)
+        tex_color = kernels.texels(textImg, tex_y, tex_x, dtype)
+
+    final_color = col_P.astype(dtype, copy=False) * tex_color
+
+    img[ys, xs] = to_framebuffer(final_color, img.dtype)
+
+    return img
+
+
+def t_shading_batch(img, vertices, faces, uvs, textImg, vcolors, zbuf=None, stats=None, dtype=np.float64,
+                    backend=None, setup=None):
+    """
+    Applies Gouraud shading and texture mapping to many triangles at once, writing directly
+    into the image.
+
+    Triangles are drawn in the order given by faces: when several triangles cover the same
+    pixel the last one wins, exactly as with repeated t_shading calls (painter's algorithm).
+    With a depth buffer the nearest triangle wins instead, as in t_shading with zbuf. The
+    spans of all triangles are traversed together (see scanline_pixels_batch) and the texture
+    is only fetched and modulated for the pixels that end up in the image.
+
+    :param img: The output image to be textured (HxWx3), modified in place
+    :param vertices: (m x 3) array of vertex positions (x, y, z)
+    :param faces: (n x 3) array of vertex indices per triangle, in drawing order
+    :param uvs: (m x 2) array of UV texture coordinates for each vertex
+    :param textImg: The texture image (as a NumPy array) or a MipTexture
+    :param vcolors: (m x 3) array of RGB vertex colors
+    :param zbuf: Optional DepthBuffer; hidden pixels are rejected before the texture fetch
+    :param stats: Optional RenderStats that counts the tested and written (shaded) pixels
+    :param dtype: Type of the shading math (texels and colors, see precision_func); positions
+                  and UVs are always interpolated in float64
+    :param backend: Kernel backend of the texel fetch (see kernel_backend_func)
+    :param setup: Optional ScanlineSetup of the faces with the UVs and colors as attributes
+                  (see setup_scanlines in triangle_kernel_func), computed here if not given
+    :return: The same image with all triangles shaded and textured
+    """
+    faces = np.asarray(faces).reshape(-1, 3)
+    vertices = np.asarray(vertices).astype(float)
+    uvs = np.asarray(uvs).astype(float)
+
+    kernels = get_backend(backend)
+    if setup is None:
+        setup = setup_scanlines(vertices, faces, np.hstack([uvs, np.asarray(vcolors).astype(float)]), img.shape[0])
 
-        B = vector_interp(C1, C3, C1, C3, y, 2)
-        uv_B = vector_interp(C1, C3, uv1, uv3, y, 2)
-        col_B = vector_interp(C1, C3, col1, col3, y, 2)
+    # Level of detail of every triangle from its (constant) UV derivatives
+    if isinstance(textImg, MipTexture):
+        tri_v, tri_uv = vertices[faces], uvs[faces]
+        lods = textImg.lod(*uv_gradients(tri_v[:, :, 0], tri_v[:, :, 1], tri_uv[:, :, 0], tri_uv[:, :, 1]))
 
-        if A[0] > B[0]:
-            A, B = B, A
-            uv_A, uv_B = uv_B, uv_A
-            col_A, col_B = col_B, col_A
+    # Candidate pixels of every triangle (scanlines times clamped width), to split them into chunks
+    x = setup.V[:, :, 0]
+    box_w = np.minimum(np.ceil(np.max(x, axis=1)), img.shape[1] - 1) - np.maximum(np.floor(np.min(x, axis=1)), 0) + 1
+    box_w = np.where(box_w > 0, box_w, 0).astype(int)
+    ends = np.cumsum(np.maximum(setup.y_max - setup.y_min + 1, 0) * box_w)
 
-        x_min = int(max(0, np.floor(A[0])))
-        x_max = int(min(img.shape[1] - 1, np.ceil(B[0])))
+    start = 0
+    while start < faces.shape[0]:
+        base = ends[start - 1] if start > 0 else 0
+        stop = max(int(np.searchsorted(ends, base + BATCH_PIXELS, side='right')), start + 1)
 
-        for x in range(x_min, x_max + 1):
-            uv_P = vector_interp(A, B, uv_A, uv_B, x, 1)
-            col_P = vector_interp(A, B, col_A, col_B, x, 1)
+        # Pixels of all spans of the chunk with their interpolated depth, UV and color
+        tri, ys, xs, attr_P = scanline_pixels_batch(setup[start:stop], img.shape[1])
+        tri += start
+        z_P = attr_P[:, 0]
+        uv_P = attr_P[:, 1:3]
 
-            if np.any(np.isnan(uv_P)) or np.any(uv_P < 0) or np.any(uv_P > 1):
-                continue
+        # Skip invalid UVs (outside [0, 1] or containing NaN)
+        valid = ~(np.any(np.isnan(uv_P), axis=1) | np.any(uv_P < 0, axis=1) | np.any(uv_P > 1, axis=1))
+        tri, ys, xs, z_P, attr_P = tri[valid], ys[valid], xs[valid], z_P[valid], attr_P[valid]
 
-            tex_x = int(np.clip(uv_P[0] * (textImg.shape[1] - 1), 0, textImg.shape[1] - 1))
-            tex_y = int(np.clip(uv_P[1] * (textImg.shape[0] - 1), 0, textImg.shape[0] - 1))
+        if zbuf is not None:
+            # Keep the nearest fragment at each pixel, if it passes the depth test
+            winners = zbuf.resolve(ys, xs, z_P)
+        else:
+            # Keep the last triangle drawn at each pixel (painter's order)
+            pixel = ys * img.shape[1] + xs
+            _, winners = np.unique(pixel[::-1], return_index=True)
+            winners = pixel.shape[0] - 1 - winners
+
+        if stats is not None:
+            stats.add('pixels_tested', ys.size)
+            stats.add('pixels_shaded', winners.size)
+
+        tri, ys, xs, attr_P = tri[winners], ys[winners], xs[winners], attr_P[winners]
+        uv_P = attr_P[:, 1:3]
+        col_P = attr_P[:, 3:]
+
+        # Sample the texture (mip pyramid, or UV coordinates mapped to texture pixel indices)
+        if isinstance(textImg, MipTexture):
+            tex_color = textImg.sample(uv_P[:, 0], uv_P[:, 1], lods[tri]).astype(dtype, copy=False)
+        else:
+            tex_x = np.clip(uv_P[:, 0] * (textImg.shape[1] - 1), 0, textImg.shape[1] - 1).astype(int)
+            tex_y = np.clip(uv_P[:, 1] * (textImg.shape[0] - 1), 0, textImg.shape[0] - 1).astype(int)
+            tex_color = kernels.texels(textImg, tex_y, tex_x, dtype)
 
-            tex_color = textImg[tex_y, tex_x]
-            final_color = col_P * tex_color
+        final_color = col_P.astype(dtype, copy=False) * tex_color
 
-            img[y, x] = final_color
+        # Update the image
+        img[ys, xs] = to_framebuffer(final_color, img.dtype)
+        start = stop
 
     return img
@@ -0,0 +1,89 @@
+import os
+import glob
+import numpy as np
+from PIL import Image
+
+# Decoded textures already opened by this process, keyed by (absolute path, mtime)
+_loaded = {}
+
+def load_texture(path: str) -> np.ndarray:
+    """
+    Loads a texture image as a read-only uint8 array, decoding the source file only once.
+
+    The decoded pixels are stored next to the source as a raw .npy file named after the
+    source and its modification time (<source>.<mtime>.texcache.npy) and memory-mapped from
+    there: later runs and other processes skip the decoding and share the same page-cache
+    copy. Editing the source changes its mtime, so the texture is decoded again (and the
+    stale cache file removed). If the folder is not writable, the decoded array is used as is.
+
+    The texels stay uint8 (8x smaller than float64); the shaders scale the fetched texels to
+    [0, 1] themselves (see texels).
+
+    Parameters:
+    - path: Path of the texture image (any format PIL can read).
+
+    Returns:
+    - (H, W, C) uint8 array (np.memmap when the cache file is available).
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, mtime)
+    if key in _loaded:
+        return _loaded[key]
+
+    cache = f"{path}.{mtime}.texcache.npy"
+    if not os.path.exists(cache):
+        # Step 1: Decode the source once
+        image = np.asarray(Image.open(path)).astype(np.uint8)
+
+        # Step 2: Persist the raw pixels (written under a temporary name, then renamed, so
+        # concurrent loaders never see a partial file)
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, image)
+            os.replace(tmp, cache)
+        except OSError:
+            _loaded[key] = image
+            return image
+
+        # Step 3: Remove cache files of older versions of the source
+        for stale in glob.glob(f"{glob.escape(path)}.*.texcache.npy"):
+            if stale != cache:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    # Zero-copy, read-only view of the cache file
+    _loaded[key] = np.load(cache, mmap_mode='r')
+    return _loaded[key]
+
+
+def texels(tex: np.ndarray, ty, tx, dtype=np.float64) -> np.ndarray:
+    """
+    Fetches texels tex[ty, tx] as floats in [0, 1], whether the texture is stored as
+    uint8 (load_texture) or as floats already. Only the fetched texels are converted.
+
+    Parameters:
+    - tex: (H, W, C) texture, uint8 or float.
+    - ty, tx: Row and column indices (scalars or arrays).
+    - dtype: Float type of the result (the compute type of the shading, see precision_func).
+
+    Returns:
+    - The texel colors (float).
+    """
+    values = tex[ty, tx]
+    if values.dtype == np.uint8:
+        return values.astype(dtype) / np.asarray(255, dtype=dtype)
+    return values.astype(dtype, copy=False)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# # The first call decodes the JPEG, the next ones (and other processes) only map the cache file
+# tex = load_texture("stone-72_diffuse.jpg")
+# print(type(tex), tex.dtype, tex.shape)
+# print(texels(tex, np.array([0, 10]), np.array([0, 20])))
@@ -0,0 +1,167 @@
+import numpy as np
+from vector_interp_func import vector_interp_array
+
+# Maximum number of candidate pixels traversed at once by t_shading_batch
+BATCH_PIXELS = 1 << 22
+
+class ScanlineSetup:
+    def __init__(self, V, n, y_min, y_max):
+        """
+        Struct-of-arrays scanline setup of many triangles (see setup_scanlines): what
+        scanline_pixels derives from the vertices of a triangle before its first scanline.
+
+        setup[k] is the record of triangle k (the same fields without the triangle axis), the
+        form taken by scanline_pixels and t_shading.
+
+        :param V: (T x 3 x (n + D)) vertices of every triangle sorted by increasing y, each
+                  followed by its attributes (as floats)
+        :param n: Number of position coordinates of a vertex (x, y[, z])
+        :param y_min: (T,) first scanline of every triangle, clamped to the image
+        :param y_max: (T,) last scanline of every triangle, clamped to the image
+        """
+        self.V = V
+        self.n = n
+        self.y_min = y_min
+        self.y_max = y_max
+
+    def __len__(self):
+        return self.V.shape[0]
+
+    def __getitem__(self, key):
+        return ScanlineSetup(self.V[key], self.n, self.y_min[key], self.y_max[key])
+
+
+def setup_scanlines(vertices, faces, attributes, height):
+    """
+    Scanline setup of all triangles in one vectorized pass: sorts the vertices of every
+    triangle by y (carrying their attributes along) and clamps its range of scanlines, so
+    the rasterizer does not repeat this for every triangle. The records give exactly the
+    pixels and values of scanline_pixels without a setup.
+
+    :param vertices: (m x n) array of vertex positions (x, y[, z])
+    :param faces: (T x 3) array of the vertex indices of every triangle
+    :param attributes: (m x D) array of per-vertex attributes (e.g. UV coordinates and colors)
+    :param height: Height of the image (scanlines are clamped to it)
+    :return: ScanlineSetup of the T triangles, in the order of faces
+    """
+    n = vertices.shape[1]
+    V = np.hstack([vertices, attributes]).astype(float)[faces]
+
+    # Sort the vertices of every triangle by increasing y-coordinate
+    sorted_indices = np.argsort(V[:, :, 1], axis=1)
+    V = np.take_along_axis(V, sorted_indices[:, :, None], axis=1)
+
+    # Vertical range of scanlines (clamped to image bounds, like max/min of scanline_pixels)
+    top, bottom = np.floor(V[:, 0, 1]), np.ceil(V[:, 2, 1])
+    y_min = np.clip(np.where(top > 0, top, 0), 0, height).astype(int)
+    y_max = np.clip(np.where(bottom < height - 1, bottom, height - 1), -1, height - 1).astype(int)
+
+    return ScanlineSetup(V, n, y_min, y_max)
+
+
+def scanline_pixels(vertices, attributes, height, width, setup=None):
+    """
+    Scanline traversal of a triangle: finds the pixels of all its spans and interpolates the
+    vertex attributes at them, first along the edges (span endpoints), then along every span.
+
+    :param vertices: (3 x n) array of vertex positions (x, y[, z]), as floats
+    :param attributes: (3 x D) array of per-vertex attributes (e.g. UV coordinates and colors), as floats
+    :param height: Height of the image (scanlines are clamped to it)
+    :param width: Width of the image (spans are clamped to it)
+    :param setup: Optional record of the triangle (setup[k] of setup_scanlines): its sorted
+                  vertices and scanline range are used instead of being computed again
+    :return: ys, xs: (P,) pixel coordinates, span by span from the top;
+             attr_P: (P x (1 + D)) last position coordinate (the depth for 3D vertices)
+             followed by the attributes at every pixel
+    """
+    n = vertices.shape[1]
+    if setup is not None:
+        # Sorted vertices and range of scanlines from the triangle setup
+        V1, V2, V3 = setup.V
+        y_min, y_max = int(setup.y_min), int(setup.y_max)
+    else:
+        # Sort vertices by increasing y-coordinate for scanline rasterization, carrying along
+        # the edges the vertex position followed by its attributes
+        sorted_indices = np.argsort(vertices[:, 1])
+        V1, V2, V3 = np.hstack([vertices, attributes])[sorted_indices]
+
+        # Determine the vertical range of scanlines (clamped to image bounds)
+        y_min = int(max(0, np.floor(V1[1])))
+        y_max = int(min(height - 1, np.ceil(V3[1])))
+    C1, C2, C3 = V1[:n], V2[:n], V3[:n]
+    ys = np.arange(y_min, y_max + 1)
+    if ys.size == 0:
+        return ys, ys.copy(), np.empty((0, V1.size - n + 1))
+
+    # Interpolate point A and its attributes between C1 and C2 (top half) or C2 and C3 (bottom half)
+    top = (ys < C2[1])[:, None]
+    A = np.where(top, vector_interp_array(C1, C2, V1, V2, ys, 2), vector_interp_array(C2, C3, V2, V3, ys, 2))
+
+    # Interpolate point B and its attributes between C1 and C3
+    B = vector_interp_array(C1, C3, V1, V3, ys, 2)
+
+    # Ensure A is to the left of B (for left-to-right horizontal interpolation)
+    swap = (A[:, 0] > B[:, 0])[:, None]
+    A, B = np.where(swap, B, A), np.where(swap, A, B)
+
+    # Determine horizontal range of pixels of every span (clamped to image bounds)
+    x_min = np.maximum(0, np.floor(A[:, 0])).astype(int)
+    x_max = np.minimum(width - 1, np.ceil(B[:, 0])).astype(int)
+    counts = np.maximum(x_max - x_min + 1, 0)
+
+    # Expand the spans into pixels (row of each pixel, then its x coordinate)
+    row = np.repeat(np.arange(ys.size), counts)
+    xs = x_min[row] + np.arange(row.size) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Interpolate the depth and the attributes at every pixel of every span
+    attr_P = vector_interp_array(A[row], B[row], A[row, n - 1:], B[row, n - 1:], xs, 1)
+
+    return ys[row], xs, attr_P
+
+
+def scanline_pixels_batch(setup, width):
+    """
+    Scanline traversal of many triangles at once: the spans of all triangles of a setup are
+    found and interpolated with the same array operations as scanline_pixels, so every
+    triangle gets exactly its pixels and values, without a Python loop over the triangles.
+
+    :param setup: ScanlineSetup of the triangles (see setup_scanlines)
+    :param width: Width of the image (spans are clamped to it)
+    :return: tri: (P,) index of the triangle of every pixel (into setup);
+             ys, xs, attr_P: as in scanline_pixels, triangle by triangle in setup order
+    """
+    n = setup.n
+
+    # Scanlines of every triangle (triangle of each scanline, then its y coordinate)
+    rows = np.maximum(setup.y_max - setup.y_min + 1, 0)
+    tri = np.repeat(np.arange(len(setup)), rows)
+    ys = setup.y_min[tri] + np.arange(tri.size) - np.repeat(np.cumsum(rows) - rows, rows)
+    V1, V2, V3 = setup.V[tri, 0], setup.V[tri, 1], setup.V[tri, 2]
+    C1, C2, C3 = V1[:, :n], V2[:, :n], V3[:, :n]
+    if ys.size == 0:
+        return tri, ys, ys.copy(), np.empty((0, V1.shape[1] - n + 1))
+
+    # Interpolate point A and its attributes between C1 and C2 (top half) or C2 and C3 (bottom half)
+    top = (ys < C2[:, 1])[:, None]
+    A = np.where(top, vector_interp_array(C1, C2, V1, V2, ys, 2), vector_interp_array(C2, C3, V2, V3, ys, 2))
+
+    # Interpolate point B and its attributes between C1 and C3
+    B = vector_interp_array(C1, C3, V1, V3, ys, 2)
+
+    # Ensure A is to the left of B (for left-to-right horizontal interpolation)
+    swap = (A[:, 0] > B[:, 0])[:, None]
+    A, B = np.where(swap, B, A), np.where(swap, A, B)
+
+    # Determine horizontal range of pixels of every span (clamped to image bounds)
+    x_min = np.maximum(0, np.floor(A[:, 0])).astype(int)
+    x_max = np.minimum(width - 1, np.ceil(B[:, 0])).astype(int)
+    counts = np.maximum(x_max - x_min + 1, 0)
+
+    # Expand the spans into pixels (row of each pixel, then its x coordinate)
+    row = np.repeat(np.arange(ys.size), counts)
+    xs = x_min[row] + np.arange(row.size) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Interpolate the depth and the attributes at every pixel of every span
+    attr_P = vector_interp_array(A[row], B[row], A[row, n - 1:], B[row, n - 1:], xs, 1)
+
+    return tri[row], ys[row], xs, attr_P
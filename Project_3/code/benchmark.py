@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from MatPhong import MatPhong
+from light_func import light
+from calc_normals_func import calc_normals
+from lookat_func import lookat
+from perspective_project_func import perspective_project
+from rasterize_func import rasterize
+from shade_gouraud_func import shade_gouraud, shade_gouraud_vec
+from shade_phong_func import shade_phong, shade_phong_vec
+from render_object_func import render_object, render_progressive
+from meshlet_func import build_meshlets, cull_meshlets
+from lod_func import build_lods
+from texture_cache_func import load_texture
+from scene_file_func import Scene, load_scene
+
+# ----------------------------------------------------------------------------
+# Benchmark harness (the same in every project)
+# ----------------------------------------------------------------------------
+
+def measure(name, fn, repeat=3, number=1, triangles=0, pixels=None):
+    """
+    Times one benchmark case.
+
+    fn is called once to warm up, then `repeat` times `number` calls are timed (the median
+    sample is reported, per call), and one more call runs under tracemalloc for the peak
+    memory allocated by the call. Anything fn prints is discarded.
+
+    Parameters:
+    - name: Name of the case.
+    - fn: Function without arguments running the case.
+    - repeat: Number of timing samples.
+    - number: Calls per timing sample (for very short cases).
+    - triangles: Triangles processed by one call.
+    - pixels: Pixels shaded by one call; None counts them in the result of the warm-up call
+      (see count_pixels).
+
+    Returns:
+    - Dict with the timings, the throughputs and the peak memory of the case.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = fn()
+        if pixels is None:
+            pixels = count_pixels(out)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    seconds = float(np.median(samples))
+    return {
+        'name': name,
+        'seconds': seconds,
+        'min_seconds': float(np.min(samples)),
+        'repeat': repeat,
+        'number': number,
+        'triangles': int(triangles),
+        'pixels': int(pixels),
+        'triangles_per_s': triangles / seconds if seconds > 0 else 0.0,
+        'pixels_per_s': pixels / seconds if seconds > 0 else 0.0,
+        'peak_bytes': int(peak),
+    }
+
+
+def count_pixels(img):
+    """
+    Number of pixels of an image that differ from the white background (1, or 255 for uint8
+    images). A case may also return its pixel count directly (e.g. summed over several
+    frames); anything else counts 0.
+    """
+    if isinstance(img, (int, np.integer)):
+        return int(img)
+    if not isinstance(img, np.ndarray) or img.ndim != 3:
+        return 0
+    return int(np.count_nonzero(np.any(img != (255 if img.dtype == np.uint8 else 1), axis=2)))
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compares results with a baseline run and prints the ratio of every case.
+
+    A case regresses when it is more than `tolerance` (relative) slower than in the baseline,
+    or when its peak memory grew by more than `tolerance`.
+
+    Parameters:
+    - results: List of case dicts (see measure).
+    - baseline: Contents of a JSON file written by an earlier run.
+    - tolerance: Allowed relative slowdown / memory growth.
+
+    Returns:
+    - List of the names of the regressed cases.
+    """
+    base = {case['name']: case for case in baseline['results']}
+    regressions = []
+    for case in results:
+        ref = base.get(case['name'])
+        if ref is None:
+            print(f"{case['name']:<32} (not in baseline)")
+            continue
+
+        time_ratio = case['seconds'] / ref['seconds'] if ref['seconds'] > 0 else 1.0
+        mem_ratio = case['peak_bytes'] / ref['peak_bytes'] if ref['peak_bytes'] > 0 else 1.0
+        regressed = time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(case['name'])
+        print(f"{case['name']:<32} time x{time_ratio:6.2f}  memory x{mem_ratio:6.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main(project, cases):
+    """
+    Command line entry point: runs the cases, writes the JSON report and optionally
+    compares it with a baseline (exit status 1 on regressions).
+
+    Parameters:
+    - project: Name of the project (stored in the report).
+    - cases: List of (name, fn, options) with the keyword options of measure.
+    """
+    parser = argparse.ArgumentParser(description=f"Benchmarks of {project}")
+    parser.add_argument('--repeat', type=int, default=3, help="timing samples per case")
+    parser.add_argument('--only', default=None, help="run only the cases whose name contains this text")
+    parser.add_argument('--out', default='benchmark.json', help="JSON report to write")
+    parser.add_argument('--baseline', default=None, help="JSON report of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = []
+    for name, fn, options in cases:
+        if args.only and args.only not in name:
+            continue
+        case = measure(name, fn, repeat=args.repeat, **options)
+        results.append(case)
+        print(f"{name:<32} {case['seconds'] * 1e3:10.3f} ms  {case['triangles_per_s']:12.0f} tri/s  "
+              f"{case['pixels_per_s']:12.0f} px/s  {case['peak_bytes'] / 2**20:8.2f} MiB")
+
+    report = {
+        'project': project,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved as {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+# ----------------------------------------------------------------------------
+# Project 3 cases (hw3.npy)
+# ----------------------------------------------------------------------------
+
+# Triangles drawn by the cases of the (slow) per-pixel shaders
+N_PER_PIXEL = 100
+
+def build_cases():
+    data = load_scene("hw3.npy")
+    tex = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
+
+    v_pos = data["v_pos"]
+    v_uvs = data["v_uvs"]
+    t_pos_idx = data["t_pos_idx"].T
+    eye, up, target = data["cam_pos"].flatten(), data["up"].flatten(), data["target"].flatten()
+    res_h, res_w = data["res_h"], data["res_w"]
+    mat = MatPhong(data["ka"], data["kd"], data["ks"], int(data["n"]))
+    l_pos, l_int, l_amb = np.array(data["l_pos"]), np.array(data["l_int"]), data["l_amb"]
+    n_tri = t_pos_idx.shape[1]
+
+    # Projected mesh, as in render_object
+    v_normals = calc_normals(v_pos, t_pos_idx, cache=False)
+    R, t = lookat(eye, up, target)
+    proj_pts, depth = perspective_project(v_pos, data["focal"], R, t)
+    screen_pts = rasterize(proj_pts, data["plane_w"], data["plane_h"], res_w, res_h)
+    vertices_2d = np.vstack([screen_pts, depth])
+
+    def shade_all(shade, n):
+        # Draw the first n triangles with one shading kernel
+        def run():
+            img = np.ones((res_h, res_w, 3), dtype=np.float32)
+            for i in range(n):
+                idx = t_pos_idx[:, i]
+                shade(v_pos=vertices_2d[:, idx], v_nrm=v_normals[:, idx], v_uvs=v_uvs[idx, :], tex=tex,
+                      cam_pos=eye, mat=mat, l_pos=l_pos, l_int=l_int, l_amb=l_amb, img=img)
+            return img
+        return run
+
+    def render(**kw):
+        return lambda: render_object(v_pos=v_pos, v_uvs=v_uvs, t_pos_idx=t_pos_idx, tex=tex,
+                                     plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=res_h, res_w=res_w,
+                                     focal=data["focal"], eye=eye, up=up, target=target, mat=mat,
+                                     l_pos=l_pos, l_int=l_int, l_amb=l_amb, **kw)
+
+    def progressive(passes, **kw):
+        # First `passes` images of a progressive render (e.g. 1 = time to the first image)
+        def run():
+            frames = render_progressive(v_pos=v_pos, v_uvs=v_uvs, t_pos_idx=t_pos_idx, tex=tex,
+                                        plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=res_h, res_w=res_w,
+                                        focal=data["focal"], eye=eye, up=up, target=target, mat=mat,
+                                        l_pos=l_pos, l_int=l_int, l_amb=l_amb, **kw)
+            return [img for _, (_, img) in zip(range(passes), frames)][-1]
+        return run
+
+    pt, nrm, vclr = v_pos[:, 0], v_normals[:, 0], np.array([0.5, 0.5, 0.5])
+    meshlets = build_meshlets(v_pos, t_pos_idx, cache=False)
+
+    return [
+        ('load_npy', lambda: np.load("hw3.npy", allow_pickle=True).item(), dict(number=10)),
+        ('load_scene', lambda: Scene("hw3.scene"), dict(number=10)),
+        ('light', lambda: light(pt, nrm, vclr, eye, mat, l_pos, l_int, l_amb), dict(number=1000, pixels=1)),
+        ('calc_normals', lambda: calc_normals(v_pos, t_pos_idx, cache=False), dict(triangles=n_tri)),
+        ('lookat', lambda: lookat(eye, up, target), dict(number=1000)),
+        ('perspective_project', lambda: perspective_project(v_pos, data["focal"], R, t), dict(number=100)),
+        ('rasterize', lambda: rasterize(proj_pts, data["plane_w"], data["plane_h"], res_w, res_h), dict(number=100)),
+        ('build_meshlets', lambda: build_meshlets(v_pos, t_pos_idx, cache=False), dict(triangles=n_tri)),
+        ('cull_meshlets', lambda: cull_meshlets(meshlets, R, t, data["focal"], data["plane_w"], data["plane_h"],
+                                                res_w, res_h), dict(number=100, triangles=n_tri)),
+        ('build_lods', lambda: build_lods(v_pos, v_uvs, t_pos_idx, cache=False), dict(triangles=n_tri)),
+        ('shade_gouraud', shade_all(shade_gouraud, N_PER_PIXEL), dict(triangles=N_PER_PIXEL)),
+        ('shade_phong', shade_all(shade_phong, N_PER_PIXEL), dict(triangles=N_PER_PIXEL)),
+        ('shade_gouraud_vec', shade_all(shade_gouraud_vec, n_tri), dict(triangles=n_tri)),
+        ('shade_phong_vec', shade_all(shade_phong_vec, n_tri), dict(triangles=n_tri)),
+        ('render_object_gouraud_vec', render(shader='gouraud_vec'), dict(triangles=n_tri)),
+        ('render_object_phong_vec', render(shader='phong_vec'), dict(triangles=n_tri)),
+        ('render_object_phong_vec_zbuffer', render(shader='phong_vec', zbuffer=True), dict(triangles=n_tri)),
+        ('render_object_gouraud_vec_workers2', render(shader='gouraud_vec', workers=2), dict(triangles=n_tri)),
+        ('render_object_gouraud_vec_workers4', render(shader='gouraud_vec', workers=4), dict(triangles=n_tri)),
+        ('render_object_phong_vec_workers4', render(shader='phong_vec', zbuffer=True, workers=4),
+         dict(triangles=n_tri)),
+        ('render_object_deferred', render(shader='phong', deferred=True, zbuffer=True), dict(triangles=n_tri)),
+        ('render_object_deferred_clusters', render(shader='phong', deferred=True, zbuffer=True, cull='back',
+                                                   clusters=True), dict(triangles=n_tri)),
+        ('render_object_phong_vec_lod2', render(shader='phong_vec', lod=2), dict(triangles=n_tri)),
+        ('render_object_phong_vec_uint8', render(shader='phong_vec', precision='uint8'), dict(triangles=n_tri)),
+        ('render_object_deferred_float32', render(shader='phong', deferred=True, zbuffer=True, precision='float32'),
+         dict(triangles=n_tri)),
+        ('render_object_phong_vec_numba', render(shader='phong_vec', backend='numba'), dict(triangles=n_tri)),
+        ('render_object_deferred_numba', render(shader='phong', deferred=True, zbuffer=True, backend='numba'),
+         dict(triangles=n_tri)),
+        ('render_progressive_first_pass', progressive(1, shader='phong', zbuffer=True), dict(triangles=n_tri)),
+        ('render_progressive', progressive(4, shader='phong', zbuffer=True), dict(triangles=n_tri)),
+    ]
+
+
+if __name__ == "__main__":
+    main("Project_3", build_cases())
+
+
+
+
+# # Example usage (run from this folder)
+
+# # python benchmark.py --out baseline.json
+# # ... change the code ...
+# # python benchmark.py --out new.json --baseline baseline.json --tolerance 0.1
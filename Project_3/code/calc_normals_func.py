@@ -1,56 +1,92 @@
 import numpy as np
+import hashlib
+from collections import OrderedDict
 
-def calc_normals(pts: np.ndarray, t_pos_idx: np.ndarray) -> np.ndarray:
+# Vertex normals of recently seen meshes, keyed by a hash of their content (LRU order)
+NORMALS_CACHE_SIZE = 8
+_normals_cache = OrderedDict()
+
+def calc_normals(pts: np.ndarray, t_pos_idx: np.ndarray, area_weighted: bool = False,
+                 cache: bool = True) -> np.ndarray:
     """
     Calculate vertex normals from triangle mesh.
 
+    All face normals are computed at once and summed into their vertices with a scatter-add,
+    in the same order as a loop over the triangles would. Results are cached by the content
+    of pts and t_pos_idx, so rendering the same mesh again skips the computation.
+
     Parameters:
     - pts: 3 x Nv array of vertex positions (float64).
-    - t_pos_idx: 3 x Nt array of triangle indices (1-based indexing).
+    - t_pos_idx: 3 x Nt array of triangle indices (0-based indexing).
+    - area_weighted: If True, each face contributes in proportion to its area instead of
+      with a unit normal.
+    - cache: If False, the cache is neither read nor updated.
 
     Returns:
-    - 3 x Nv array of normalized vertex normals.
+    - 3 x Nv array of normalized vertex normals (read-only when it comes from the cache).
     """
     # Ensure input is float64 to avoid dtype casting errors
-    pts = pts.astype(np.float64)
-
-    Nv = pts.shape[1]
-    Nt = t_pos_idx.shape[1]
+    pts = np.ascontiguousarray(pts, dtype=np.float64)
+    t_pos_idx = np.ascontiguousarray(t_pos_idx)
 
-    # Initialize normal vectors with zeros
-    normals = np.zeros((3, Nv), dtype=np.float64)
+    if cache:
+        key = _mesh_key(pts, t_pos_idx, area_weighted)
+        if key in _normals_cache:
+            _normals_cache.move_to_end(key)
+            return _normals_cache[key]
 
-    for k in range(Nt):
-        # Convert from 1-based to 0-based indexing
-        i0, i1, i2 = t_pos_idx[:, k] 
+    Nv = pts.shape[1]
 
-        v0 = pts[:, i0]
-        v1 = pts[:, i1]
-        v2 = pts[:, i2]
+    # Vertices of all triangles (Nt x 3 each)
+    v0 = pts[:, t_pos_idx[0]].T
+    v1 = pts[:, t_pos_idx[1]].T
+    v2 = pts[:, t_pos_idx[2]].T
 
-        # Compute the face normal
-        edge1 = v1 - v0
-        edge2 = v2 - v0
-        face_normal = np.cross(edge1, edge2).astype(np.float64)
+    # Compute all face normals (their length is twice the triangle area)
+    face_normals = np.cross(v1 - v0, v2 - v0)
 
-        # Normalize the face normal
-        norm = np.linalg.norm(face_normal)
-        if norm > 1e-8:
-            face_normal /= norm
+    # Normalize the face normals (unless they are weighted by area)
+    if not area_weighted:
+        norm = np.sqrt(np.sum(face_normals * face_normals, axis=1))
+        ok = norm > 1e-8
+        face_normals[ok] /= norm[ok, None]
 
-        # Add the face normal to each vertex of the triangle
-        normals[:, i0] += face_normal
-        normals[:, i1] += face_normal
-        normals[:, i2] += face_normal
+    # Add each face normal to the three vertices of its triangle (scatter-add), triangle by triangle
+    vertex_idx = t_pos_idx.T.ravel()
+    contrib = np.repeat(face_normals, 3, axis=0)
+    normals = np.stack([np.bincount(vertex_idx, weights=contrib[:, c], minlength=Nv) for c in range(3)])
 
     # Normalize all vertex normals
     norms = np.linalg.norm(normals, axis=0)
     norms[norms < 1e-8] = 1  # avoid division by zero
     normals /= norms
 
+    if cache:
+        normals.setflags(write=False)
+        _normals_cache[key] = normals
+        while len(_normals_cache) > NORMALS_CACHE_SIZE:
+            _normals_cache.popitem(last=False)
+
     return normals
 
 
+def clear_normals_cache() -> None:
+    """
+    Forget all cached vertex normals.
+    """
+    _normals_cache.clear()
+
+
+def _mesh_key(pts: np.ndarray, t_pos_idx: np.ndarray, area_weighted: bool) -> tuple:
+    """
+    Cache key of a mesh: shapes, dtypes and a hash of the raw data.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pts.tobytes())
+    h.update(t_pos_idx.tobytes())
+    return (pts.shape, t_pos_idx.shape, t_pos_idx.dtype.str, area_weighted, h.hexdigest())
+
+
 
 
 # # Example usage of the calc_normals function (uncomment the following lines to test):
@@ -2,10 +2,12 @@ import numpy as np
 import imageio.v3 as iio
 from render_object_func import render_object
 from MatPhong import MatPhong
-from PIL import Image
+from texture_cache_func import load_texture
+from precision_func import to_uint8
+from scene_file_func import load_scene
 
-# Load the data dictionary from hw3.npy
-data = np.load("hw3.npy", allow_pickle=True).item()
+# Load the scene of hw3.npy (converted once into the memory-mapped hw3.scene)
+data = load_scene("hw3.npy")
 
 # Geometry data
 v_pos = data["v_pos"]                # Vertex positions (3 x N)
@@ -30,8 +32,8 @@ l_amb = data["l_amb"]               # Ambient light (3,)
 # Phong exponent used in the "full" lighting mode
 default_n = int(data["n"])
 
-# Load texture image and normalize to [0,1]
-texture = np.asarray(Image.open("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")).astype(np.uint8) / 255.0
+# Load texture image (decoded once and memory-mapped as uint8; texels are fetched in [0,1])
+texture = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
 
 # Lighting configurations:
 # Set only one component at a time for testing (ambient, diffuse, or specular),
@@ -43,33 +45,40 @@ light_configs = {
     "full":     (data["ka"], data["kd"], data["ks"])
 }
 
-# Main loop: render the object using both Gouraud and Phong shaders
-# for each lighting configuration.
+# Main loop: render the object using both Gouraud and Phong shaders.
+# Phong lighting is linear in ka, kd and ks, so a single (deferred) render per shader
+# returns the unweighted ambient, diffuse and specular layers, and every lighting
+# configuration is composed from them with a weighted sum. The geometry never changes,
+# so the G-buffer of the first render is reused by the second one.
+gbuffer = None
 for shader in ["gouraud", "phong"]:
-    for lighting_type, (ka, kd, ks) in light_configs.items():
-        mat = MatPhong(ka=ka, kd=kd, ks=ks, n=default_n)
+    layers, gbuffer = render_object(
+        v_pos=v_pos,
+        v_uvs=v_uvs,
+        t_pos_idx=t_pos_idx,
+        tex=texture,
+        plane_h=plane_h,
+        plane_w=plane_w,
+        res_h=res_h,
+        res_w=res_w,
+        focal=focal,
+        eye=eye,
+        up=up,
+        target=target,
+        mat=MatPhong(ka=1.0, kd=1.0, ks=1.0, n=default_n),
+        l_pos=l_pos,
+        l_int=l_int,
+        l_amb=l_amb,
+        shader=f"{shader}_vec",
+        gbuffer=gbuffer,
+        return_gbuffer=True,
+        layers=True
+    )
 
-        img = render_object(
-            v_pos=v_pos,
-            v_uvs=v_uvs,
-            t_pos_idx=t_pos_idx,
-            tex=texture,
-            plane_h=plane_h,
-            plane_w=plane_w,
-            res_h=res_h,
-            res_w=res_w,
-            focal=focal,
-            eye=eye,
-            up=up,
-            target=target,
-            mat=mat,
-            l_pos=l_pos,
-            l_int=l_int,
-            l_amb=l_amb,
-            shader=shader
-        )
+    for lighting_type, (ka, kd, ks) in light_configs.items():
+        img = layers.compose(ka, kd, ks)
 
         # Save the rendered image
         filename = f"render_{shader}_{lighting_type}.png"
-        iio.imwrite(filename, (img * 255).astype(np.uint8))
+        iio.imwrite(filename, to_uint8(img))
         print(f"[] Saved: {filename}")
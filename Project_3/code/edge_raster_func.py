@@ -0,0 +1,149 @@
+import numpy as np
+from typing import Tuple, Optional
+from triangle_kernel_func import triangle_pixels
+
+# Number of fractional bits of the fixed-point vertex positions (1/256 pixel)
+SUBPIXEL_BITS = 8
+
+# Largest vertex coordinate (in pixels) whose edge functions still fit in 64-bit integers
+MAX_COORD = 1 << (28 - SUBPIXEL_BITS)
+
+def triangle_pixels_fixed(
+    v_pos: np.ndarray,      # 3x3 triangle vertices in image space (x, y, depth as rows)
+    res_h: int,             # image height in pixels
+    res_w: int,             # image width in pixels
+    bounds: Optional[Tuple[int, int, int, int]] = None,  # optional (min_y, max_y, min_x, max_x) pixel window
+    setup=None              # optional record of the triangle (see triangle_setup_func)
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds all pixels covered by a triangle with integer edge functions (drop-in replacement
+    for triangle_pixels).
+
+    The vertices are snapped to a fixed-point grid with SUBPIXEL_BITS fractional bits, so
+    sub-pixel positions are kept instead of being rounded to whole pixels. The three edge
+    functions are evaluated once, exactly, at the first pixel center of the bounding box
+    and then advanced by constant integer steps along the columns and rows. A pixel center
+    lying exactly on an edge belongs to the triangle only if the edge is a top or a left
+    edge (top-left fill rule), so triangles sharing an edge never leave gaps and never
+    cover a pixel twice. The barycentric weights are the edge functions divided by the
+    triangle area: there is no per-pixel linear solve.
+
+    Parameters:
+    - v_pos: (3, 3) array with the projected vertices as columns (pixel x, pixel y, depth);
+      x and y may be fractional.
+    - res_h, res_w: Size of the target image (used to clamp the bounding box).
+    - bounds: Optional inclusive pixel window (min_y, max_y, min_x, max_x), e.g. a screen tile.
+    - setup: Optional setup record of the triangle (setup[k] of setup_triangles with
+      subpixel=True): the snapped area, edge functions and bounding box are read from it.
+
+    Returns:
+    - ys, xs: (P,) integer pixel coordinates of the covered pixels.
+    - u, v, w: (P,) barycentric weights of vertex 0, 1 and 2 at those pixels.
+    """
+    x = np.asarray(v_pos[0, :], dtype=np.float64)
+    y = np.asarray(v_pos[1, :], dtype=np.float64)
+
+    # A record without the fixed-point edges (not set up with subpixel=True) is not used
+    if setup is not None and setup.fixed is None:
+        setup = None
+
+    # Vertices too far away for exact integer arithmetic: use the floating-point kernel
+    if setup is not None and not setup.fixed:
+        return triangle_pixels(v_pos, res_h, res_w, bounds, setup)
+    if setup is None and not (np.all(np.isfinite(x)) and np.all(np.isfinite(y)) and
+                              np.max(np.abs(x)) < MAX_COORD and np.max(np.abs(y)) < MAX_COORD):
+        return triangle_pixels(v_pos, res_h, res_w, bounds)
+
+    empty_i = np.empty(0, dtype=int)
+    empty_f = np.empty(0, dtype=np.float64)
+    one = 1 << SUBPIXEL_BITS
+
+    if setup is not None:
+        # Steps 1-2 and the edges of step 3 from the triangle setup
+        area = int(setup.fixed_area)
+        min_x, max_x, min_y, max_y = int(setup.min_x), int(setup.max_x), int(setup.min_y), int(setup.max_y)
+        coefs = [tuple(int(c) for c in edge) for edge in setup.fixed_edges]
+    else:
+        # Step 1: Snap the vertices to the fixed-point grid
+        X = np.round(x * one).astype(np.int64)
+        Y = np.round(y * one).astype(np.int64)
+
+        # Twice the signed area
+        area = int((X[1] - X[0]) * (Y[2] - Y[0]) - (Y[1] - Y[0]) * (X[2] - X[0]))
+
+        # Step 2: Bounding box (clamped to image bounds)
+        min_x = max(int(np.floor(np.min(x))), 0)
+        max_x = min(int(np.ceil(np.max(x))), res_w - 1)
+        min_y = max(int(np.floor(np.min(y))), 0)
+        max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+
+        # Step 3: Edge functions dx * py - dy * px + c, oriented so that the inside is positive.
+        # Edge k is opposite to vertex k, so its value is the (unnormalized) weight of vertex k.
+        sign = 1 if area > 0 else -1
+        coefs = []
+        for a, b in ((1, 2), (2, 0), (0, 1)):
+            dx = int(X[b] - X[a]) * sign
+            dy = int(Y[b] - Y[a]) * sign
+
+            # Top-left fill rule (y points down): pixel centers on other edges are left out
+            top_left = dy < 0 or (dy == 0 and dx > 0)
+            coefs.append((dx, dy, dy * int(X[a]) - dx * int(Y[a]), 0 if top_left else -1))
+
+    # Degenerate triangles cover nothing
+    if area == 0:
+        return empty_i, empty_i, empty_f, empty_f, empty_f
+
+    # Restrict the bounding box to the pixel window
+    if bounds is not None:
+        min_y, max_y = max(min_y, bounds[0]), min(max_y, bounds[1])
+        min_x, max_x = max(min_x, bounds[2]), min(max_x, bounds[3])
+    if min_x > max_x or min_y > max_y:
+        return empty_i, empty_i, empty_f, empty_f, empty_f
+
+    # Edge functions at the first pixel center of the box, then integer steps of one pixel
+    cols = np.arange(max_x - min_x + 1, dtype=np.int64)
+    rows = np.arange(max_y - min_y + 1, dtype=np.int64)
+    px0 = min_x * one + one // 2       # first pixel center, in fixed point
+    py0 = min_y * one + one // 2
+
+    edges = []
+    for dx, dy, c, bias in coefs:
+        e0 = dx * py0 - dy * px0 + c
+        step_x = -dy * one
+        step_y = dx * one
+        edges.append((e0 + rows[:, None] * step_y + cols[None, :] * step_x, bias))
+
+    # Step 4: Coverage test (every edge function non-negative, with the fill rule bias)
+    inside = np.ones((rows.size, cols.size), dtype=bool)
+    for e, bias in edges:
+        inside &= (e + bias) >= 0
+
+    jj, ii = np.nonzero(inside)
+    if jj.size == 0:
+        return empty_i, empty_i, empty_f, empty_f, empty_f
+
+    # Step 5: Barycentric weights from the edge functions
+    area = abs(area)
+    u = edges[0][0][jj, ii] / area
+    v = edges[1][0][jj, ii] / area
+    w = edges[2][0][jj, ii] / area
+
+    return jj + min_y, ii + min_x, u, v, w
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# # Two triangles sharing the diagonal of a square: every pixel is covered exactly once
+# import matplotlib.pyplot as plt
+
+# count = np.zeros((32, 32))
+# for tri in [np.array([[4.3, 27.6, 27.6], [4.2, 4.2, 28.9], [0, 0, 0]]),
+#             np.array([[4.3, 27.6, 4.3], [4.2, 28.9, 28.9], [0, 0, 0]])]:
+#     ys, xs, u, v, w = triangle_pixels_fixed(tri, 32, 32)
+#     count[ys, xs] += 1
+
+# plt.imshow(count)
+# plt.title("Coverage count (max = %d)" % count.max())
+# plt.show()
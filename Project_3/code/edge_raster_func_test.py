@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from edge_raster_func import triangle_pixels_fixed
+from triangle_setup_func import setup_triangles
+
+# Tests of the fixed-point rasterizer: with the top-left fill rule, triangles that share an
+# edge must cover every pixel along it exactly once (no gaps, no double coverage).
+# Run with: python -m pytest edge_raster_func_test.py
+
+RES_H, RES_W = 48, 64
+
+
+def coverage_counts(vertices_2d, t_pos_idx, use_setup):
+    """
+    Number of times every pixel is covered by the triangles (3, Nt) of vertices_2d (3, Nv).
+    """
+    setup = setup_triangles(vertices_2d, t_pos_idx, RES_H, RES_W, subpixel=True) if use_setup else None
+    counts = np.zeros((RES_H, RES_W), dtype=int)
+    for k in range(t_pos_idx.shape[1]):
+        v_pos = vertices_2d[:, t_pos_idx[:, k]]
+        ys, xs, _, _, _ = triangle_pixels_fixed(v_pos, RES_H, RES_W, setup=setup[k] if use_setup else None)
+        np.add.at(counts, (ys, xs), 1)
+    return counts
+
+
+def inside_polygon(points):
+    """
+    Mask of the pixels whose center is clearly inside the convex polygon points (N, 2),
+    given counter-clockwise or clockwise (a margin keeps the centers on its edges out).
+    """
+    py, px = np.mgrid[0:RES_H, 0:RES_W] + 0.5
+    sign = None
+    inside = np.ones((RES_H, RES_W), dtype=bool)
+    for a, b in zip(points, np.roll(points, -1, axis=0)):
+        edge = (b[0] - a[0]) * (py - a[1]) - (b[1] - a[1]) * (px - a[0])
+        edge /= np.hypot(b[0] - a[0], b[1] - a[1])
+        sign = np.sign(np.sum(edge)) if sign is None else sign
+        inside &= sign * edge > 1e-3
+    return inside
+
+
+def quad(points):
+    """
+    Two triangles sharing the diagonal 0-2 of the quad points (4, 2), both with the same winding.
+    """
+    vertices_2d = np.vstack([np.asarray(points, dtype=np.float64).T, np.ones((1, 4))])
+    return vertices_2d, np.array([[0, 1, 2], [0, 2, 3]]).T
+
+
+@pytest.mark.parametrize("use_setup", [False, True])
+@pytest.mark.parametrize("points", [
+    [(4, 4), (60, 4), (60, 44), (4, 44)],                      # diagonal through pixel corners
+    [(4.5, 4.5), (59.5, 4.5), (59.5, 43.5), (4.5, 43.5)],      # diagonal through pixel centers
+    [(10, 2), (40.5, 2), (40.5, 46), (10, 46)],                # vertical shared edges of the outline
+    [(3.25, 7.75), (58.6, 3.1), (61.9, 40.3), (6.7, 45.2)],    # arbitrary sub-pixel positions
+])
+def test_shared_edge_covered_once(points, use_setup):
+    vertices_2d, t_pos_idx = quad(points)
+    counts = coverage_counts(vertices_2d, t_pos_idx, use_setup)
+
+    assert counts.max() == 1
+    assert np.all(counts[inside_polygon(np.asarray(points, dtype=np.float64))] == 1)
+
+
+@pytest.mark.parametrize("use_setup", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_fan_covered_once(seed, use_setup):
+    # Triangle fan around a center vertex: all triangles share edges with their neighbours
+    rng = np.random.default_rng(seed)
+    n = 9
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+    center = np.array([RES_W / 2 + rng.uniform(-2, 2), RES_H / 2 + rng.uniform(-2, 2)])
+    ring = center + np.stack([np.cos(angles) * 28, np.sin(angles) * 20], axis=1)
+    points = np.vstack([center, ring])
+    vertices_2d = np.vstack([points.T, np.ones((1, n + 1))])
+    t_pos_idx = np.array([[0, 1 + k, 1 + (k + 1) % n] for k in range(n)]).T
+
+    counts = coverage_counts(vertices_2d, t_pos_idx, use_setup)
+
+    assert counts.max() == 1
+    if np.all(np.diff(np.r_[angles, angles[0] + 2 * np.pi]) < np.pi):
+        # Convex outline: every pixel clearly inside it is covered
+        assert np.all(counts[inside_polygon(ring)] == 1)
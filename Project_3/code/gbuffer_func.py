@@ -0,0 +1,307 @@
+import numpy as np
+from typing import Union, List, Callable, Optional, Iterator, Tuple
+from MatPhong import MatPhong
+from depth_buffer_func import DepthBuffer
+from triangle_kernel_func import triangle_pixels
+from edge_raster_func import triangle_pixels_fixed
+from triangle_setup_func import TriangleSetup, setup_triangles, batch_pixels
+from shade_gouraud_func import gouraud_vertex_colors
+from light_func import LightLayers
+from mip_texture_func import MipTexture, uv_gradients
+from render_stats_func import RenderStats
+from precision_func import Precision, PRECISIONS, get_precision, to_framebuffer
+from kernel_backend_func import KernelBackend, get_backend
+
+class GBuffer:
+    def __init__(self, res_h: int, res_w: int, dtype=np.float64) -> None:
+        """
+        Geometry buffer of a rendered view: everything the lighting pass needs, per pixel.
+
+        Pixels not covered by the object have tri_id == -1. The per-pixel attributes are only
+        filled for covered pixels. The mesh data is kept as well, so the buffer can be
+        lit again with other materials and lights without rasterizing again.
+
+        Parameters:
+        - res_h, res_w: Resolution of the image.
+        - dtype: Float type of the shading attributes (normal, position, texel), the compute
+          type of the render (see precision_func). Barycentrics, depth and UV stay float64.
+        """
+        self.res_h = res_h
+        self.res_w = res_w
+        self.dtype = np.dtype(dtype)
+        self.tri_id = np.full((res_h, res_w), -1, dtype=np.int32)  # Triangle visible at each pixel
+        self.bary = np.zeros((res_h, res_w, 3))                     # Barycentric weights (u, v, w)
+        self.depth = np.full((res_h, res_w), np.inf)                # Interpolated depth
+        self.normal = np.zeros((res_h, res_w, 3), dtype=dtype)      # Interpolated unit normal
+        self.position = np.zeros((res_h, res_w, 3), dtype=dtype)    # Interpolated world position
+        self.uv = np.zeros((res_h, res_w, 2))                       # Interpolated texture coordinates
+        self.texel = np.zeros((res_h, res_w, 3), dtype=dtype)       # Texture color
+
+        # Mesh data needed to light the buffer again
+        self.vertices_2d = None   # (3, Nv) screen-space vertices (x, y, depth)
+        self.v_pos = None         # (3, Nv) world-space vertices
+        self.v_normals = None     # (3, Nv) vertex normals
+        self.v_uvs = None         # (Nv, 2) texture coordinates
+        self.t_pos_idx = None     # (3, Nt) triangle indices
+        self.tex = None           # (H, W, 3) texture image
+
+    @property
+    def mask(self) -> np.ndarray:
+        """
+        (res_h, res_w) boolean mask of the covered pixels.
+        """
+        return self.tri_id >= 0
+
+
+def build_gbuffer(
+    vertices_2d: np.ndarray,
+    v_pos: np.ndarray,
+    v_normals: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    tex: np.ndarray,
+    res_h: int,
+    res_w: int,
+    zbuffer: bool = False,
+    coverage: Callable = triangle_pixels,
+    stats: Optional[RenderStats] = None,
+    dtype=np.float64,
+    backend: Union[None, str, KernelBackend] = None,
+    setup: Optional[TriangleSetup] = None
+) -> GBuffer:
+    """
+    Geometry pass of deferred shading: rasterizes the triangles once and stores, per pixel,
+    the visible triangle with its barycentric weights, depth, normal, world position, UV
+    and texel color. No lighting is done here.
+
+    Parameters:
+    - vertices_2d: (3, Nv) projected vertices (pixel x, pixel y, depth).
+    - v_pos: (3, Nv) world-space vertex positions.
+    - v_normals: (3, Nv) vertex normals.
+    - v_uvs: (Nv, 2) texture coordinates.
+    - t_pos_idx: (3, Nt) triangle indices (0-based).
+    - tex: (H, W, 3) texture image.
+    - res_h, res_w: Resolution of the image.
+    - zbuffer: If True, the nearest triangle is kept at every pixel; otherwise the last one
+      in index order, exactly as in the forward renderer.
+    - coverage: Coverage kernel, triangle_pixels or triangle_pixels_fixed (sub-pixel precision).
+    - stats: Optional RenderStats that counts the covered fragments (pixels_tested).
+    - dtype: Float type of the shading attributes (see GBuffer).
+    - backend: Kernel backend of the texel fetches (see kernel_backend_func); the coverage
+      kernel is passed as coverage.
+    - setup: TriangleSetup of the triangles (see triangle_setup_func), set up here if not
+      given. With the NumPy triangle_pixels the triangles are rasterized many at once from
+      it, otherwise one by one from their records; the buffer is the same.
+
+    Returns:
+    - The filled GBuffer.
+    """
+    kernels = get_backend(backend)
+    gbuf = GBuffer(res_h, res_w, dtype)
+    gbuf.vertices_2d = vertices_2d
+    gbuf.v_pos = v_pos
+    gbuf.v_normals = v_normals
+    gbuf.v_uvs = v_uvs
+    gbuf.t_pos_idx = t_pos_idx
+    gbuf.tex = tex
+
+    zbuf = DepthBuffer(res_h, res_w) if zbuffer else None
+
+    # Triangle setup of all triangles (with the UV planes for the level of detail)
+    if setup is None:
+        attributes = {'uv': np.stack([v_uvs[:, 0], 1 - v_uvs[:, 1]])} if isinstance(tex, MipTexture) else None
+        setup = setup_triangles(vertices_2d, t_pos_idx, res_h, res_w, attributes,
+                                subpixel=coverage is triangle_pixels_fixed)
+
+    # Step 1: Visibility only (triangle id and barycentrics per pixel)
+    batched = coverage is triangle_pixels
+    fragments = batch_pixels(setup) if batched else _triangle_fragments(coverage, vertices_2d, t_pos_idx, v_pos.shape[1],
+                                                                       setup, res_h, res_w)
+    for tri, ys, xs, u, v, w in fragments:
+        if stats is not None:
+            stats.add('pixels_tested', ys.size)
+        z = u * setup.z[tri, 0] + v * setup.z[tri, 1] + w * setup.z[tri, 2]
+
+        # Fragments of many triangles: a pixel may appear several times
+        if zbuf is not None:
+            visible = zbuf.resolve(ys, xs, z) if batched else zbuf.test(ys, xs, z)
+        elif batched:
+            # The last triangle in index order wins
+            pixel = ys * res_w + xs
+            _, last = np.unique(pixel[::-1], return_index=True)
+            visible = pixel.size - 1 - last
+        else:
+            visible = slice(None)
+        tri, ys, xs, u, v, w, z = tri[visible], ys[visible], xs[visible], u[visible], v[visible], w[visible], z[visible]
+
+        gbuf.tri_id[ys, xs] = tri
+        gbuf.bary[ys, xs] = np.stack([u, v, w], axis=1)
+        gbuf.depth[ys, xs] = z
+
+    # Step 2: Interpolate the attributes of the visible pixels only
+    ys, xs = np.nonzero(gbuf.mask)
+    idx = t_pos_idx[:, gbuf.tri_id[ys, xs]]      # (3, P) vertex indices per pixel
+
+    def interp(values, bary):
+        # values: (D, Nv) per-vertex attribute -> (P, D) per-pixel attribute
+        return (bary[:, 0:1] * values[:, idx[0]].T + bary[:, 1:2] * values[:, idx[1]].T
+                + bary[:, 2:3] * values[:, idx[2]].T)
+
+    # Shading attributes in the compute type
+    bary = gbuf.bary[ys, xs].astype(dtype, copy=False)
+    nrm = interp(v_normals.astype(dtype, copy=False), bary)
+    gbuf.normal[ys, xs] = nrm / (np.sqrt(np.sum(nrm * nrm, axis=1, keepdims=True)) + 1e-8)
+    gbuf.position[ys, xs] = interp(v_pos.astype(dtype, copy=False), bary)
+
+    # Texture coordinates in float64 (the fetched texels do not depend on the policy)
+    uv = interp(v_uvs.T, gbuf.bary[ys, xs])
+    gbuf.uv[ys, xs] = uv
+    if isinstance(tex, MipTexture):
+        # Filtered fetch, level of detail from the UV derivatives of each pixel's triangle
+        if 'uv' in setup.planes:
+            tri = gbuf.tri_id[ys, xs]
+            gradients = [g[tri] for g in setup.gradients('uv')]
+        else:
+            x, y = vertices_2d[0, idx].T, vertices_2d[1, idx].T
+            s, t = v_uvs[idx, 0].T, 1 - v_uvs[idx, 1].T
+            gradients = uv_gradients(x, y, s, t)
+        gbuf.texel[ys, xs] = tex.sample(uv[:, 0], 1 - uv[:, 1], tex.lod(*gradients))
+    else:
+        tu = np.clip((uv[:, 0] * (tex.shape[1] - 1)).astype(int), 0, tex.shape[1] - 1)
+        tv = np.clip(((1 - uv[:, 1]) * (tex.shape[0] - 1)).astype(int), 0, tex.shape[0] - 1)
+        gbuf.texel[ys, xs] = kernels.texels(tex, tv, tu, dtype)
+
+    return gbuf
+
+
+def _triangle_fragments(
+    coverage: Callable,
+    vertices_2d: np.ndarray,
+    t_pos_idx: np.ndarray,
+    n_vertices: int,
+    setup: TriangleSetup,
+    res_h: int,
+    res_w: int
+) -> Iterator[Tuple[np.ndarray, ...]]:
+    """
+    Covered pixels of the triangles one by one, with any coverage kernel reading the setup
+    records (the form of batch_pixels: tri, ys, xs, u, v, w).
+    """
+    for triangle_idx in range(t_pos_idx.shape[1]):
+        idx = t_pos_idx[:, triangle_idx]
+
+        # Skip if any index is invalid
+        if np.any(idx >= n_vertices) or np.any(idx < 0):
+            continue
+
+        ys, xs, u, v, w = coverage(vertices_2d[:, idx], res_h, res_w, None, setup[triangle_idx])
+        yield np.full(ys.size, triangle_idx), ys, xs, u, v, w
+
+
+def shade_gbuffer(
+    gbuf: GBuffer,
+    cam_pos: np.ndarray,
+    mat: MatPhong,
+    l_pos: Union[np.ndarray, List[np.ndarray]],
+    l_int: Union[np.ndarray, List[np.ndarray]],
+    l_amb: np.ndarray,
+    shader: str = 'phong',
+    fixed_dirs: bool = True,
+    stats: Optional[RenderStats] = None,
+    layers: bool = False,
+    precision: Optional[Precision] = None,
+    backend: Union[None, str, KernelBackend] = None,
+    pixels: Optional[np.ndarray] = None
+) -> Union[np.ndarray, LightLayers]:
+    """
+    Lighting pass of deferred shading: lights every covered pixel of a G-buffer at once.
+
+    Parameters:
+    - gbuf: G-buffer produced by build_gbuffer.
+    - cam_pos: Camera position (3,).
+    - mat: Instance of MatPhong defining surface material.
+    - l_pos, l_int: Light positions and their intensities.
+    - l_amb: Ambient light intensity.
+    - shader: 'phong' (per-pixel lighting) or 'gouraud' (per-vertex lighting, interpolated).
+    - fixed_dirs: For 'phong', use one view/light direction per triangle, taken at its
+      centroid, like shade_phong does. If False, use the per-pixel world position instead.
+    - stats: Optional RenderStats that counts the lit pixels (pixels_shaded), once each.
+    - layers: If True, light with ka = kd = ks = 1 and keep the ambient, diffuse and specular
+      terms apart (mat only provides n). Composing them (LightLayers.compose) gives the image
+      of any ka/kd/ks.
+    - precision: Framebuffer type of the image (see precision_func; default float32). The
+      lighting runs in the type of the G-buffer.
+    - backend: Kernel backend of the lighting (see kernel_backend_func).
+    - pixels: Optional (res_h, res_w) boolean mask: only the covered pixels inside it are lit,
+      the others are left as background (e.g. the passes of a progressive render). Every pixel
+      gets the same color as when lighting the whole buffer.
+
+    Returns:
+    - img: (res_h, res_w, 3) image with RGB values in [0, 1] (or [0, 255] for a uint8
+      framebuffer), or the LightLayers of the view if layers is True.
+    """
+    img = get_precision(precision, PRECISIONS['mixed']).new_image(gbuf.res_h, gbuf.res_w)
+    dtype = gbuf.dtype
+    kernels = get_backend(backend)
+
+    ys, xs = np.nonzero(gbuf.mask if pixels is None else gbuf.mask & pixels)
+    if stats is not None:
+        stats.add('pixels_shaded', ys.size)
+    if ys.size == 0:
+        if layers:
+            empty = np.zeros((gbuf.res_h, gbuf.res_w, 3), dtype=dtype)
+            return LightLayers(empty, empty.copy(), empty.copy(), gbuf.mask)
+        return img
+    tri_id = gbuf.tri_id[ys, xs]
+    cam_pos = np.asarray(cam_pos).reshape(3)
+    l_pos = np.asarray(l_pos).reshape(-1, 3)
+
+    if shader == 'phong':
+        pt = gbuf.position[ys, xs]
+        if fixed_dirs:
+            # View and light directions at the centroid of every visible triangle
+            tris, inverse = np.unique(tri_id, return_inverse=True)
+            pt_center = np.mean(gbuf.vertices_2d[:, gbuf.t_pos_idx[:, tris]], axis=1).T   # (T, 3)
+
+            V = cam_pos - pt_center
+            V = V / (np.linalg.norm(V, axis=1, keepdims=True) + 1e-8)
+            L_list = l_pos[None, :, :] - pt_center[:, None, :]
+            L_list = L_list / (np.linalg.norm(L_list, axis=2, keepdims=True) + 1e-8)
+
+            V, L_list = V[inverse], L_list[inverse]
+        else:
+            # View and light directions at every pixel (computed by light_batch)
+            V, L_list = None, None
+
+        color = kernels.light_batch(pt, gbuf.normal[ys, xs], gbuf.texel[ys, xs], cam_pos, mat, l_pos, l_int, l_amb,
+                                    fixed_V=V, fixed_L_list=L_list, layers=layers, dtype=dtype)
+
+    elif shader == 'gouraud':
+        # Light the vertices of every visible triangle, then interpolate
+        tris, inverse = np.unique(tri_id, return_inverse=True)
+        vertex_colors = np.empty((3, tris.size, 3, 3) if layers else (tris.size, 3, 3), dtype=dtype)
+        for k, triangle_idx in enumerate(tris):
+            idx = gbuf.t_pos_idx[:, triangle_idx]
+            vertex_colors[..., k, :, :] = gouraud_vertex_colors(
+                gbuf.vertices_2d[:, idx], gbuf.v_normals[:, idx], gbuf.v_uvs[idx, :], gbuf.tex,
+                cam_pos, mat, l_pos, l_int, l_amb, layers=layers, dtype=dtype, backend=kernels
+            )
+
+        bary = gbuf.bary[ys, xs].astype(dtype, copy=False)
+        vc = vertex_colors[..., inverse, :, :]
+        color = (bary[:, 0:1] * vc[..., 0, :] + bary[:, 1:2] * vc[..., 1, :]
+                 + bary[:, 2:3] * vc[..., 2, :])
+
+    else:
+        raise ValueError(f"Unknown shader type: {shader}")
+
+    if layers:
+        # One unclipped float layer per term
+        terms = np.zeros((3, gbuf.res_h, gbuf.res_w, 3), dtype=dtype)
+        terms[:, ys, xs, :] = color
+        if shader == 'gouraud':
+            return LightLayers(terms[0], terms[1], terms[2], gbuf.mask, vertex_terms=vc, bary=bary)
+        return LightLayers(terms[0], terms[1], terms[2], gbuf.mask)
+
+    img[ys, xs, :] = to_framebuffer(np.clip(color, 0, 1), img.dtype)
+    return img
@@ -0,0 +1,345 @@
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+from MatPhong import MatPhong
+from triangle_kernel_func import triangle_pixels, interpolate
+from texture_cache_func import texels
+from light_func import light_batch
+
+# Numba is optional: without it the 'numba' backend falls back to the NumPy kernels
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+class KernelBackend:
+    def __init__(
+        self,
+        name: str,
+        triangle_pixels: Callable,
+        interpolate: Callable,
+        texels: Callable,
+        light_batch: Callable
+    ) -> None:
+        """
+        Set of the inner kernels of the vectorized and deferred shaders.
+
+        Every backend implements the same four kernels with the signatures of the NumPy ones:
+        - triangle_pixels: triangle traversal, covered pixels and barycentric weights
+          (see triangle_kernel_func).
+        - interpolate: barycentric interpolation of per-vertex attributes.
+        - texels: nearest texel fetch, scaled to [0, 1] (see texture_cache_func).
+        - light_batch: Phong lighting of many points (see light_func).
+
+        Parameters:
+        - name: Name of the backend (key of BACKENDS).
+        - triangle_pixels, interpolate, texels, light_batch: The kernels.
+        """
+        self.name = name
+        self.triangle_pixels = triangle_pixels
+        self.interpolate = interpolate
+        self.texels = texels
+        self.light_batch = light_batch
+
+    def __repr__(self) -> str:
+        return f"KernelBackend('{self.name}')"
+
+
+# Registered backends, by name
+BACKENDS: Dict[str, KernelBackend] = {}
+
+def register_backend(backend: KernelBackend) -> None:
+    """
+    Adds a backend to BACKENDS (replacing a backend of the same name).
+    """
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(backend=None) -> KernelBackend:
+    """
+    Resolves the backend argument of the render functions.
+
+    Parameters:
+    - backend: None or 'numpy' (the NumPy kernels), 'numba' (JIT-compiled kernels, or the NumPy
+      ones if Numba is not installed), 'auto' (the fastest available) or a KernelBackend.
+
+    Returns:
+    - The KernelBackend.
+    """
+    if isinstance(backend, KernelBackend):
+        return backend
+    if backend is None:
+        backend = 'numpy'
+    if backend == 'auto':
+        backend = 'numba' if 'numba' in BACKENDS else 'numpy'
+    if backend == 'numba' and 'numba' not in BACKENDS and not NUMBA_AVAILABLE:
+        backend = 'numpy'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend: {backend}")
+    return BACKENDS[backend]
+
+
+register_backend(KernelBackend('numpy', triangle_pixels, interpolate, texels, light_batch))
+
+
+# ----------------------------------------------------------------------------
+# JIT-compiled kernels (Numba, CPU). Every kernel repeats the floating-point operations
+# of its NumPy counterpart in the same order. Results can still differ in the last bit
+# (LAPACK and the SIMD loops of NumPy may fuse or vectorize operations), so the coverage of
+# pixels on an edge is decided as in triangle_pixels: the images match up to rounding.
+# ----------------------------------------------------------------------------
+
+def _jit(fn: Callable) -> Callable:
+    """
+    Compiles a kernel in nopython mode. The machine code is cached on disk (in __pycache__),
+    so only the first run of a new version of this file pays for the compilation.
+    """
+    return numba.njit(cache=True, nogil=True)(fn) if numba is not None else fn
+
+
+# Pixels whose barycentric weights are this close to an edge get their coverage decided
+# by the LAPACK solve of triangle_pixels (the compiled solve may differ in the last bit)
+EDGE_TOLERANCE = 1e-9
+
+@_jit
+def _traverse(x0, x1, x2, y0, y1, y2, min_y, max_y, min_x, max_x, tol):
+    """
+    Scans the pixel window row by row and solves the barycentric system of every pixel
+    center with an LU factorization with partial pivoting, as LAPACK does. Keeps the pixels
+    inside the triangle, or within tol of it (flagged as near an edge).
+    """
+    n = max(max_y - min_y + 1, 0) * max(max_x - min_x + 1, 0)
+    ys = np.empty(n, dtype=np.int64)
+    xs = np.empty(n, dtype=np.int64)
+    us = np.empty(n, dtype=np.float64)
+    vs = np.empty(n, dtype=np.float64)
+    ws = np.empty(n, dtype=np.float64)
+    near = np.empty(n, dtype=np.bool_)
+
+    # Factorize the (constant) 2x2 system once; a zero pivot means a degenerate triangle
+    a00, a01, a10, a11 = x0 - x2, x1 - x2, y0 - y2, y1 - y2
+    swap = abs(a10) > abs(a00)
+    if swap:
+        a00, a01, a10, a11 = a10, a11, a00, a01
+    if a00 == 0.0:
+        return ys[:0], xs[:0], us[:0], vs[:0], ws[:0], near[:0]
+    l = a10 * (1.0 / a00)
+    u11 = a11 - l * a01
+    if u11 == 0.0:
+        return ys[:0], xs[:0], us[:0], vs[:0], ws[:0], near[:0]
+
+    k = 0
+    for j in range(min_y, max_y + 1):
+        for i in range(min_x, max_x + 1):
+            b0 = i + 0.5 - x2
+            b1 = j + 0.5 - y2
+            if swap:
+                b0, b1 = b1, b0
+            v = (b1 - l * b0) / u11
+            u = (b0 - a01 * v) / a00
+            w = 1 - u - v
+            if u >= -tol and v >= -tol and w >= -tol:
+                ys[k] = j
+                xs[k] = i
+                us[k] = u
+                vs[k] = v
+                ws[k] = w
+                near[k] = u < tol or v < tol or w < tol
+                k += 1
+    return ys[:k], xs[:k], us[:k], vs[:k], ws[:k], near[:k]
+
+
+def _triangle_pixels_jit(
+    v_pos: np.ndarray,
+    res_h: int,
+    res_w: int,
+    bounds: Optional[Tuple[int, int, int, int]] = None,
+    setup=None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compiled triangle_pixels: same pixel window, same pixel order and the same covered
+    pixels, in one pass without temporary arrays of the whole bounding box (the bounding box
+    of a setup record is used as is).
+    """
+    x = v_pos[0, :]
+    y = v_pos[1, :]
+
+    # Bounding box (clamped to image bounds), restricted to the pixel window
+    if setup is not None:
+        min_x, max_x, min_y, max_y = int(setup.min_x), int(setup.max_x), int(setup.min_y), int(setup.max_y)
+    else:
+        min_x = max(int(np.floor(np.min(x))), 0)
+        max_x = min(int(np.ceil(np.max(x))), res_w - 1)
+        min_y = max(int(np.floor(np.min(y))), 0)
+        max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+    if bounds is not None:
+        min_y, max_y = max(min_y, bounds[0]), min(max_y, bounds[1])
+        min_x, max_x = max(min_x, bounds[2]), min(max_x, bounds[3])
+
+    x0, x1, x2 = (float(c) for c in x)
+    y0, y1, y2 = (float(c) for c in y)
+    ys, xs, u, v, w, near = _traverse(x0, x1, x2, y0, y1, y2, min_y, max_y, min_x, max_x, EDGE_TOLERANCE)
+    if not np.any(near):
+        return ys, xs, u, v, w
+
+    # Pixels near an edge: the same LAPACK solve as triangle_pixels decides
+    A = np.array([[x0 - x2, x1 - x2], [y0 - y2, y1 - y2]])
+    b = np.stack([xs[near] + 0.5 - x2, ys[near] + 0.5 - y2], axis=1)
+    try:
+        sol = np.linalg.solve(np.broadcast_to(A, (b.shape[0], 2, 2)), b[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        return ys[:0], xs[:0], u[:0], v[:0], w[:0]
+    u[near], v[near] = sol[:, 0], sol[:, 1]
+    w[near] = 1 - sol[:, 0] - sol[:, 1]
+
+    inside = (u >= 0) & (v >= 0) & (w >= 0)
+    return ys[inside], xs[inside], u[inside], v[inside], w[inside]
+
+
+@_jit
+def _interpolate(u, v, w, values, out):
+    for p in range(out.shape[0]):
+        for d in range(out.shape[1]):
+            out[p, d] = u[p] * values[0, d] + v[p] * values[1, d] + w[p] * values[2, d]
+    return out
+
+
+def _interpolate_jit(u: np.ndarray, v: np.ndarray, w: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Compiled interpolate (same result type as the NumPy broadcasting).
+    """
+    values = np.ascontiguousarray(values)
+    out = np.empty((u.shape[0], values.shape[1]), dtype=np.result_type(u, v, w, values))
+    return _interpolate(u, v, w, values, out)
+
+
+@_jit
+def _fetch(tex, ty, tx, scale, out):
+    for p in range(out.shape[0]):
+        for c in range(out.shape[1]):
+            # Convert exactly to the result type first, then scale in that type
+            out[p, c] = tex[ty[p], tx[p], c]
+            out[p, c] = out[p, c] / scale
+    return out
+
+
+def _texels_jit(tex: np.ndarray, ty, tx, dtype=np.float64) -> np.ndarray:
+    """
+    Compiled texels for arrays of indices into an (H, W, C) texture (anything else, e.g.
+    scalar indices, goes to the NumPy kernel).
+    """
+    if np.ndim(ty) != 1 or np.ndim(tx) != 1 or np.ndim(tex) != 3:
+        return texels(tex, ty, tx, dtype)
+    tex = np.asarray(tex)  # plain view of a memory-mapped texture
+    dtype = np.dtype(dtype)
+    out = np.empty((np.shape(ty)[0], tex.shape[2]), dtype=dtype)
+    scale = np.asarray(255 if tex.dtype == np.uint8 else 1, dtype=dtype)[()]
+    return _fetch(tex, np.asarray(ty), np.asarray(tx), scale, out)
+
+
+@_jit
+def _phong(nrms, vclrs, l_int, l_amb, V, L, coef, out):
+    """
+    Phong model with given (unit) view and light directions; coef holds ka, kd, ks, n, 1e-8,
+    0 and 1 in the compute type. V and L are either per point or shared (a single row).
+    """
+    ka, kd, ks, n, eps, zero, one = coef[0], coef[1], coef[2], coef[3], coef[4], coef[5], coef[6]
+    for p in range(out.shape[0]):
+        pv = p if V.shape[0] > 1 else 0
+        pl = p if L.shape[0] > 1 else 0
+        for c in range(3):
+            out[p, c] = ka * vclrs[p, c] * l_amb[c]
+        for i in range(l_int.shape[0]):
+            # n . L and the reflection vector
+            n_dot_l = nrms[p, 0] * L[pl, i, 0] + nrms[p, 1] * L[pl, i, 1] + nrms[p, 2] * L[pl, i, 2]
+            r0 = (n_dot_l + n_dot_l) * nrms[p, 0] - L[pl, i, 0]
+            r1 = (n_dot_l + n_dot_l) * nrms[p, 1] - L[pl, i, 1]
+            r2 = (n_dot_l + n_dot_l) * nrms[p, 2] - L[pl, i, 2]
+            r_len = np.sqrt(r0 * r0 + r1 * r1 + r2 * r2) + eps
+            r0, r1, r2 = r0 / r_len, r1 / r_len, r2 / r_len
+
+            # Clipped cosines of the diffuse and specular terms
+            diff = n_dot_l
+            if diff < zero:
+                diff = zero
+            elif diff > one:
+                diff = one
+            r_dot_v = r0 * V[pv, 0] + r1 * V[pv, 1] + r2 * V[pv, 2]
+            if r_dot_v < zero:
+                r_dot_v = zero
+            elif r_dot_v > one:
+                r_dot_v = one
+            spec = r_dot_v ** n
+
+            for c in range(3):
+                out[p, c] = out[p, c] + (kd * vclrs[p, c] * l_int[i, c] * diff + ks * l_int[i, c] * spec)
+
+        for c in range(3):
+            if out[p, c] < zero:
+                out[p, c] = zero
+            elif out[p, c] > one:
+                out[p, c] = one
+    return out
+
+
+def _light_batch_jit(
+    pts: np.ndarray,
+    nrms: np.ndarray,
+    vclrs: np.ndarray,
+    cam_pos: np.ndarray,
+    mat: MatPhong,
+    l_pos: np.ndarray,
+    l_int: np.ndarray,
+    l_amb: np.ndarray,
+    fixed_V: Optional[np.ndarray] = None,
+    fixed_L_list: Optional[np.ndarray] = None,
+    layers: bool = False,
+    dtype=np.float64
+) -> np.ndarray:
+    """
+    Compiled light_batch: the directions are prepared as in light_batch, the Phong model runs
+    in one loop over the points (the unweighted layers go to the NumPy kernel).
+    """
+    if layers:
+        return light_batch(pts, nrms, vclrs, cam_pos, mat, l_pos, l_int, l_amb, fixed_V=fixed_V,
+                           fixed_L_list=fixed_L_list, layers=True, dtype=dtype)
+
+    nrms = np.ascontiguousarray(nrms, dtype=dtype).reshape(-1, 3)
+    vclrs = np.ascontiguousarray(vclrs, dtype=dtype).reshape(-1, 3)
+    l_pos = np.asarray(l_pos, dtype=dtype).reshape(-1, 3)
+    l_int = np.ascontiguousarray(l_int, dtype=dtype).reshape(-1, 3)
+    l_amb = np.ascontiguousarray(l_amb, dtype=dtype).reshape(3)
+
+    # View directions (P, 3) or a single fixed one (1, 3)
+    if fixed_V is not None:
+        V = np.asarray(fixed_V, dtype=dtype).reshape(-1, 3)
+    else:
+        V = np.asarray(cam_pos, dtype=dtype).reshape(3) - np.asarray(pts, dtype=dtype).reshape(-1, 3)
+        V = V / (np.sqrt(np.sum(V * V, axis=1, keepdims=True)) + 1e-8)
+
+    # Light directions (P, L, 3) or fixed ones shared by all points (1, L, 3)
+    if fixed_L_list is not None:
+        L = np.asarray(fixed_L_list, dtype=dtype).reshape(-1, l_pos.shape[0], 3)
+    else:
+        L = l_pos[None, :, :] - np.asarray(pts, dtype=dtype).reshape(-1, 1, 3)
+        L = L / (np.sqrt(np.sum(L * L, axis=2, keepdims=True)) + 1e-8)
+
+    coef = np.array([mat.ka, mat.kd, mat.ks, mat.n, 1e-8, 0, 1], dtype=dtype)
+    out = np.empty((nrms.shape[0], 3), dtype=dtype)
+    return _phong(nrms, vclrs, l_int, l_amb, np.ascontiguousarray(V), np.ascontiguousarray(L), coef, out)
+
+
+if NUMBA_AVAILABLE:
+    register_backend(KernelBackend('numba', _triangle_pixels_jit, _interpolate_jit, _texels_jit, _light_batch_jit))
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# backend = get_backend('auto')  # the JIT kernels if Numba is installed
+# print(backend, sorted(BACKENDS))
+# v_pos = np.array([[10.0, 50.0, 30.0], [10.0, 20.0, 60.0], [1.0, 1.0, 1.0]])
+# ys, xs, u, v, w = backend.triangle_pixels(v_pos, 64, 64)
+# print(ys.size, "pixels,", np.array_equal(ys, triangle_pixels(v_pos, 64, 64)[0]))
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import kernel_backend_func
+from kernel_backend_func import KernelBackend, NUMBA_AVAILABLE, get_backend
+from triangle_kernel_func import triangle_pixels
+from triangle_setup_func import setup_triangles
+from lookat_func import lookat
+from perspective_project_func import perspective_project
+from rasterize_func import rasterize
+from render_object_func import render_object
+from MatPhong import MatPhong
+from texture_cache_func import load_texture
+
+# Tests of the kernel backends on hw3.npy: the JIT kernels must cover the same pixels as the
+# NumPy kernels and give the same images up to rounding. Their bodies are plain Python when
+# Numba is not installed (_jit is the identity), so they are checked here as interpreted
+# code; only the test of the compiled kernels needs Numba.
+# Run with: python -m pytest kernel_backend_func_test.py
+
+data = np.load("hw3.npy", allow_pickle=True).item()
+texture = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
+scene = dict(v_pos=data["v_pos"], v_uvs=data["v_uvs"], t_pos_idx=data["t_pos_idx"].T, tex=texture,
+             plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=data["res_h"], res_w=data["res_w"],
+             focal=data["focal"], eye=data["cam_pos"].flatten(), up=data["up"].flatten(),
+             target=data["target"].flatten(), mat=MatPhong(ka=data["ka"], kd=data["kd"], ks=data["ks"], n=data["n"]),
+             l_pos=np.array(data["l_pos"]), l_int=np.array(data["l_int"]), l_amb=data["l_amb"])
+
+JIT_KERNELS = ('_traverse', '_interpolate', '_fetch', '_phong')
+
+# The LU solve of the JIT traversal may differ from LAPACK in the last bit (see kernel_backend_func)
+TOL = dict(rtol=1e-12, atol=1e-12)
+
+
+@pytest.fixture(scope="module")
+def interpreted():
+    """
+    Backend made of the JIT kernels run as Python (the py_func of every kernel if Numba
+    compiled them).
+    """
+    patch = pytest.MonkeyPatch()
+    for name in JIT_KERNELS:
+        kernel = getattr(kernel_backend_func, name)
+        patch.setattr(kernel_backend_func, name, getattr(kernel, 'py_func', kernel))
+    yield KernelBackend('numba (interpreted)', kernel_backend_func._triangle_pixels_jit,
+                        kernel_backend_func._interpolate_jit, kernel_backend_func._texels_jit,
+                        kernel_backend_func._light_batch_jit)
+    patch.undo()
+
+
+def assert_same_image(result, expected):
+    assert result.dtype == expected.dtype
+    if expected.dtype == np.float64:
+        np.testing.assert_allclose(result, expected, **TOL)
+    else:
+        # One rounding step of the image type at most
+        np.testing.assert_allclose(result, expected, rtol=0, atol=float(np.finfo(expected.dtype).eps))
+
+
+@pytest.mark.parametrize("use_setup", [False, True])
+def test_triangle_pixels(interpreted, use_setup):
+    R, t = lookat(scene["eye"], scene["up"], scene["target"])
+    proj_pts, depth = perspective_project(scene["v_pos"], scene["focal"], R, t)
+    screen_pts = rasterize(proj_pts, scene["plane_w"], scene["plane_h"], scene["res_w"], scene["res_h"])
+    vertices_2d = np.vstack([screen_pts, depth])
+    t_pos_idx = scene["t_pos_idx"]
+    setup = setup_triangles(vertices_2d, t_pos_idx, scene["res_h"], scene["res_w"]) if use_setup else None
+
+    for k in range(t_pos_idx.shape[1]):
+        v_pos = vertices_2d[:, t_pos_idx[:, k]]
+        record = setup[k] if use_setup else None
+        expected = triangle_pixels(v_pos, scene["res_h"], scene["res_w"], setup=record)
+        result = interpreted.triangle_pixels(v_pos, scene["res_h"], scene["res_w"], setup=record)
+        # Same pixels (coverage) in the same order, barycentric weights up to rounding
+        assert np.array_equal(result[0], expected[0]) and np.array_equal(result[1], expected[1]), k
+        for a, b in zip(result[2:], expected[2:]):
+            np.testing.assert_allclose(a, b, **TOL)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_texels(interpreted, dtype):
+    rng = np.random.default_rng(0)
+    ty = rng.integers(0, texture.shape[0], 10000)
+    tx = rng.integers(0, texture.shape[1], 10000)
+    for tex in (texture, np.asarray(texture) / 255.0):
+        expected = get_backend('numpy').texels(tex, ty, tx, dtype)
+        result = interpreted.texels(tex, ty, tx, dtype)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+
+@pytest.mark.parametrize("options", [
+    dict(shader='gouraud_vec'),
+    dict(shader='gouraud_vec', precision='float64'),
+    dict(shader='phong_vec'),
+    dict(shader='phong_vec', deferred=True),
+    dict(shader='phong_vec', deferred=True, precision='float32'),
+])
+def test_render_object(interpreted, options):
+    expected = render_object(**scene, **options)
+    result = render_object(**scene, **options, backend=interpreted)
+    assert_same_image(result, expected)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="Numba is not installed")
+@pytest.mark.parametrize("shader", ['gouraud_vec', 'phong_vec'])
+@pytest.mark.parametrize("deferred", [False, True])
+def test_compiled(shader, deferred):
+    assert get_backend('numba').name == 'numba'
+    expected = render_object(**scene, shader=shader, deferred=deferred)
+    result = render_object(**scene, shader=shader, deferred=deferred, backend='numba')
+    assert_same_image(result, expected)
@@ -1,6 +1,7 @@
 from MatPhong import MatPhong
 import numpy as np
 from typing import Union, List, Optional
+from precision_func import white, to_framebuffer
 
 def light(
     pt: np.ndarray,                              # Surface point (3,)
@@ -12,12 +13,16 @@ def light(
     l_int: Union[np.ndarray, List[np.ndarray]],  # Light intensities (N, 3)
     l_amb: np.ndarray,                           # Ambient light (RGB)
     fixed_V: Optional[np.ndarray] = None,        # Optional fixed view direction
-    fixed_L_list: Optional[np.ndarray] = None    # Optional fixed light directions (N, 3)
+    fixed_L_list: Optional[np.ndarray] = None,   # Optional fixed light directions (N, 3)
+    layers: bool = False                         # Return the unweighted terms separately
 ) -> np.ndarray:
 
     """
     Computes Phong illumination at a point, optionally using fixed V and L directions.
     Use fixed_V and fixed_L_list in Phong shading to avoid per-pixel recalculation.
+    With layers=True, returns the (3, 3) unweighted ambient, diffuse and specular terms
+    instead (as if ka = kd = ks = 1, not clipped): the color of any material is
+    clip(ka * ambient + kd * diffuse + ks * specular, 0, 1).
     """
 
     pt = np.asarray(pt).reshape(3)
@@ -32,8 +37,13 @@ def light(
     if isinstance(l_int, np.ndarray) and l_int.ndim == 2:
         l_int = [l_int[i] for i in range(l_int.shape[0])]
 
+    # Coefficients of the terms (unweighted layers: all 1, summed separately)
+    ka, kd, ks = (1.0, 1.0, 1.0) if layers else (mat.ka, mat.kd, mat.ks)
+    diffuse_sum = np.zeros(3)
+    specular_sum = np.zeros(3)
+
     # Start with ambient component
-    color = mat.ka * vclr * l_amb
+    color = ka * vclr * l_amb
 
     # Use fixed V if provided
     if fixed_V is not None:
@@ -59,18 +69,158 @@ def light(
 
         # Diffuse
         diff = np.clip(np.dot(nrm, L), 0, 1)
-        diffuse = mat.kd * vclr * li * diff
+        diffuse = kd * vclr * li * diff
 
         # Specular
         spec = np.clip(np.dot(R, V), 0, 1) ** mat.n
-        specular = mat.ks * li * spec
+        specular = ks * li * spec
 
         # Add contributions
-        color += diffuse + specular
+        if layers:
+            diffuse_sum += diffuse
+            specular_sum += specular
+        else:
+            color += diffuse + specular
+
+    if layers:
+        return np.stack([color, diffuse_sum, specular_sum])
+    return np.clip(color, 0, 1)
+
+
+def light_batch(
+    pts: np.ndarray,                                 # Surface points (P, 3)
+    nrms: np.ndarray,                                # Surface normals (P, 3)
+    vclrs: np.ndarray,                               # Texture colors (P, 3)
+    cam_pos: np.ndarray,                             # Camera/viewer position (3,)
+    mat: MatPhong,                                   # Phong material
+    l_pos: Union[np.ndarray, List[np.ndarray]],      # Light positions (L, 3) or list of (3,)
+    l_int: Union[np.ndarray, List[np.ndarray]],      # Light intensities (L, 3)
+    l_amb: np.ndarray,                               # Ambient light (RGB)
+    fixed_V: Optional[np.ndarray] = None,            # Optional fixed view direction (3,) or (P, 3)
+    fixed_L_list: Optional[np.ndarray] = None,       # Optional fixed light directions (L, 3) or (P, L, 3)
+    layers: bool = False,                            # Return the unweighted terms separately
+    dtype=np.float64                                 # Float type of the math (see precision_func)
+) -> np.ndarray:
+
+    """
+    Batched version of light(): computes Phong illumination at P points for L lights at once.
+    The terms of all P x L point-light pairs are evaluated with broadcasting; only the final
+    sum over the lights runs in a (short) loop, in the same order as light().
+    Returns a (P, 3) array of colors in [0, 1], or with layers=True the (3, P, 3) unweighted
+    ambient, diffuse and specular terms (see light()), computed in dtype.
+    """
+
+    nrms = np.asarray(nrms, dtype=dtype).reshape(-1, 3)
+    vclrs = np.asarray(vclrs, dtype=dtype).reshape(-1, 3)
+    l_pos = np.asarray(l_pos, dtype=dtype).reshape(-1, 3)
+    l_int = np.asarray(l_int, dtype=dtype).reshape(-1, 3)
+    l_amb = np.asarray(l_amb, dtype=dtype).reshape(3)
+
+    # View directions (P, 3) or a single fixed one (1, 3)
+    if fixed_V is not None:
+        V = np.asarray(fixed_V, dtype=dtype).reshape(-1, 3)
+    else:
+        V = np.asarray(cam_pos, dtype=dtype).reshape(3) - np.asarray(pts, dtype=dtype).reshape(-1, 3)
+        V = V / (np.sqrt(np.sum(V * V, axis=1, keepdims=True)) + 1e-8)
+
+    # Light directions (P, L, 3) or fixed ones shared by all points (1, L, 3)
+    if fixed_L_list is not None:
+        L = np.asarray(fixed_L_list, dtype=dtype).reshape(-1, l_pos.shape[0], 3)
+    else:
+        L = l_pos[None, :, :] - np.asarray(pts, dtype=dtype).reshape(-1, 1, 3)
+        L = L / (np.sqrt(np.sum(L * L, axis=2, keepdims=True)) + 1e-8)
+
+    N = nrms[:, None, :]
+    n_dot_l = np.sum(N * L, axis=2, keepdims=True)          # (P, L, 1)
+
+    # Reflection vectors
+    R = 2 * n_dot_l * N - L
+    R = R / (np.sqrt(np.sum(R * R, axis=2, keepdims=True)) + 1e-8)
+
+    # Coefficients of the terms (unweighted layers: all 1), in the compute type
+    ka, kd, ks = (np.asarray(k, dtype=dtype) for k in ((1.0, 1.0, 1.0) if layers else (mat.ka, mat.kd, mat.ks)))
+    n = np.asarray(mat.n, dtype=dtype)
+
+    # Diffuse
+    diffuse = kd * vclrs[:, None, :] * l_int[None, :, :] * np.clip(n_dot_l, 0, 1)
+
+    # Specular
+    spec = np.clip(np.sum(R * V[:, None, :], axis=2, keepdims=True), 0, 1) ** n
+    specular = ks * l_int[None, :, :] * spec
+
+    if layers:
+        return np.stack([ka * vclrs * l_amb, np.sum(diffuse, axis=1), np.sum(specular, axis=1)])
+
+    # Ambient, then the contribution of every light
+    terms = diffuse + specular                              # (P, L, 3)
+    color = ka * vclrs * l_amb
+    for i in range(l_int.shape[0]):
+        color = color + terms[:, i, :]
 
     return np.clip(color, 0, 1)
 
 
+class LightLayers:
+    def __init__(
+        self,
+        ambient: np.ndarray,
+        diffuse: np.ndarray,
+        specular: np.ndarray,
+        mask: np.ndarray,
+        vertex_terms: Optional[np.ndarray] = None,
+        bary: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        The unweighted ambient, diffuse and specular terms of a rendered view, per pixel.
+
+        The Phong model is linear in ka, kd and ks, so one render of the layers gives the image
+        of any material (with the same exponent n) by a weighted sum (see compose), instead of
+        one full render per material.
+
+        Gouraud shading clips the vertex colors before interpolating them, so for an exact
+        composition the layers of a Gouraud render also keep the terms of the three vertices
+        of every covered pixel and the barycentric weights of the pixel.
+
+        Parameters:
+        - ambient, diffuse, specular: (res_h, res_w, 3) float layers (not clipped).
+        - mask: (res_h, res_w) boolean mask of the covered pixels.
+        - vertex_terms: Optional (3, P, 3, 3) terms (ambient / diffuse / specular) of the
+          vertices of the P covered pixels (in mask order).
+        - bary: (P, 3) barycentric weights of the covered pixels (with vertex_terms).
+        """
+        self.ambient = ambient
+        self.diffuse = diffuse
+        self.specular = specular
+        self.mask = mask
+        self.vertex_terms = vertex_terms
+        self.bary = bary
+
+    def compose(self, ka: float, kd: float, ks: float, background: Optional[float] = None,
+                dtype=np.float32) -> np.ndarray:
+        """
+        Image of the view lit with the coefficients ka, kd and ks.
+
+        Parameters:
+        - ka, kd, ks: Ambient, diffuse and specular reflection coefficients.
+        - background: Value of the pixels not covered by the object (default: white).
+        - dtype: Framebuffer type of the image (see precision_func).
+
+        Returns:
+        - img: (res_h, res_w, 3) image with RGB values in [0, 1] (or [0, 255] for uint8).
+        """
+        img = np.full(self.ambient.shape, white(dtype) if background is None else background, dtype=dtype)
+        if self.vertex_terms is not None:
+            # Weighted vertex colors, clipped, then interpolated (as in the Gouraud shaders)
+            terms = self.vertex_terms
+            vc = np.clip(ka * terms[0] + kd * terms[1] + ks * terms[2], 0, 1)
+            color = (self.bary[:, 0:1] * vc[:, 0] + self.bary[:, 1:2] * vc[:, 1]
+                     + self.bary[:, 2:3] * vc[:, 2])
+        else:
+            color = ka * self.ambient[self.mask] + kd * self.diffuse[self.mask] + ks * self.specular[self.mask]
+        img[self.mask] = to_framebuffer(np.clip(color, 0, 1), dtype)
+        return img
+
+
 
 
 
@@ -179,3 +329,15 @@ def light(
 # )
 
 # print("Resulting color using fixed_V and fixed_L_list:", result_color_fixed)
+
+
+
+
+# # ----------------------------------------------------------------------------
+# # DEMO 4: Unweighted layers, composed for any ka/kd/ks afterwards
+# # ----------------------------------------------------------------------------
+
+# ambient, diffuse, specular = light(pt, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb, layers=True)
+# composed = np.clip(mat.ka * ambient + mat.kd * diffuse + mat.ks * specular, 0, 1)
+
+# print("Composed from layers:", composed)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from render_object_func import render_object
+from light_func import light, light_batch
+from MatPhong import MatPhong
+from texture_cache_func import load_texture
+
+# Tests of the lighting model: light_batch must agree with light at random points, normals
+# and view points. On hw3.npy (at a quarter of the resolution), composing the layers of one
+# render (as demo.py does, with the G-buffer of the first shader reused by the second) must
+# give the image of a full render with the same material, including the pixels that
+# saturate and are clipped.
+# Run with: python -m pytest light_func_test.py
+
+data = np.load("hw3.npy", allow_pickle=True).item()
+texture = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
+scene = dict(v_pos=data["v_pos"], v_uvs=data["v_uvs"], t_pos_idx=data["t_pos_idx"].T, tex=texture,
+             plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=data["res_h"] // 4, res_w=data["res_w"] // 4,
+             focal=data["focal"], eye=data["cam_pos"].flatten(), up=data["up"].flatten(),
+             target=data["target"].flatten(), l_pos=np.array(data["l_pos"]), l_int=np.array(data["l_int"]),
+             l_amb=data["l_amb"])
+
+# Lighting configurations of demo.py, and one bright enough to saturate many pixels
+coefficients = {
+    "ambient": (data["ka"], 0.0, 0.0),
+    "diffuse": (0.0, data["kd"], 0.0),
+    "specular": (0.0, 0.0, data["ks"]),
+    "full": (data["ka"], data["kd"], data["ks"]),
+    "saturated": (3 * data["ka"], 4 * data["kd"], 6 * data["ks"]),
+}
+
+
+@pytest.fixture(scope="module")
+def layers():
+    result, gbuffer = {}, None
+    for shader in ('gouraud_vec', 'phong_vec'):
+        result[shader], gbuffer = render_object(**scene, mat=MatPhong(ka=1.0, kd=1.0, ks=1.0, n=data["n"]),
+                                                shader=shader, gbuffer=gbuffer, return_gbuffer=True, layers=True)
+    return result
+
+
+@pytest.mark.parametrize("config", list(coefficients))
+@pytest.mark.parametrize("shader", ['gouraud_vec', 'phong_vec'])
+def test_compose_matches_render(layers, shader, config):
+    ka, kd, ks = coefficients[config]
+    img = layers[shader].compose(ka, kd, ks)
+    expected = render_object(**scene, mat=MatPhong(ka=ka, kd=kd, ks=ks, n=data["n"]), shader=shader)
+    np.testing.assert_array_equal(img, expected)
+
+    if config == "saturated":
+        # The clipping is exercised: some covered pixels reach 1 in a channel
+        assert np.any(img[layers[shader].mask] == 1)
+
+
+@pytest.mark.parametrize("fixed", [False, True])
+@pytest.mark.parametrize("layers", [False, True])
+def test_light_batch_matches_light(fixed, layers):
+    rng = np.random.default_rng(0)
+    P = 200
+    pts = rng.uniform(-1, 1, (P, 3))
+    nrms = rng.normal(size=(P, 3))
+    nrms /= np.linalg.norm(nrms, axis=1, keepdims=True)
+    vclrs = rng.uniform(0, 1, (P, 3))
+    l_pos, l_int, l_amb = rng.uniform(-5, 5, (3, 3)), rng.uniform(0, 1, (3, 3)), rng.uniform(0, 0.5, 3)
+    mat = MatPhong(ka=0.3, kd=0.9, ks=0.7, n=20)
+
+    for cam_pos in rng.uniform(-5, 5, (5, 3)):
+        if fixed:
+            # Fixed directions from a single point, as in the Phong shaders
+            V = cam_pos - pts[0]
+            V = V / np.linalg.norm(V)
+            L = l_pos - pts[0]
+            L = L / np.linalg.norm(L, axis=1, keepdims=True)
+        else:
+            V = L = None
+        result = light_batch(pts, nrms, vclrs, cam_pos, mat, l_pos, l_int, l_amb, fixed_V=V, fixed_L_list=L,
+                             layers=layers)
+        expected = np.stack([light(pts[p], nrms[p], vclrs[p], cam_pos, mat, l_pos, l_int, l_amb, fixed_V=V,
+                                   fixed_L_list=L, layers=layers) for p in range(P)], axis=-2)
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from lod_func import build_lods, LOD_MIN_TRIANGLES
+from render_object_func import _choose_lod
+
+# Tests of the levels of detail on the mesh of hw3.npy: the triangle counts of the QEM
+# simplification are pinned, and the level chosen by render_object must get coarser (never
+# finer) as the mesh shrinks on screen.
+# Run with: python -m pytest lod_func_test.py
+
+data = np.load("hw3.npy", allow_pickle=True).item()
+v_pos = data["v_pos"]
+v_uvs = data["v_uvs"]
+t_pos_idx = data["t_pos_idx"].T
+eye = data["cam_pos"].flatten()
+target = data["target"].flatten()
+up = data["up"].flatten()
+
+
+@pytest.fixture(scope="module")
+def chain():
+    return build_lods(v_pos, v_uvs, t_pos_idx, cache=False)
+
+
+def test_triangle_counts(chain):
+    assert [lod.n_triangles for lod in chain.levels] == [960, 480, 240, 196]
+    assert chain[-1].n_triangles >= LOD_MIN_TRIANGLES
+
+    # Same counts on a second run (the collapse order is deterministic)
+    again = build_lods(v_pos, v_uvs, t_pos_idx, cache=False)
+    assert [lod.n_triangles for lod in again.levels] == [lod.n_triangles for lod in chain.levels]
+
+
+def test_levels_are_valid_meshes(chain):
+    assert np.array_equal(chain[0].t_pos_idx, t_pos_idx)
+    for lod in chain.levels[1:]:
+        n_vertices = lod.v_pos.shape[1]
+        assert lod.v_uvs.shape == (n_vertices, 2)
+        assert lod.t_pos_idx.min() >= 0 and lod.t_pos_idx.max() < n_vertices
+        assert lod.vertex_ids.shape == (n_vertices,)
+        assert lod.vertex_ids.min() >= 0 and lod.vertex_ids.max() < v_pos.shape[1]
+
+
+def choose_level(chain, eye):
+    _, _, faces = _choose_lod(chain, v_pos, v_uvs, t_pos_idx, data["plane_h"], data["plane_w"],
+                              data["res_h"], data["res_w"], data["focal"], eye, up, target, None)
+    return [lod.n_triangles for lod in chain.levels].index(faces.shape[1])
+
+
+def test_level_is_monotonic_in_distance(chain):
+    # Move the camera away from the target along its viewing direction: the projected size
+    # of the mesh only shrinks, so the chosen level must never get finer
+    direction = (eye - target) / np.linalg.norm(eye - target)
+    levels = [choose_level(chain, target + direction * d) for d in np.geomspace(1, 2000, 40)]
+
+    assert levels[0] == 0
+    assert levels[-1] == len(chain) - 1
+    assert set(levels) == set(range(len(chain)))
+    assert all(a <= b for a, b in zip(levels, levels[1:]))
+
+
+def test_fixed_level(chain):
+    for level in range(len(chain)):
+        _, _, faces = _choose_lod(level, v_pos, v_uvs, t_pos_idx, data["plane_h"], data["plane_w"],
+                                  data["res_h"], data["res_w"], data["focal"], eye, up, target, None)
+        assert faces.shape[1] == chain[level].n_triangles
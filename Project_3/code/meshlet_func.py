@@ -0,0 +1,364 @@
+import numpy as np
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+from world2view_func import world2view
+
+# Triangles per cluster built by default
+MESHLET_SIZE = 64
+
+# Clusters of recently seen meshes, keyed by a hash of their content (LRU order)
+MESHLETS_CACHE_SIZE = 8
+_meshlets_cache = OrderedDict()
+
+class Meshlets:
+    def __init__(self, triangles: np.ndarray, offsets: np.ndarray, center: np.ndarray, radius: np.ndarray,
+                 box_min: np.ndarray, box_max: np.ndarray, cone_axis: np.ndarray, cone_angle: np.ndarray,
+                 n_triangles: int) -> None:
+        """
+        Partition of the triangles of a mesh into small, spatially coherent clusters
+        (meshlets), with the bounds needed to reject a whole cluster at once.
+
+        Cluster k holds the triangles triangles[offsets[k]:offsets[k + 1]]. Its vertices lie in
+        the box [box_min, box_max] and in the sphere (center, radius); the unit normals of its
+        triangles lie within cone_angle (radians) of cone_axis. A cone_angle of pi means no
+        usable cone (normals spread over a half space, or degenerate triangles).
+
+        Parameters:
+        - triangles: (Nt',) triangle indices ordered by cluster (triangles with invalid vertex
+          indices are left out).
+        - offsets: (C + 1,) start of every cluster in triangles.
+        - center, radius: (C, 3) and (C,) bounding spheres.
+        - box_min, box_max: (C, 3) bounding boxes.
+        - cone_axis, cone_angle: (C, 3) and (C,) normal cones.
+        - n_triangles: Number of triangles of the mesh (Nt).
+        """
+        self.triangles = triangles
+        self.offsets = offsets
+        self.center = center
+        self.radius = radius
+        self.box_min = box_min
+        self.box_max = box_max
+        self.cone_axis = cone_axis
+        self.cone_angle = cone_angle
+        self.n_triangles = n_triangles
+
+    def __len__(self) -> int:
+        return self.offsets.size - 1
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """
+        (C,) number of triangles of every cluster.
+        """
+        return np.diff(self.offsets)
+
+    def triangle_mask(self, keep: np.ndarray) -> np.ndarray:
+        """
+        (Nt,) boolean mask of the triangles of the clusters selected by the (C,) mask keep.
+        """
+        mask = np.zeros(self.n_triangles, dtype=bool)
+        mask[self.triangles[np.repeat(keep, self.sizes)]] = True
+        return mask
+
+    def __repr__(self) -> str:
+        return f"Meshlets({len(self)} clusters, {self.triangles.size} triangles)"
+
+
+def build_meshlets(pts: np.ndarray, t_pos_idx: np.ndarray, size: int = MESHLET_SIZE, cache: bool = True) -> Meshlets:
+    """
+    Splits the triangles of a mesh into clusters of `size` triangles (the last one may be
+    smaller) and computes their bounding spheres, boxes and normal cones.
+
+    The triangles are sorted along a Morton (Z-order) curve through their centroids, so
+    consecutive triangles, and hence the clusters, are close together in space. Results are
+    cached by the content of the mesh, like the vertex normals (see calc_normals_func).
+
+    Parameters:
+    - pts: 3 x Nv array of vertex positions.
+    - t_pos_idx: 3 x Nt array of triangle indices (0-based).
+    - size: Number of triangles per cluster (e.g. 64 to 128).
+    - cache: If False, the cache is neither read nor updated.
+
+    Returns:
+    - The Meshlets of the mesh.
+    """
+    pts = np.ascontiguousarray(pts, dtype=np.float64)
+    t_pos_idx = np.ascontiguousarray(t_pos_idx)
+
+    if cache:
+        key = _mesh_key(pts, t_pos_idx, size)
+        if key in _meshlets_cache:
+            _meshlets_cache.move_to_end(key)
+            return _meshlets_cache[key]
+
+    # Step 1: Order the (valid) triangles along a Morton curve through their centroids
+    valid = np.all((t_pos_idx >= 0) & (t_pos_idx < pts.shape[1]), axis=0)
+    tris = np.flatnonzero(valid)
+    corners = pts[:, t_pos_idx[:, tris]]                    # 3 x 3 x T (coordinate, vertex, triangle)
+    centroid = np.mean(corners, axis=1).T                   # T x 3
+    tris = tris[np.argsort(_morton(centroid), kind='stable')]
+    if tris.size == 0:
+        empty = np.zeros((0, 3))
+        return Meshlets(tris, np.zeros(1, dtype=int), empty, np.zeros(0), empty, empty, empty, np.zeros(0),
+                        t_pos_idx.shape[1])
+
+    # Step 2: Cut the curve into clusters
+    offsets = np.r_[np.arange(0, tris.size, size), tris.size]
+    starts = offsets[:-1]
+    cluster = np.repeat(np.arange(starts.size), np.diff(offsets))
+
+    # Step 3: Bounding boxes and spheres of the vertices of every cluster
+    corners = pts[:, t_pos_idx[:, tris]].transpose(2, 1, 0).reshape(-1, 3)   # (3T) x 3, triangle by triangle
+    box_min = np.minimum.reduceat(corners, 3 * starts, axis=0)
+    box_max = np.maximum.reduceat(corners, 3 * starts, axis=0)
+    center = (box_min + box_max) / 2
+    dist = np.linalg.norm(corners - np.repeat(center[cluster], 3, axis=0), axis=1)
+    radius = np.maximum.reduceat(dist, 3 * starts)
+
+    # Step 4: Normal cones (axis: mean unit normal, angle: widest normal from it)
+    v0, v1, v2 = (pts[:, t_pos_idx[k, tris]].T for k in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    length = np.linalg.norm(normals, axis=1)
+    degenerate = length <= 1e-12
+    normals[~degenerate] /= length[~degenerate, None]
+    axis = np.add.reduceat(normals, starts, axis=0)
+    axis_len = np.linalg.norm(axis, axis=1)
+    axis[axis_len > 1e-12] /= axis_len[axis_len > 1e-12, None]
+    cos_min = np.minimum.reduceat(np.sum(normals * axis[cluster], axis=1), starts)
+    angle = np.arccos(np.clip(cos_min, -1, 1))
+    unusable = (axis_len <= 1e-12) | (np.add.reduceat(degenerate.astype(int), starts) > 0)
+    angle[unusable] = np.pi
+
+    meshlets = Meshlets(tris, offsets, center, radius, box_min, box_max, axis, angle, t_pos_idx.shape[1])
+    if cache:
+        _meshlets_cache[key] = meshlets
+        while len(_meshlets_cache) > MESHLETS_CACHE_SIZE:
+            _meshlets_cache.popitem(last=False)
+
+    return meshlets
+
+
+def cull_meshlets(meshlets: Meshlets, R: np.ndarray, t: np.ndarray, focal: float, plane_w: float, plane_h: float,
+                  res_w: int, res_h: int, mode: Optional[str] = 'back', hiz: Optional["HiZBuffer"] = None,
+                  stats: Optional[dict] = None) -> np.ndarray:
+    """
+    Decides for all clusters at once which ones can be skipped, before any per-triangle work.
+
+    A cluster is rejected if
+    - its bounding sphere lies behind the camera, or in front of it but entirely beyond one
+      side of the image (the frustum test, with half a pixel of margin for the rounding of
+      rasterize): then cull_triangles rejects each of its triangles as well;
+    - ('back' / 'front') its normal cone shows that all its triangles face away from /
+      towards the camera from every point of the sphere. The cone is tested on the exact
+      geometry: a tiny triangle seen almost edge-on whose winding only flips when its vertices
+      are rounded to whole pixels is dropped with its cluster (cull_triangles would keep it);
+    - (with hiz) all pixels its box can cover already hold something nearer than the nearest
+      point of its sphere.
+
+    Parameters:
+    - meshlets: Clusters of the mesh (build_meshlets).
+    - R, t: Camera rotation and position (lookat).
+    - focal, plane_w, plane_h, res_w, res_h: Projection and resolution, as in rasterize.
+    - mode: Culling mode of cull_func (None keeps every cluster).
+    - hiz: Optional HiZBuffer with the depth of already drawn (or earlier) geometry.
+    - stats: Optional dict; 'clusters_in', 'clusters_out' and the clusters removed by each
+      test ('culled_clusters_frustum', 'culled_clusters_cone', 'culled_clusters_hiz') are
+      added to it.
+
+    Returns:
+    - (C,) boolean mask of the clusters to keep.
+    """
+    C = len(meshlets)
+    if mode is None or C == 0:
+        _add_stats(stats, C, [])
+        return np.ones(C, dtype=bool)
+
+    # Cluster spheres in camera coordinates (the camera looks down -z)
+    c = world2view(meshlets.center.T, R, t)                  # C x 3
+    r = meshlets.radius * (1 + 1e-9) + 1e-9
+    in_front = c[:, 2] + r < 0
+
+    # Step 1: Frustum. A point is left of the image if its pixel x is below -0.5 (so it is
+    # rounded to a negative pixel), i.e. on the positive side of a plane through the eye
+    sx, sy = focal * res_w / plane_w, focal * res_h / plane_h
+    planes = np.array([
+        [sx, 0, res_w / 2 + 0.5],      # left:   x_pix < -0.5
+        [-sx, 0, res_w / 2 - 0.5],     # right:  x_pix > res_w - 0.5
+        [0, -sy, res_h / 2 + 0.5],     # top:    y_pix < -0.5
+        [0, sy, res_h / 2 - 0.5],      # bottom: y_pix > res_h - 0.5
+    ])
+    planes /= np.linalg.norm(planes, axis=1, keepdims=True)
+    outside = in_front & np.any(c @ planes.T > r[:, None], axis=1)
+    behind = c[:, 2] - r >= 0
+    frustum = behind | outside
+
+    # Step 2: Normal cones, seen from the camera position (t)
+    if mode in ('back', 'front'):
+        to_center = meshlets.center - np.asarray(t, dtype=float).reshape(1, 3)
+        D = np.linalg.norm(to_center, axis=1)
+        far = D > r
+        sign = 1 if mode == 'back' else -1
+        cos_phi = np.sum(to_center * meshlets.cone_axis, axis=1) * sign / np.where(far, D, 1)
+        spread = np.arcsin(np.where(far, r / np.where(far, D, 1), 1))
+        cone = far & (np.arccos(np.clip(cos_phi, -1, 1)) + spread + meshlets.cone_angle < np.pi / 2 - 1e-6)
+    else:
+        cone = np.zeros(C, dtype=bool)
+
+    # Step 3: Occlusion against the hierarchical depth buffer
+    if hiz is not None:
+        occluded = np.zeros(C, dtype=bool)
+        test = in_front & ~frustum & ~cone
+        if np.any(test):
+            x0, x1, y0, y1 = _screen_rects(meshlets, test, R, t, sx, sy, res_w, res_h)
+            occluded[test] = hiz.occluded(x0, x1, y0, y1, -(c[test, 2] + r[test]))
+    else:
+        occluded = np.zeros(C, dtype=bool)
+
+    # Count every rejected cluster once, under the first test that removes it
+    removed = np.zeros(C, dtype=bool)
+    counts = []
+    for name, test in [('culled_clusters_frustum', frustum), ('culled_clusters_cone', cone),
+                       ('culled_clusters_hiz', occluded)]:
+        counts.append((name, int(np.count_nonzero(test & ~removed))))
+        removed |= test
+
+    _add_stats(stats, C, counts)
+    return ~removed
+
+
+class HiZBuffer:
+    def __init__(self, depth: np.ndarray) -> None:
+        """
+        Hierarchical depth buffer: a pyramid of the farthest distance of 2x2, 4x4, ... blocks of
+        a depth buffer, to test whole screen rectangles for occlusion in constant time.
+
+        Parameters:
+        - depth: (H, W) depths of a z-buffered render, e.g. DepthBuffer.depth or the depth of
+          a G-buffer; the distance abs(depth) is used (inf where nothing was drawn).
+        """
+        level = np.abs(np.asarray(depth, dtype=np.float64))
+        self.levels = [level]
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            # Odd sizes: repeat the last row / column (pixels outside the image are never tested)
+            level = np.pad(level, ((0, level.shape[0] % 2), (0, level.shape[1] % 2)), mode='edge')
+            level = np.maximum(np.maximum(level[0::2, 0::2], level[1::2, 0::2]),
+                               np.maximum(level[0::2, 1::2], level[1::2, 1::2]))
+            self.levels.append(level)
+
+    def occluded(self, x0: np.ndarray, x1: np.ndarray, y0: np.ndarray, y1: np.ndarray,
+                 near: np.ndarray) -> np.ndarray:
+        """
+        Tests inclusive pixel rectangles against the buffer: a rectangle is occluded if every
+        one of its pixels holds a distance not farther than `near` (so no fragment at
+        distance >= near would pass the depth test there).
+
+        Parameters:
+        - x0, x1, y0, y1: (K,) inclusive pixel bounds (inside the image).
+        - near: (K,) nearest distance of the geometry in each rectangle.
+
+        Returns:
+        - (K,) boolean mask of the occluded rectangles.
+        """
+        # Level where every rectangle spans at most 2 x 2 texels
+        extent = np.maximum(x1 - x0, y1 - y0)
+        level = np.minimum(np.ceil(np.log2(extent + 1)).astype(int), len(self.levels) - 1)
+
+        farthest = np.empty(extent.size)
+        for L in np.unique(level):
+            k = level == L
+            tex = self.levels[L]
+            tx0, tx1, ty0, ty1 = x0[k] >> L, x1[k] >> L, y0[k] >> L, y1[k] >> L
+            farthest[k] = np.maximum(np.maximum(tex[ty0, tx0], tex[ty0, tx1]),
+                                     np.maximum(tex[ty1, tx0], tex[ty1, tx1]))
+        return farthest <= near
+
+
+def _screen_rects(meshlets: Meshlets, which: np.ndarray, R: np.ndarray, t: np.ndarray, sx: float, sy: float,
+                  res_w: int, res_h: int):
+    """
+    Inclusive pixel rectangles (clamped to the image) covering the projection of the boxes of
+    the selected clusters (all in front of the camera).
+    """
+    lo, hi = meshlets.box_min[which], meshlets.box_max[which]
+    # The 8 corners of every box
+    corners = np.stack([np.where(np.array(bits)[None, :] == 1, hi, lo)
+                        for bits in np.ndindex(2, 2, 2)], axis=1)            # K x 8 x 3
+    cam = world2view(corners.reshape(-1, 3).T, R, t).reshape(-1, 8, 3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = sx * cam[..., 0] / cam[..., 2] + res_w / 2
+        y = -sy * cam[..., 1] / cam[..., 2] + res_h / 2
+    # One pixel of margin for the rounding of the vertices and the spans (the whole image
+    # for a box reaching behind the camera)
+    behind = np.any(cam[..., 2] >= 0, axis=1)
+    x0 = np.where(behind, 0, np.clip(np.floor(np.min(x, axis=1)) - 1, 0, res_w - 1)).astype(int)
+    x1 = np.where(behind, res_w - 1, np.clip(np.ceil(np.max(x, axis=1)) + 1, 0, res_w - 1)).astype(int)
+    y0 = np.where(behind, 0, np.clip(np.floor(np.min(y, axis=1)) - 1, 0, res_h - 1)).astype(int)
+    y1 = np.where(behind, res_h - 1, np.clip(np.ceil(np.max(y, axis=1)) + 1, 0, res_h - 1)).astype(int)
+    return x0, x1, y0, y1
+
+
+def _morton(points: np.ndarray) -> np.ndarray:
+    """
+    30-bit Morton codes of points (N x 3), quantized to 1024 steps over their bounding box.
+    """
+    if points.shape[0] == 0:
+        return np.zeros(0, dtype=np.uint64)
+    lo, hi = np.min(points, axis=0), np.max(points, axis=0)
+    q = ((points - lo) / np.where(hi > lo, hi - lo, 1) * 1023).astype(np.uint64)
+
+    # Spread the 10 bits of every coordinate two bits apart
+    q = (q | (q << np.uint64(16))) & np.uint64(0x030000FF)
+    q = (q | (q << np.uint64(8))) & np.uint64(0x0300F00F)
+    q = (q | (q << np.uint64(4))) & np.uint64(0x030C30C3)
+    q = (q | (q << np.uint64(2))) & np.uint64(0x09249249)
+    return q[:, 0] | (q[:, 1] << np.uint64(1)) | (q[:, 2] << np.uint64(2))
+
+
+def _add_stats(stats: Optional[dict], C: int, counts: list) -> None:
+    """
+    Accumulates the cluster culling counters into stats (if given).
+    """
+    if stats is None:
+        return
+    for name, count in counts:
+        stats[name] = stats.get(name, 0) + count
+    stats['clusters_in'] = stats.get('clusters_in', 0) + C
+    stats['clusters_out'] = stats.get('clusters_out', 0) + C - sum(count for _, count in counts)
+
+
+def clear_meshlets_cache() -> None:
+    """
+    Forget all cached clusters.
+    """
+    _meshlets_cache.clear()
+
+
+def _mesh_key(pts: np.ndarray, t_pos_idx: np.ndarray, size: int) -> tuple:
+    """
+    Cache key of a mesh: shapes, dtypes, cluster size and a hash of the raw data.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pts.tobytes())
+    h.update(t_pos_idx.tobytes())
+    return (pts.shape, t_pos_idx.shape, t_pos_idx.dtype.str, size, h.hexdigest())
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# from lookat_func import lookat
+
+# # A grid of 2 x 50 x 50 triangles in the z = 0 plane, seen from above
+# n = 51
+# gx, gy = np.meshgrid(np.arange(n, dtype=float), np.arange(n, dtype=float))
+# pts = np.vstack([gx.ravel(), gy.ravel(), np.zeros(n * n)])
+# i = (np.arange(n - 1)[:, None] * n + np.arange(n - 1)[None, :]).ravel()
+# t_pos_idx = np.hstack([np.vstack([i, i + 1, i + n]), np.vstack([i + 1, i + n + 1, i + n])])
+
+# meshlets = build_meshlets(pts, t_pos_idx)
+# R, t = lookat(np.array([25.0, 25.0, 40.0]), np.array([0.0, 1.0, 0.0]), np.array([25.0, 25.0, 0.0]))
+# stats = {}
+# keep = cull_meshlets(meshlets, R, t, 1.0, 0.5, 0.5, 256, 256, mode='back', stats=stats)
+# print(meshlets, stats, np.count_nonzero(meshlets.triangle_mask(keep)), "triangles left")
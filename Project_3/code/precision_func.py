@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Union
+
+# Float types the shading math can run in
+COMPUTE_DTYPES = ('float64', 'float32')
+
+# Types of the framebuffer: floats in [0, 1], or uint8 in [0, 255]
+FRAMEBUFFER_DTYPES = ('float64', 'float32', 'float16', 'uint8')
+
+class Precision:
+    def __init__(self, compute: str = 'float64', framebuffer: str = 'float64') -> None:
+        """
+        Data-type policy of a render.
+
+        Textures stay uint8 (see texture_cache_func) and only the fetched texels are converted,
+        straight to the compute type. The shading math (texel conversion, lighting, color
+        interpolation) runs in `compute`. Coverage, depth and texture coordinates always use
+        float64, so the same pixels are drawn and the same texels fetched with any policy.
+        The image is stored as `framebuffer`. Colors written to a uint8 framebuffer are scaled
+        to [0, 255] and truncated, the same conversion as saving a float image (to_uint8).
+
+        Parameters:
+        - compute: One of COMPUTE_DTYPES.
+        - framebuffer: One of FRAMEBUFFER_DTYPES.
+        """
+        if np.dtype(compute).name not in COMPUTE_DTYPES:
+            raise ValueError(f"Unknown compute type: {compute}")
+        if np.dtype(framebuffer).name not in FRAMEBUFFER_DTYPES:
+            raise ValueError(f"Unknown framebuffer type: {framebuffer}")
+        self.compute = np.dtype(compute)
+        self.framebuffer = np.dtype(framebuffer)
+
+    def new_image(self, res_h: int, res_w: int) -> np.ndarray:
+        """
+        White (res_h, res_w, 3) image in the framebuffer type.
+        """
+        return np.full((res_h, res_w, 3), white(self.framebuffer), dtype=self.framebuffer)
+
+    def __repr__(self) -> str:
+        return f"Precision(compute='{self.compute.name}', framebuffer='{self.framebuffer.name}')"
+
+
+# Named policies: the float64 reference, float64 math into a float32 image (the default
+# of Project 3), and float32 math with smaller framebuffers (float32 / float16 / uint8
+# images take 1/2, 1/4 and 1/8 of the float64 memory)
+PRECISIONS = {
+    'float64': Precision('float64', 'float64'),
+    'mixed': Precision('float64', 'float32'),
+    'float32': Precision('float32', 'float32'),
+    'float16': Precision('float32', 'float16'),
+    'uint8': Precision('float32', 'uint8'),
+}
+
+def get_precision(precision: Union[None, str, Precision], default: Precision = PRECISIONS['float64']) -> Precision:
+    """
+    Resolves the precision argument of the render functions.
+
+    Parameters:
+    - precision: None (the default policy of the caller), a name of PRECISIONS or a Precision.
+    - default: Policy used for None.
+
+    Returns:
+    - The Precision.
+    """
+    if precision is None:
+        return default
+    if isinstance(precision, Precision):
+        return precision
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    return PRECISIONS[precision]
+
+
+def white(dtype) -> Union[int, float]:
+    """
+    Value of a white (background) channel in an image of the given type.
+    """
+    return 255 if np.dtype(dtype) == np.uint8 else 1.0
+
+
+def to_framebuffer(color: np.ndarray, dtype) -> np.ndarray:
+    """
+    Converts colors in [0, 1] to the type of a framebuffer (before writing them into it).
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        return (np.clip(color, 0, 1) * 255).astype(np.uint8)
+    return np.asarray(color).astype(dtype, copy=False)
+
+
+def to_uint8(img: np.ndarray) -> np.ndarray:
+    """
+    Image as uint8 in [0, 255] (for saving); a uint8 framebuffer is returned as is.
+    """
+    img = np.asarray(img)
+    if img.dtype == np.uint8:
+        return img
+    return (np.clip(img, 0, 1) * 255).astype(np.uint8)
+
+
+def to_float(img: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """
+    Image as floats in [0, 1] (e.g. for plotting or comparing framebuffers of any type).
+    """
+    if img.dtype == np.uint8:
+        return img.astype(dtype) / np.asarray(255, dtype=dtype)
+    return img.astype(dtype, copy=False)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# precision = get_precision('uint8')
+# img = precision.new_image(4, 4)
+# img[1, 2] = to_framebuffer(np.array([0.5, 0.25, 1.0], dtype=precision.compute), img.dtype)
+# print(precision, img.nbytes, "bytes")
+# print(to_float(img)[1, 2], to_uint8(img)[1, 2])
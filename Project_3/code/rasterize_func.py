@@ -1,6 +1,7 @@
 import numpy as np
 
-def rasterize(pts_2d: np.ndarray, plane_w: int, plane_h: int, res_w: int, res_h: int) -> np.ndarray:
+def rasterize(pts_2d: np.ndarray, plane_w: int, plane_h: int, res_w: int, res_h: int,
+              clip: bool = True, subpixel: bool = False) -> np.ndarray:
     """
     Converts 2D camera plane coordinates to pixel coordinates.
     
@@ -10,9 +11,13 @@ def rasterize(pts_2d: np.ndarray, plane_w: int, plane_h: int, res_w: int, res_h:
         plane_h (int): Height of camera plane in world units
         res_w (int): Width of output image in pixels
         res_h (int): Height of output image in pixels
+        clip (bool): Clamp the pixel coordinates to the image bounds (set to False to keep
+                     points outside the image where they are, e.g. for culling)
+        subpixel (bool): Keep the exact (fractional) pixel coordinates instead of rounding
+                         them to integer pixels (for triangle_pixels_fixed)
     
     Returns:
-        np.ndarray: 2xN matrix of integer pixel coordinates
+        np.ndarray: 2xN matrix of integer pixel coordinates (float if subpixel is True)
     
     Coordinate Systems:
         - Camera plane: Origin at center, x right, y up
@@ -33,11 +38,25 @@ def rasterize(pts_2d: np.ndarray, plane_w: int, plane_h: int, res_w: int, res_h:
     pixel_x = pts_2d[0, :] * scale_x + center_x
     pixel_y = -pts_2d[1, :] * scale_y + center_y  # Flip y-axis
     
-    # Round to nearest integer and clip to image bounds
-    pixel_coords = np.vstack([
-        np.clip(np.round(pixel_x), 0, res_w - 1),
-        np.clip(np.round(pixel_y), 0, res_h - 1)
-    ])
+    # Sub-pixel precision: keep the fractional coordinates
+    if subpixel:
+        pixel_coords = np.vstack([pixel_x, pixel_y])
+        if clip:
+            pixel_coords = np.vstack([
+                np.clip(pixel_coords[0], 0, res_w - 1),
+                np.clip(pixel_coords[1], 0, res_h - 1)
+            ])
+        return pixel_coords
+
+    # Round to nearest integer
+    pixel_coords = np.vstack([np.round(pixel_x), np.round(pixel_y)])
+
+    # Clip to image bounds
+    if clip:
+        pixel_coords = np.vstack([
+            np.clip(pixel_coords[0], 0, res_w - 1),
+            np.clip(pixel_coords[1], 0, res_h - 1)
+        ])
     
     return pixel_coords.astype(int)
 
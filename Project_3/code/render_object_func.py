@@ -1,12 +1,37 @@
+import time
 import numpy as np
-from typing import Union, List
+from typing import Union, List, Optional, Tuple, Callable, Iterator, Sequence
 from lookat_func import lookat
 from perspective_project_func import perspective_project
 from rasterize_func import rasterize
 from calc_normals_func import calc_normals
-from shade_gouraud_func import shade_gouraud
-from shade_phong_func import shade_phong
+from shade_gouraud_func import shade_gouraud, shade_gouraud_vec
+from shade_phong_func import shade_phong, shade_phong_vec
 from MatPhong import MatPhong
+from depth_buffer_func import DepthBuffer
+from gbuffer_func import GBuffer, build_gbuffer, shade_gbuffer
+from cull_func import cull_triangles
+from meshlet_func import Meshlets, HiZBuffer, build_meshlets, cull_meshlets
+from lod_func import LODChain, build_lods, select_lod
+from tile_render_func import render_tiles
+from edge_raster_func import triangle_pixels_fixed
+from triangle_setup_func import TriangleSetup, setup_triangles
+from mip_texture_func import MipTexture, get_mip_texture
+from render_stats_func import RenderStats, stage, add
+from light_func import LightLayers
+from precision_func import Precision, PRECISIONS, get_precision
+from kernel_backend_func import KernelBackend, get_backend
+
+# Available shading models: the per-pixel reference shaders and their vectorized kernels
+SHADERS = {
+    'gouraud': shade_gouraud,
+    'phong': shade_phong,
+    'gouraud_vec': shade_gouraud_vec,
+    'phong_vec': shade_phong_vec,
+}
+
+# Block sizes of the passes of render_progressive (1/8 of the resolution first, then 1/4, ...)
+PROGRESSIVE_SCALES = (8, 4, 2, 1)
 
 def render_object(
     v_pos: np.ndarray,
@@ -25,16 +50,33 @@ def render_object(
     l_pos: Union[np.ndarray, List[np.ndarray]],
     l_int: Union[np.ndarray, List[np.ndarray]],
     l_amb: np.ndarray,
-    shader: str
-) -> np.ndarray:
+    shader: str,
+    zbuffer: bool = False,
+    deferred: bool = False,
+    gbuffer: Optional[GBuffer] = None,
+    return_gbuffer: bool = False,
+    cull: Optional[str] = None,
+    stats: Optional[RenderStats] = None,
+    workers: int = 1,
+    tile_size: int = 64,
+    subpixel: bool = False,
+    tex_filter: Optional[str] = None,
+    layers: bool = False,
+    precision: Union[None, str, Precision] = None,
+    backend: Union[None, str, KernelBackend] = None,
+    clusters: Union[None, bool, Meshlets] = None,
+    hiz: Optional[HiZBuffer] = None,
+    lod: Union[None, bool, int, LODChain] = None
+) -> Union[np.ndarray, LightLayers, Tuple[Union[np.ndarray, LightLayers], GBuffer]]:
     """
     This function renders a textured 3D object onto a 2D image using either Gouraud or Phong shading. It:    
 
     1. Computes vertex normals using face connectivity.
     2. Applies camera transformation using the LookAt model.
     3. Projects 3D vertices onto a 2D image plane with perspective projection.
-    4. Rasterizes the 2D coordinates into pixel space.
-    5. Loops through each triangle in the mesh to render it individually using the selected shading model.
+    4. Rasterizes the 2D coordinates into pixel space (and optionally culls triangles that cannot be seen).
+    5. Loops through each triangle in the mesh to render it individually using the selected shading model
+       (optionally with a depth test against a per-pixel depth buffer).
     
     Parameters:
     - v_pos: (3, Nv) array of 3D vertex positions.
@@ -48,59 +90,142 @@ def render_object(
     - mat: Instance of MatPhong defining surface material.
     - l_pos, l_int: Light positions and their intensities.
     - l_amb: Ambient light intensity.
-    - shader: Either 'gouraud' or 'phong' to select the shading model.
+    - shader: 'gouraud' or 'phong' to select the shading model, or 'gouraud_vec' / 'phong_vec'
+      for the vectorized kernels that produce the same image much faster.
+    - zbuffer: If True, hidden surfaces are removed with a depth buffer and occluded pixels
+      are never textured or lit. If False, triangles simply overwrite each other in index order.
+    - deferred: If True, the mesh is first rasterized into a G-buffer (see gbuffer_func) and
+      then every visible pixel is lit at once with the selected shading model.
+    - gbuffer: G-buffer from an earlier deferred render of the same geometry and camera.
+      Only the lighting pass runs, so mat and the lights can change freely. Needs a deferred
+      render (deferred, return_gbuffer or layers); the options of the geometry pass (zbuffer,
+      cull, subpixel, tex_filter, clusters, hiz, lod) cannot be combined with it.
+    - return_gbuffer: If True, also return the G-buffer (implies deferred).
+    - cull: Culling mode applied before rasterization (see cull_func): None to draw every
+      triangle, 'none' to drop only triangles behind the camera, off-screen or of zero area,
+      'back' / 'front' to drop back- / front-facing triangles as well.
+    - stats: Optional RenderStats (see render_stats_func) that receives the wall time of every
+      stage (lod, normals, lookat, projection, rasterize, culling, setup, shading, output), the
+      triangle and pixel counters (culling details included) and, with a log callback, a
+      summary. Without it nothing is measured.
+    - workers: Number of processes. With more than one, the triangles are binned into screen
+      tiles that are rendered in parallel (see tile_render_func); the image is identical.
+      Forward shading only (not with deferred, return_gbuffer or layers).
+    - tile_size: Width and height of a screen tile in pixels (only used with workers > 1).
+    - subpixel: If True, vertices keep their sub-pixel position and coverage is computed with
+      fixed-point edge functions and a top-left fill rule (see edge_raster_func) instead of
+      rounding the vertices to whole pixels. Needs a vectorized shader or deferred shading.
+    - tex_filter: None for nearest-neighbour fetches from the full-size texture, or
+      'nearest' / 'bilinear' / 'trilinear' to sample a mip pyramid of the texture at the
+      level of detail of every triangle (see mip_texture_func). The pyramid is built once
+      per texture. Every shader, forward or deferred, samples the pyramid.
+    - layers: If True (implies deferred), return the unweighted ambient, diffuse and specular
+      terms as separate float layers (a LightLayers, see light_func) instead of an image:
+      mat.ka, mat.kd and mat.ks are ignored and layers.compose(ka, kd, ks) gives the image
+      of any combination of them from this single render.
+    - precision: Data-type policy (see precision_func): a Precision or one of the names of
+      PRECISIONS, e.g. 'float32' (float32 shading math) or 'uint8' (float32 math into a uint8
+      framebuffer). Default 'mixed': float64 math into a float32 image.
+    - backend: Kernels of the vectorized and deferred shaders (see kernel_backend_func):
+      'numpy' (default), 'numba' for the JIT-compiled kernels (the NumPy ones if Numba is not
+      installed), 'auto' or a KernelBackend. The images of the backends match up to rounding.
+      The per-pixel reference shaders ('gouraud', 'phong') always run in Python, so forward
+      rendering with them only accepts None or 'numpy'.
+    - clusters: With culling (needs cull), True (or the Meshlets of the mesh, see meshlet_func)
+      to first reject whole clusters of triangles against the view frustum and with their
+      normal cones ('back' / 'front'); only the triangles of the remaining clusters are culled
+      one by one.
+      The clusters are built once per mesh. The image is the same, except for tiny triangles
+      seen edge-on whose winding only flips when their vertices are rounded to whole pixels.
+    - hiz: Optional HiZBuffer (needs clusters and zbuffer) with the depth of an earlier
+      z-buffered render, e.g. HiZBuffer(gbuf.depth): clusters hidden behind it are skipped as
+      well. Exact for the same view; with a moving camera an approximation (clusters that
+      were hidden in the earlier frame are assumed to stay hidden).
+    - lod: Level of detail (see lod_func). True (or the LODChain of the mesh) to render the
+      simplified level that suits the projected size of the mesh on screen, an int to force a
+      level (0 is the full mesh). The chain is built once per mesh; texture coordinates are
+      kept. None (default) renders the full mesh.
+
+    Options that contradict each other or would be ignored, e.g. a gbuffer without a deferred
+    render or clusters without cull, raise a ValueError.
     
     Returns:
-    - img: (res_h, res_w, 3) float image with RGB values in [0, 1].
+    - img: (res_h, res_w, 3) image with RGB values in [0, 1], or [0, 255] for a uint8
+      framebuffer (the LightLayers if layers is True).
+    - gbuf: The G-buffer, only if return_gbuffer is True.
     """
+    _check_options(shader, deferred or return_gbuffer or layers, zbuffer, gbuffer, cull, workers, subpixel,
+                   tex_filter, backend, clusters, hiz, lod)
 
-    # Step 1: Calculate vertex normals
-    v_normals = calc_normals(v_pos, t_pos_idx)  
+    precision = get_precision(precision, PRECISIONS['mixed'])
+    kernels = get_backend(backend)
+    if stats is not None and backend == 'numba' and kernels.name != 'numba':
+        stats.message("Numba is not installed, using the NumPy kernels")
 
-    # Step 2: LookAt transformation
-    R, t = lookat(eye, up, target)
+    # Deferred shading with an existing G-buffer: lighting pass only
+    if gbuffer is not None:
+        with stage(stats, 'shading'):
+            img = shade_gbuffer(gbuffer, eye, mat, l_pos, l_int, l_amb, shader=shader.split('_')[0], stats=stats,
+                                layers=layers, precision=precision, backend=kernels)
+        _count_output(stats, img)
+        return (img, gbuffer) if return_gbuffer else img
 
-    # Step 3: Perspective projection
-    proj_pts, depth = perspective_project(v_pos, focal, R, t)  
+    # Level of detail of the mesh for this view
+    if lod is not None and lod is not False:
+        v_pos, v_uvs, t_pos_idx = _choose_lod(lod, v_pos, v_uvs, t_pos_idx, plane_h, plane_w, res_h, res_w, focal,
+                                              eye, up, target, stats)
 
-    # Step 4: Rasterize to screen coordinates
-    screen_pts = rasterize(proj_pts, plane_w, plane_h, res_w, res_h) 
+    # Mipmapped texture (cached, so the pyramid is only built for a new texture)
+    if tex_filter is not None:
+        tex = get_mip_texture(tex, tex_filter)
 
-    # Step 5: Combine with depth
-    vertices_2d = np.vstack([screen_pts, depth])  
+    # Steps 1-5: Normals, camera, projection, rasterization and culling, then the triangle setup
+    vertices_2d, v_normals, t_pos_idx, coverage, setup = _prepare_geometry(
+        v_pos, v_uvs, t_pos_idx, tex, plane_h, plane_w, res_h, res_w, focal, eye, up, target, cull, subpixel, kernels,
+        stats, clusters, hiz
+    )
 
-    # Step 6: Initialize image
-    img = np.ones((res_h, res_w, 3), dtype=np.float32)
+    # Deferred shading: geometry pass into a G-buffer, then one lighting pass
+    if deferred or return_gbuffer or layers:
+        with stage(stats, 'shading'):
+            gbuf = build_gbuffer(vertices_2d, v_pos, v_normals, v_uvs, t_pos_idx, tex, res_h, res_w, zbuffer=zbuffer,
+                                 coverage=coverage, stats=stats, dtype=precision.compute, backend=kernels,
+                                 setup=setup)
+            img = shade_gbuffer(gbuf, eye, mat, l_pos, l_int, l_amb, shader=shader.split('_')[0], stats=stats,
+                                layers=layers, precision=precision, backend=kernels)
+        _count_output(stats, img)
+        return (img, gbuf) if return_gbuffer else img
 
-    # Step 7: Loop over triangles
-    for triangle_idx in range(t_pos_idx.shape[1]):
-        idx = t_pos_idx[:, triangle_idx]  
+    # Step 6: Select the shading model (the vectorized kernels take the coverage kernel and backend)
+    shade = SHADERS[shader]
+    shade_kwargs = {'coverage': coverage, 'backend': kernels} if shader.endswith('_vec') else {}
+    shade_kwargs['dtype'] = precision.compute
 
-        # Skip if any index is invalid
-        if np.any(idx >= v_pos.shape[1]) or np.any(idx < 0):
-            continue
+    # Parallel path: screen tiles rendered by a pool of processes
+    if workers > 1:
+        with stage(stats, 'shading'):
+            img = render_tiles(shade, vertices_2d, v_normals, v_uvs, t_pos_idx, tex, eye, mat,
+                               l_pos, l_int, l_amb, res_h, res_w, zbuffer=zbuffer, workers=workers,
+                               tile_size=tile_size, shade_kwargs=shade_kwargs, stats=stats, precision=precision,
+                               setup=setup)
+        _count_output(stats, img)
+        return img
 
-        # Get triangle data
-        tri_v_pos = vertices_2d[:, idx]      
-        tri_v_nrm = v_normals[:, idx]        
-        tri_v_uvs = v_uvs[idx, :]            
+    # Step 7: Initialize image (and depth buffer)
+    img = precision.new_image(res_h, res_w)
+    zbuf = DepthBuffer(res_h, res_w) if zbuffer else None
 
-        # Choose shading mode
-        if shader == 'gouraud':
-            img = shade_gouraud(
-                v_pos=tri_v_pos,
-                v_nrm=tri_v_nrm,
-                v_uvs=tri_v_uvs,
-                tex=tex,
-                cam_pos=eye,
-                mat=mat,
-                l_pos=l_pos,
-                l_int=l_int,
-                l_amb=l_amb,
-                img=img
-            )
-        elif shader == 'phong':
-            img = shade_phong(
+    # Step 8: Loop over triangles
+    with stage(stats, 'shading'):
+        for triangle_idx in range(t_pos_idx.shape[1]):
+            idx = t_pos_idx[:, triangle_idx]  
+
+            # Get triangle data
+            tri_v_pos = vertices_2d[:, idx]      
+            tri_v_nrm = v_normals[:, idx]        
+            tri_v_uvs = v_uvs[idx, :]            
+
+            img = shade(
                 v_pos=tri_v_pos,
                 v_nrm=tri_v_nrm,
                 v_uvs=tri_v_uvs,
@@ -110,9 +235,404 @@ def render_object(
                 l_pos=l_pos,
                 l_int=l_int,
                 l_amb=l_amb,
-                img=img
+                img=img,
+                zbuf=zbuf,
+                stats=stats,
+                setup=setup[triangle_idx],
+                **shade_kwargs
             )
-        else:
-            raise ValueError(f"Unknown shader type: {shader}")
 
+    _count_output(stats, img)
     return img
+
+
+
+def render_progressive(
+    v_pos: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    tex: np.ndarray,
+    plane_h: int,
+    plane_w: int,
+    res_h: int,
+    res_w: int,
+    focal: float,
+    eye: np.ndarray,
+    up: np.ndarray,
+    target: np.ndarray,
+    mat: MatPhong,
+    l_pos: Union[np.ndarray, List[np.ndarray]],
+    l_int: Union[np.ndarray, List[np.ndarray]],
+    l_amb: np.ndarray,
+    shader: str,
+    zbuffer: bool = False,
+    gbuffer: Optional[GBuffer] = None,
+    return_gbuffer: bool = False,
+    cull: Optional[str] = None,
+    stats: Optional[RenderStats] = None,
+    subpixel: bool = False,
+    tex_filter: Optional[str] = None,
+    precision: Union[None, str, Precision] = None,
+    backend: Union[None, str, KernelBackend] = None,
+    clusters: Union[None, bool, Meshlets] = None,
+    hiz: Optional[HiZBuffer] = None,
+    lod: Union[None, bool, int, LODChain] = None,
+    scales: Sequence[int] = PROGRESSIVE_SCALES,
+    time_budget: Optional[float] = None
+) -> Iterator[Union[Tuple[int, np.ndarray], Tuple[int, np.ndarray, GBuffer]]]:
+    """
+    Progressive version of the deferred render_object: yields a coarse image first, then
+    sharper ones, and ends with the image of render_object(..., deferred=True).
+
+    The vertex stages (normals, projection, culling, triangle setup) run once. Every coarse
+    pass (scale s > 1) then rasterizes its own small G-buffer with one sample per s×s block,
+    at the top-left pixel of the block (see _coarse_gbuffer), lights it and fills the blocks
+    with their colors, so its geometry and lighting cost about 1/s² of a full pass. Only the
+    pass with s = 1 runs the full-resolution geometry and lighting pass, and its image is
+    exact. The coarse silhouettes are blocky; all passes of PROGRESSIVE_SCALES together cost
+    about 1.33 full passes.
+
+    When the G-buffer of an earlier render of the same view is given (e.g. while tuning the
+    lights and the material) no geometry pass runs at all: the covered pixels are grouped
+    into s×s blocks, one pixel of every block is lit and its color fills the covered pixels
+    of the block. A block reuses a pixel lit by an earlier pass when it has one, so no pixel
+    is lit twice and all passes together cost one lighting pass, and the silhouettes come
+    from the G-buffer and are exact from the first pass on.
+
+    Parameters:
+    - v_pos ... shader: As in render_object.
+    - zbuffer, cull, subpixel, tex_filter, precision, backend, clusters, hiz, lod: As in
+      render_object (the coarse passes always use the floating-point coverage kernel).
+    - gbuffer: G-buffer from an earlier deferred or progressive render of the same geometry
+      and camera; the geometry pass is skipped (its options cannot be combined with it, as in
+      render_object).
+    - return_gbuffer: If True, also yield the full-resolution G-buffer (to render the view
+      again later); None for the coarse passes that do not have one.
+    - stats: Optional RenderStats; the geometry and lighting of every pass are added to the
+      'shading' stage and the output is counted after the last pass.
+    - scales: Block sizes of the passes, coarse to fine. The image of the last pass is exact
+      if it ends with 1.
+    - time_budget: Optional wall-time budget in seconds, counted from the start of the
+      render: once it is spent no further pass is started (the first pass always runs).
+      The caller can also stop at any time by leaving the loop.
+
+    Yields:
+    - (scale, img) after every pass, or (scale, img, gbuf) if return_gbuffer is True. Every
+      img is a new (res_h, res_w, 3) array, so any of them can be kept.
+    """
+    _check_options(shader, True, zbuffer, gbuffer, cull, 1, subpixel, tex_filter, backend, clusters, hiz, lod)
+    start = time.perf_counter()
+
+    precision = get_precision(precision, PRECISIONS['mixed'])
+    kernels = get_backend(backend)
+    if stats is not None and backend == 'numba' and kernels.name != 'numba':
+        stats.message("Numba is not installed, using the NumPy kernels")
+
+    # Lighting passes only, over the pixels of the given G-buffer
+    if gbuffer is not None:
+        yield from _progressive_lighting(gbuffer, eye, mat, l_pos, l_int, l_amb, shader, stats, precision, kernels,
+                                         scales, time_budget, start, return_gbuffer)
+        return
+
+    # Step 1: Vertex stages, once for all passes
+    if lod is not None and lod is not False:
+        v_pos, v_uvs, t_pos_idx = _choose_lod(lod, v_pos, v_uvs, t_pos_idx, plane_h, plane_w, res_h, res_w,
+                                              focal, eye, up, target, stats)
+    if tex_filter is not None:
+        tex = get_mip_texture(tex, tex_filter)
+    vertices_2d, v_normals, t_pos_idx, coverage, setup = _prepare_geometry(
+        v_pos, v_uvs, t_pos_idx, tex, plane_h, plane_w, res_h, res_w, focal, eye, up, target, cull, subpixel,
+        kernels, stats, clusters, hiz
+    )
+
+    for k, scale in enumerate(scales):
+        if k > 0 and time_budget is not None and time.perf_counter() - start >= time_budget:
+            return
+
+        with stage(stats, 'shading'):
+            if scale > 1:
+                # Step 2: Coarse pass: one sample per block, then every block filled with its color
+                gbuf = _coarse_gbuffer(vertices_2d, v_pos, v_normals, v_uvs, t_pos_idx, tex, res_h, res_w, scale,
+                                       zbuffer, stats, precision, kernels)
+                img = shade_gbuffer(gbuf, eye, mat, l_pos, l_int, l_amb, shader=shader.split('_')[0], stats=stats,
+                                    precision=precision, backend=kernels)
+                img = np.repeat(np.repeat(img, scale, axis=0), scale, axis=1)[:res_h, :res_w]
+                gbuf = None
+            else:
+                # Step 3: Full pass, as in render_object(..., deferred=True)
+                gbuf = build_gbuffer(vertices_2d, v_pos, v_normals, v_uvs, t_pos_idx, tex, res_h, res_w,
+                                     zbuffer=zbuffer, coverage=coverage, stats=stats, dtype=precision.compute,
+                                     backend=kernels, setup=setup)
+                img = shade_gbuffer(gbuf, eye, mat, l_pos, l_int, l_amb, shader=shader.split('_')[0], stats=stats,
+                                    precision=precision, backend=kernels)
+
+        if k == len(scales) - 1:
+            _count_output(stats, img)
+        yield (scale, img, gbuf) if return_gbuffer else (scale, img)
+
+
+def _progressive_lighting(
+    gbuf: GBuffer,
+    eye: np.ndarray,
+    mat: MatPhong,
+    l_pos: Union[np.ndarray, List[np.ndarray]],
+    l_int: Union[np.ndarray, List[np.ndarray]],
+    l_amb: np.ndarray,
+    shader: str,
+    stats: Optional[RenderStats],
+    precision: Precision,
+    kernels: KernelBackend,
+    scales: Sequence[int],
+    time_budget: Optional[float],
+    start: float,
+    return_gbuffer: bool
+) -> Iterator[Union[Tuple[int, np.ndarray], Tuple[int, np.ndarray, GBuffer]]]:
+    """
+    Passes of render_progressive with a given G-buffer: the covered pixels are lit block by
+    block, coarse to fine, and no pixel is lit twice.
+    """
+    # Covered pixels (in raster order), the ones lit so far and their colors
+    ys, xs = np.nonzero(gbuf.mask)
+    lit = np.zeros(ys.size, dtype=bool)
+    colors = precision.new_image(gbuf.res_h, gbuf.res_w)
+
+    for k, scale in enumerate(scales):
+        if k > 0 and time_budget is not None and time.perf_counter() - start >= time_budget:
+            return
+
+        # Step 1: One pixel per block: the first lit one, else the first one in raster order
+        block = (ys // scale) * -(-gbuf.res_w // scale) + xs // scale
+        order = np.lexsort((~lit, block))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = block[order[1:]] != block[order[:-1]]
+        picked = order[first]
+        owner = np.empty(ys.size, dtype=int)
+        owner[order] = picked[np.cumsum(first) - 1]
+
+        # Step 2: Light the picked pixels that no earlier pass has lit
+        new = picked[~lit[picked]]
+        pixels = np.zeros((gbuf.res_h, gbuf.res_w), dtype=bool)
+        pixels[ys[new], xs[new]] = True
+        with stage(stats, 'shading'):
+            img = shade_gbuffer(gbuf, eye, mat, l_pos, l_int, l_amb, shader=shader.split('_')[0], stats=stats,
+                                precision=precision, backend=kernels, pixels=pixels)
+        colors[ys[new], xs[new]] = img[ys[new], xs[new]]
+        lit[new] = True
+
+        # Step 3: Fill every block with the color of its pixel
+        img = precision.new_image(gbuf.res_h, gbuf.res_w)
+        img[ys, xs] = colors[ys[owner], xs[owner]]
+
+        if k == len(scales) - 1:
+            _count_output(stats, img)
+        yield (scale, img, gbuf) if return_gbuffer else (scale, img)
+
+
+def _coarse_gbuffer(
+    vertices_2d: np.ndarray,
+    v_pos: np.ndarray,
+    v_normals: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    tex: np.ndarray,
+    res_h: int,
+    res_w: int,
+    scale: int,
+    zbuffer: bool,
+    stats: Optional[RenderStats],
+    precision: Precision,
+    kernels: KernelBackend
+) -> GBuffer:
+    """
+    Geometry pass of a coarse pass of render_progressive: a G-buffer of
+    ceil(res_h / scale) x ceil(res_w / scale) pixels whose pixel (j, i) is the sample of the
+    full-resolution pixel (j * scale, i * scale). The screen is scaled so that the centers
+    of those pixels fall on the centers of the coarse pixels; the projection is not redone.
+    """
+    coarse = np.array(vertices_2d, dtype=np.float64)
+    coarse[:2] = (coarse[:2] - 0.5) / scale + 0.5
+    gbuf = build_gbuffer(coarse, v_pos, v_normals, v_uvs, t_pos_idx, tex, -(-res_h // scale), -(-res_w // scale),
+                         zbuffer=zbuffer, coverage=kernels.triangle_pixels, stats=stats, dtype=precision.compute,
+                         backend=kernels)
+
+    # Light with the full-resolution vertices (view and light directions of the full pass)
+    gbuf.vertices_2d = vertices_2d
+    return gbuf
+
+
+def _prepare_geometry(
+    v_pos: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    tex: np.ndarray,
+    plane_h: int,
+    plane_w: int,
+    res_h: int,
+    res_w: int,
+    focal: float,
+    eye: np.ndarray,
+    up: np.ndarray,
+    target: np.ndarray,
+    cull: Optional[str],
+    subpixel: bool,
+    kernels: KernelBackend,
+    stats: Optional[RenderStats],
+    clusters: Union[None, bool, Meshlets] = None,
+    hiz: Optional[HiZBuffer] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Callable, TriangleSetup]:
+    """
+    Geometry stages of render_object (vertex normals, lookat, projection, rasterization,
+    culling and triangle setup). Returns the screen-space vertices (x, y, depth), the vertex
+    normals, the triangles left to draw, the coverage kernel and the setup of the triangles.
+    """
+    add(stats, 'triangles_submitted', t_pos_idx.shape[1])
+
+    # Step 1: Calculate vertex normals
+    with stage(stats, 'normals'):
+        v_normals = calc_normals(v_pos, t_pos_idx)  
+
+    # Step 2: LookAt transformation
+    with stage(stats, 'lookat'):
+        R, t = lookat(eye, up, target)
+
+    # Step 3: Perspective projection
+    with stage(stats, 'projection'):
+        proj_pts, depth = perspective_project(v_pos, focal, R, t)  
+
+    # Step 4: Rasterize to screen coordinates (exact positions with sub-pixel precision,
+    # the coverage kernel clamps the bounding boxes itself)
+    with stage(stats, 'rasterize'):
+        screen_pts = rasterize(proj_pts, plane_w, plane_h, res_w, res_h, clip=not subpixel, subpixel=subpixel)
+        coverage = triangle_pixels_fixed if subpixel else kernels.triangle_pixels
+
+        # Step 5: Combine with depth
+        vertices_2d = np.vstack([screen_pts, depth])  
+
+    # Culling: drop the triangles with invalid indices, then (optionally) the clusters and
+    # the triangles that cannot or should not be seen, all at once
+    with stage(stats, 'culling'):
+        valid = np.all((t_pos_idx >= 0) & (t_pos_idx < v_pos.shape[1]), axis=0)
+        if cull is not None and clusters is not None and clusters is not False:
+            meshlets = clusters if isinstance(clusters, Meshlets) else build_meshlets(v_pos, t_pos_idx)
+            if meshlets.n_triangles != t_pos_idx.shape[1]:
+                raise ValueError("The clusters were built for another mesh (use clusters=True with lod)")
+            keep = cull_meshlets(meshlets, R, t, focal, plane_w, plane_h, res_w, res_h, mode=cull, hiz=hiz,
+                                 stats=stats.counters if stats is not None else None)
+            valid &= meshlets.triangle_mask(keep)
+        t_pos_idx = t_pos_idx[:, valid]
+        if cull is not None:
+            keep = cull_triangles(rasterize(proj_pts, plane_w, plane_h, res_w, res_h, clip=False, subpixel=subpixel),
+                                  depth, t_pos_idx, res_w, res_h, mode=cull,
+                                  stats=stats.counters if stats is not None else None)
+            t_pos_idx = t_pos_idx[:, keep]
+    add(stats, 'triangles_culled', valid.size - t_pos_idx.shape[1])
+    add(stats, 'triangles_drawn', t_pos_idx.shape[1])
+
+    # Triangle setup: bounding boxes, barycentric systems, edge functions and UV planes of
+    # the triangles left, once for all of them (the rasterizers read their records)
+    with stage(stats, 'setup'):
+        attributes = {'uv': np.stack([v_uvs[:, 0], 1 - v_uvs[:, 1]])} if isinstance(tex, MipTexture) else None
+        setup = setup_triangles(vertices_2d, t_pos_idx, res_h, res_w, attributes, subpixel=subpixel)
+
+    return vertices_2d, v_normals, t_pos_idx, coverage, setup
+
+
+def _choose_lod(
+    lod: Union[bool, int, LODChain],
+    v_pos: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    plane_h: int,
+    plane_w: int,
+    res_h: int,
+    res_w: int,
+    focal: float,
+    eye: np.ndarray,
+    up: np.ndarray,
+    target: np.ndarray,
+    stats: Optional[RenderStats]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Level of detail of render_object: returns the vertices, texture coordinates and triangles
+    of the level given by lod (a level, or the one chosen for the camera).
+    """
+    with stage(stats, 'lod'):
+        chain = lod if isinstance(lod, LODChain) else build_lods(v_pos, v_uvs, t_pos_idx)
+        if isinstance(lod, (bool, LODChain)):
+            R, t = lookat(eye, up, target)
+            level = select_lod(chain, R, t, focal, plane_w, plane_h, res_w, res_h)
+        else:
+            level = min(max(int(lod), 0), len(chain) - 1)
+    if stats is not None:
+        stats.message(f"LOD {level} of {len(chain)}: {chain[level].n_triangles} triangles")
+
+    mesh = chain[level]
+    return mesh.v_pos, mesh.v_uvs, mesh.t_pos_idx
+
+
+def _check_options(
+    shader: str,
+    deferred: bool,
+    zbuffer: bool,
+    gbuffer: Optional[GBuffer],
+    cull: Optional[str],
+    workers: int,
+    subpixel: bool,
+    tex_filter: Optional[str],
+    backend: Union[None, str, KernelBackend],
+    clusters: Union[None, bool, Meshlets],
+    hiz: Optional[HiZBuffer],
+    lod: Union[None, bool, int, LODChain]
+) -> None:
+    """
+    Rejects the options of render_object / render_progressive that contradict each other or
+    would be silently ignored (deferred: whether the render is deferred in any form).
+    """
+    if shader not in SHADERS:
+        raise ValueError(f"Unknown shader type: {shader}")
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    # A G-buffer replaces the whole geometry pass of a deferred render
+    if gbuffer is not None:
+        if not deferred:
+            raise ValueError("A G-buffer is only used by deferred shading (deferred=True)")
+        geometry = dict(zbuffer=zbuffer, cull=cull is not None, subpixel=subpixel, tex_filter=tex_filter is not None,
+                        clusters=clusters is not None and clusters is not False, hiz=hiz is not None,
+                        lod=lod is not None and lod is not False)
+        given = [name for name, value in geometry.items() if value]
+        if given:
+            raise ValueError(f"The G-buffer already holds the geometry pass, {', '.join(given)} cannot change it")
+
+    # Options of the forward (per-triangle) path only
+    if deferred and workers > 1:
+        raise ValueError("Parallel tile rendering (workers > 1) needs forward shading (deferred=False)")
+    if not deferred and not shader.endswith('_vec'):
+        if subpixel:
+            raise ValueError("Sub-pixel rasterization needs a vectorized shader or deferred shading")
+        if getattr(backend, 'name', backend) not in (None, 'numpy'):
+            raise ValueError("The per-pixel shaders always run in Python: a kernel backend needs a vectorized "
+                             "shader or deferred shading")
+
+    # Culling options that only act together
+    if clusters is not None and clusters is not False and cull is None:
+        raise ValueError("Cluster culling needs a culling mode (cull='none', 'back' or 'front')")
+    if hiz is not None and not zbuffer:
+        raise ValueError("Occlusion culling with a HiZBuffer needs zbuffer=True")
+    if hiz is not None and (clusters is None or clusters is False):
+        raise ValueError("Occlusion culling with a HiZBuffer needs cluster culling (clusters=True)")
+
+
+def _count_output(stats: Optional[RenderStats], img: Union[np.ndarray, LightLayers]) -> None:
+    """
+    Output stage of an instrumented render: counts the visible pixels and reports the totals.
+    """
+    if stats is None:
+        return
+    with stats.stage('output'):
+        if isinstance(img, LightLayers):
+            stats.add('pixels_visible', np.count_nonzero(img.mask))
+        else:
+            stats.count_visible(img)
+    if stats.verbose:
+        stats.message(stats.summary())
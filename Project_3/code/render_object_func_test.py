@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from render_object_func import render_object
+from MatPhong import MatPhong
+from texture_cache_func import load_texture
+
+# Tests of render_object on hw3.npy, at a quarter of the resolution. The reference shaders
+# must keep drawing the images of the original renderer, pinned in reference_images.npz
+# (rounded to 8 bits): half a level of slack lets rounding of the float math pass, but not
+# a texel or a pixel changing hands. The parallel tile renderer and deferred shading must
+# give exactly the image of the serial forward render.
+# Run with: python -m pytest render_object_func_test.py
+
+data = np.load("hw3.npy", allow_pickle=True).item()
+texture = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
+reference = np.load("reference_images.npz")
+scene = dict(v_pos=data["v_pos"], v_uvs=data["v_uvs"], t_pos_idx=data["t_pos_idx"].T, tex=texture,
+             plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=data["res_h"] // 4, res_w=data["res_w"] // 4,
+             focal=data["focal"], eye=data["cam_pos"].flatten(), up=data["up"].flatten(),
+             target=data["target"].flatten(), mat=MatPhong(ka=data["ka"], kd=data["kd"], ks=data["ks"], n=data["n"]),
+             l_pos=np.array(data["l_pos"]), l_int=np.array(data["l_int"]), l_amb=data["l_amb"])
+
+
+@pytest.mark.parametrize("shader", ['gouraud', 'phong'])
+def test_reference_image(shader):
+    img = render_object(**scene, shader=shader)
+    error = np.abs(img.astype(np.float64) * 255 - reference[shader])
+    assert np.count_nonzero(error > 0.5 + 1e-3) == 0
+
+
+@pytest.mark.parametrize("zbuffer", [False, True])
+@pytest.mark.parametrize("shader", ['gouraud_vec', 'phong_vec'])
+def test_tiles_match_serial(shader, zbuffer):
+    # Same image for any number of workers and any tile size (tiles smaller than many triangles)
+    expected = render_object(**scene, shader=shader, zbuffer=zbuffer, workers=1)
+    result = render_object(**scene, shader=shader, zbuffer=zbuffer, workers=2, tile_size=16)
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("zbuffer", [False, True])
+@pytest.mark.parametrize("shader", ['phong', 'gouraud_vec'])
+def test_deferred_matches_forward(shader, zbuffer):
+    expected = render_object(**scene, shader=shader, zbuffer=zbuffer)
+    result = render_object(**scene, shader=shader, zbuffer=zbuffer, deferred=True)
+    np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,68 @@
+import os
+import pickle
+import shutil
+import numpy as np
+import pytest
+from scene_file_func import Scene, convert_scene, load_scene
+
+# Tests of the scene files: a pickled hw*.npy scene converted with convert_scene and opened
+# again with load_scene must give back the same arrays and values.
+# Run with: python -m pytest scene_file_func_test.py
+
+SOURCE = "hw3.npy"
+
+
+@pytest.fixture(scope="module")
+def source():
+    return np.load(SOURCE, allow_pickle=True).item()
+
+
+def assert_same_scene(scene, source):
+    assert set(scene) == set(source)
+    for key, value in source.items():
+        if isinstance(value, list):
+            # Lists of arrays (e.g. the light positions) come back stacked
+            value = np.stack(value)
+        if isinstance(value, np.ndarray) and value.ndim > 0:
+            assert isinstance(scene[key], np.ndarray), key
+            assert scene[key].dtype == value.dtype, key
+            assert scene[key].shape == value.shape, key
+            assert np.array_equal(scene[key], value), key
+        else:
+            assert scene[key] == value, key
+
+
+def test_round_trip(tmp_path, source):
+    path = convert_scene(SOURCE, str(tmp_path / "hw3.scene"))
+    scene = load_scene(path)
+
+    assert isinstance(scene, Scene)
+    assert_same_scene(scene, source)
+
+    # The arrays are read-only views of the mapping, and transposes stay views
+    assert not scene["v_pos"].flags.writeable
+    assert np.array_equal(scene["t_pos_idx"].T, source["t_pos_idx"].T)
+    assert np.shares_memory(scene["t_pos_idx"].T, scene["t_pos_idx"])
+
+
+def test_load_npy_converts_next_to_it(tmp_path, source):
+    npy = str(tmp_path / "hw3.npy")
+    shutil.copyfile(SOURCE, npy)
+
+    scene = load_scene(npy)
+    assert os.path.exists(str(tmp_path / "hw3.scene"))
+    assert_same_scene(scene, source)
+
+    # A newer .npy file is converted again
+    changed = dict(source, focal=source["focal"] + 1)
+    np.save(npy, changed, allow_pickle=True)
+    os.utime(npy, ns=(os.stat(npy).st_atime_ns, os.stat(str(tmp_path / "hw3.scene")).st_mtime_ns + 10 ** 9))
+    assert_same_scene(load_scene(npy), changed)
+
+
+def test_pickled_as_path(tmp_path, source):
+    scene = load_scene(convert_scene(SOURCE, str(tmp_path / "hw3.scene")))
+    copy = pickle.loads(pickle.dumps(scene))
+
+    assert copy.path == scene.path
+    assert_same_scene(copy, source)
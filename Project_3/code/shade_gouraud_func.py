@@ -1,10 +1,15 @@
 
 import numpy as np
-from typing import Union, List
+from typing import Union, List, Optional, Tuple, Callable
 from MatPhong import MatPhong
-from light_func import light
+from triangle_kernel_func import triangle_pixels
+from depth_buffer_func import DepthBuffer
+from mip_texture_func import MipTexture, uv_gradients
+from render_stats_func import RenderStats
+from precision_func import to_framebuffer
+from kernel_backend_func import KernelBackend, get_backend
 
-def shade_gouraud(
+def gouraud_vertex_colors(
     v_pos: np.ndarray,                           # 3×3 projected triangle vertices in image space
     v_nrm: np.ndarray,                           # 3×3 normal vectors at triangle vertices
     v_uvs: np.ndarray,                           # 3×2 UV coordinates per vertex
@@ -14,13 +19,17 @@ def shade_gouraud(
     l_pos: Union[np.ndarray, List[np.ndarray]],  # light positions
     l_int: Union[np.ndarray, List[np.ndarray]],  # light intensities
     l_amb: np.ndarray,                           # ambient light (3,)
-    img: np.ndarray                              # image buffer to update
-) -> np.ndarray:
+    layers: bool = False,                        # unweighted lighting terms (see light())
+    dtype=np.float64,                            # float type of the shading math (see precision_func)
+    backend: Union[None, str, KernelBackend] = None  # texel and lighting kernels (see kernel_backend_func)
+) -> List[np.ndarray]:
     """
-    Shade a triangle and update the specified image using Gouraud shading.
+    Light the three vertices of a triangle (texture sample + Phong model at each vertex).
+    Shared by the per-pixel and the vectorized Gouraud shaders.
+    With layers=True, returns the (3 terms, 3 vertices, 3) unweighted ambient, diffuse and
+    specular terms of the vertices instead.
     """
-
-    res_h, res_w, _ = img.shape
+    kernels = get_backend(backend)
 
     # Compute color at each vertex
     # UV seam fix
@@ -30,50 +39,97 @@ def shade_gouraud(
             if uv[0] < 0.5:
                 uv[0] += 1.0
 
-    vertex_colors = []
-    for i in range(3):
-        pt = v_pos[:, i]
-        nrm = v_nrm[:, i]
-        nrm = nrm / (np.linalg.norm(nrm) + 1e-8)
-        uv = v_uvs[i]
+    # Optional: wrapping
+    v_uvs = np.array(v_uvs, dtype=float)
+    v_uvs[:, 0] = v_uvs[:, 0] % 1.0
+    v_uvs[:, 1] = np.clip(v_uvs[:, 1], 0, 1)
 
-        # Optional: wrapping
-        uv[0] = uv[0] % 1.0
-        uv[1] = np.clip(uv[1], 0, 1)
+    # Sample texture
+    tex_h, tex_w, _ = tex.shape
+    u = np.clip(v_uvs[:, 0], 0, 1)
+    v = np.clip(v_uvs[:, 1], 0, 1)
+    if isinstance(tex, MipTexture):
+        # Filtered fetch, level of detail from the UV derivatives of the triangle
+        lod = tex.lod(*uv_gradients(v_pos[0], v_pos[1], u, 1 - v))
+        vclr = tex.sample(u, 1 - v, lod).astype(dtype, copy=False)
+    else:
+        tx = (u * (tex_w - 1)).astype(int)
+        ty = ((1 - v) * (tex_h - 1)).astype(int)
 
-        # Sample texture
-        tex_h, tex_w, _ = tex.shape
-        u = np.clip(uv[0], 0, 1)
-        v = np.clip(uv[1], 0, 1)
-        tx = int(u * (tex_w - 1))
-        ty = int((1 - v) * (tex_h - 1))
+        vclr = kernels.texels(tex, ty, tx, dtype)
 
-        vclr = tex[ty, tx, :] 
+    # Light the three vertices at once
+    nrm = v_nrm.T / (np.linalg.norm(v_nrm, axis=0)[:, None] + 1e-8)
+    if layers:
+        return kernels.light_batch(v_pos.T, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb, layers=True, dtype=dtype)
+    vertex_colors = list(kernels.light_batch(v_pos.T, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb, dtype=dtype))
 
-        color = light(pt, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb)
-        vertex_colors.append(color)
+    return vertex_colors
 
 
+def shade_gouraud(
+    v_pos: np.ndarray,                           # 3×3 projected triangle vertices in image space
+    v_nrm: np.ndarray,                           # 3×3 normal vectors at triangle vertices
+    v_uvs: np.ndarray,                           # 3×2 UV coordinates per vertex
+    tex: np.ndarray,                             # texture image (H×W×3)
+    cam_pos: np.ndarray,                         # camera position (3,)
+    mat: MatPhong,                               # material
+    l_pos: Union[np.ndarray, List[np.ndarray]],  # light positions
+    l_int: Union[np.ndarray, List[np.ndarray]],  # light intensities
+    l_amb: np.ndarray,                           # ambient light (3,)
+    img: np.ndarray,                             # image buffer to update
+    zbuf: Optional[DepthBuffer] = None,          # optional depth buffer for hidden-surface removal
+    bounds: Optional[Tuple[int, int, int, int]] = None, # optional (min_y, max_y, min_x, max_x) pixel window
+    stats: Optional[RenderStats] = None,         # optional instrumentation (pixel counters)
+    dtype=np.float64,                            # float type of the vertex lighting (see precision_func)
+    setup=None,                                  # optional record of the triangle (see triangle_setup_func)
+    vertex_colors: Optional[np.ndarray] = None   # optional 3×3 colors of the vertices, already lit
+) -> np.ndarray:
+    """
+    Shade a triangle and update the specified image using Gouraud shading.
+    vertex_colors (from gouraud_vertex_colors, e.g. lit once per triangle by render_tiles)
+    skips the vertex lighting.
+    """
+
+    res_h, res_w, _ = img.shape
+
+    # Compute color at each vertex
+    if vertex_colors is None:
+        vertex_colors = gouraud_vertex_colors(v_pos, v_nrm, v_uvs, tex, cam_pos, mat, l_pos, l_int, l_amb, dtype=dtype)
+
     # Screen-space triangle (x, y)
     x = v_pos[0, :]
     y = v_pos[1, :]
     pts2D = np.stack([x, y], axis=1)
 
-    # Bounding box
-    min_x = max(int(np.floor(np.min(x))), 0)
-    max_x = min(int(np.ceil(np.max(x))), res_w - 1)
-    min_y = max(int(np.floor(np.min(y))), 0)
-    max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+    # Bounding box, and the barycentric system, the same for every pixel
+    if setup is not None:
+        # Both from the triangle setup (a degenerate triangle covers nothing)
+        min_x, max_x, min_y, max_y = int(setup.min_x), int(setup.max_x), int(setup.min_y), int(setup.max_y)
+        if setup.degenerate:
+            max_y = min_y - 1
+        A = setup.A
+    else:
+        min_x = max(int(np.floor(np.min(x))), 0)
+        max_x = min(int(np.ceil(np.max(x))), res_w - 1)
+        min_y = max(int(np.floor(np.min(y))), 0)
+        max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+        A = np.array([
+            [pts2D[0][0] - pts2D[2][0], pts2D[1][0] - pts2D[2][0]],
+            [pts2D[0][1] - pts2D[2][1], pts2D[1][1] - pts2D[2][1]]
+        ])
+
+    # Restrict to the pixel window (e.g. a screen tile)
+    if bounds is not None:
+        min_y, max_y = max(min_y, bounds[0]), min(max_y, bounds[1])
+        min_x, max_x = max(min_x, bounds[2]), min(max_x, bounds[3])
 
     # Rasterize
+    tested = shaded = 0
     for j in range(min_y, max_y + 1):
         for i in range(min_x, max_x + 1):
             p = np.array([i + 0.5, j + 0.5])
 
-            A = np.array([
-                [pts2D[0][0] - pts2D[2][0], pts2D[1][0] - pts2D[2][0]],
-                [pts2D[0][1] - pts2D[2][1], pts2D[1][1] - pts2D[2][1]]
-            ])
             b = p - pts2D[2]
             try:
                 u, v = np.linalg.solve(A, b)
@@ -82,8 +138,75 @@ def shade_gouraud(
                 continue
 
             if u >= 0 and v >= 0 and w >= 0:
+                # Depth test with the interpolated depth
+                tested += 1
+                if zbuf is not None and not zbuf.test_pixel(j, i, u * v_pos[2, 0] + v * v_pos[2, 1] + w * v_pos[2, 2]):
+                    continue
+
                 color = u * vertex_colors[0] + v * vertex_colors[1] + w * vertex_colors[2]
-                img[j, i, :] = np.clip(color, 0, 1)
+                img[j, i, :] = to_framebuffer(np.clip(color, 0, 1), img.dtype)
+                shaded += 1
+
+    if stats is not None:
+        stats.add('pixels_tested', tested)
+        stats.add('pixels_shaded', shaded)
+
+    return img
+
+
+def shade_gouraud_vec(
+    v_pos: np.ndarray,                           # 3×3 projected triangle vertices in image space
+    v_nrm: np.ndarray,                           # 3×3 normal vectors at triangle vertices
+    v_uvs: np.ndarray,                           # 3×2 UV coordinates per vertex
+    tex: np.ndarray,                             # texture image (H×W×3)
+    cam_pos: np.ndarray,                         # camera position (3,)
+    mat: MatPhong,                               # material
+    l_pos: Union[np.ndarray, List[np.ndarray]],  # light positions
+    l_int: Union[np.ndarray, List[np.ndarray]],  # light intensities
+    l_amb: np.ndarray,                           # ambient light (3,)
+    img: np.ndarray,                             # image buffer to update
+    zbuf: Optional[DepthBuffer] = None,          # optional depth buffer for hidden-surface removal
+    bounds: Optional[Tuple[int, int, int, int]] = None, # optional (min_y, max_y, min_x, max_x) pixel window
+    coverage: Callable = triangle_pixels,        # coverage kernel (triangle_pixels or triangle_pixels_fixed)
+    stats: Optional[RenderStats] = None,         # optional instrumentation (pixel counters)
+    dtype=np.float64,                            # float type of the shading math (see precision_func)
+    backend: Union[None, str, KernelBackend] = None,  # interpolation, texel and lighting kernels (see kernel_backend_func)
+    setup=None,                                  # optional record of the triangle (see triangle_setup_func)
+    vertex_colors: Optional[np.ndarray] = None   # optional 3×3 colors of the vertices, already lit
+) -> np.ndarray:
+    """
+    Vectorized Gouraud shading: same result as shade_gouraud, but all covered pixels
+    of the triangle are found and colored with a few array operations.
+    With a depth buffer, hidden fragments are rejected before any lighting is done.
+    vertex_colors (see shade_gouraud) skips the vertex lighting.
+    """
+    kernels = get_backend(backend)
+    res_h, res_w, _ = img.shape
+
+    # Covered pixels and their barycentric coordinates
+    ys, xs, u, v, w = coverage(v_pos, res_h, res_w, bounds, setup)
+    if stats is not None:
+        stats.add('pixels_tested', ys.size)
+
+    # Early depth test on the interpolated depth
+    if zbuf is not None:
+        visible = zbuf.test(ys, xs, u * v_pos[2, 0] + v * v_pos[2, 1] + w * v_pos[2, 2])
+        ys, xs, u, v, w = ys[visible], xs[visible], u[visible], v[visible], w[visible]
+
+    if stats is not None:
+        stats.add('pixels_shaded', ys.size)
+    if ys.size == 0:
+        return img
+
+    # Compute color at each vertex
+    if vertex_colors is None:
+        vertex_colors = gouraud_vertex_colors(v_pos, v_nrm, v_uvs, tex, cam_pos, mat, l_pos, l_int, l_amb,
+                                              dtype=dtype, backend=kernels)
+
+    # Interpolate the vertex colors (in the compute type)
+    u, v, w = (a.astype(dtype, copy=False) for a in (u, v, w))
+    color = kernels.interpolate(u, v, w, np.array(vertex_colors))
+    img[ys, xs, :] = to_framebuffer(np.clip(color, 0, 1), img.dtype)
 
     return img
 
@@ -1,7 +1,14 @@
 import numpy as np
-from typing import Union, List
-from light_func import light 
+from typing import Union, List, Optional, Tuple, Callable
+from light_func import light
 from MatPhong import MatPhong
+from triangle_kernel_func import triangle_pixels
+from depth_buffer_func import DepthBuffer
+from mip_texture_func import MipTexture, uv_gradients
+from texture_cache_func import texels
+from render_stats_func import RenderStats
+from precision_func import to_framebuffer
+from kernel_backend_func import KernelBackend, get_backend
 
 def shade_phong(
     v_pos: np.ndarray,                               # 3x3 triangle vertices in image space (after projection)
@@ -13,7 +20,12 @@ def shade_phong(
     l_pos: Union[np.ndarray, List[np.ndarray]],      # light positions (N, 3)
     l_int: Union[np.ndarray, List[np.ndarray]],      # light intensities (N, 3)
     l_amb: np.ndarray,                               # ambient light (3,)
-    img: np.ndarray                                  # image buffer to update (H x W x 3)
+    img: np.ndarray,                                 # image buffer to update (H x W x 3)
+    zbuf: Optional[DepthBuffer] = None,              # optional depth buffer for hidden-surface removal
+    bounds: Optional[Tuple[int, int, int, int]] = None,  # optional (min_y, max_y, min_x, max_x) pixel window
+    stats: Optional[RenderStats] = None,             # optional instrumentation (pixel counters)
+    dtype=np.float64,                                # float type of the fetched texels (see precision_func)
+    setup=None                                       # optional record of the triangle (see triangle_setup_func)
 ) -> np.ndarray:
     """
     Phong shading: interpolate normals and UVs per pixel, but reuse fixed V and L per triangle.
@@ -26,11 +38,27 @@ def shade_phong(
     y = v_pos[1, :]
     pts2D = np.stack([x, y], axis=1)
 
-    # Bounding box of triangle (clamped to image bounds)
-    min_x = max(int(np.floor(np.min(x))), 0)
-    max_x = min(int(np.ceil(np.max(x))), res_w - 1)
-    min_y = max(int(np.floor(np.min(y))), 0)
-    max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+    # Bounding box of triangle (clamped to image bounds), and the barycentric system, the same for every pixel
+    if setup is not None:
+        # Both from the triangle setup (a degenerate triangle covers nothing)
+        min_x, max_x, min_y, max_y = int(setup.min_x), int(setup.max_x), int(setup.min_y), int(setup.max_y)
+        if setup.degenerate:
+            max_y = min_y - 1
+        A = setup.A
+    else:
+        min_x = max(int(np.floor(np.min(x))), 0)
+        max_x = min(int(np.ceil(np.max(x))), res_w - 1)
+        min_y = max(int(np.floor(np.min(y))), 0)
+        max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+        A = np.array([
+            [pts2D[0][0] - pts2D[2][0], pts2D[1][0] - pts2D[2][0]],
+            [pts2D[0][1] - pts2D[2][1], pts2D[1][1] - pts2D[2][1]]
+        ])
+
+    # Restrict to the pixel window (e.g. a screen tile)
+    if bounds is not None:
+        min_y, max_y = max(min_y, bounds[0]), min(max_y, bounds[1])
+        min_x, max_x = max(min_x, bounds[2]), min(max_x, bounds[3])
 
     # Compute triangle centroid (in 3D, before projection)
     pt_center = np.mean(v_pos, axis=1)
@@ -43,16 +71,20 @@ def shade_phong(
     L_list = l_pos - pt_center
     L_list = L_list / (np.linalg.norm(L_list, axis=1, keepdims=True) + 1e-8)
 
+    # Level of detail of the filtered fetches, from the UV derivatives of the triangle (its UV plane)
+    if isinstance(tex, MipTexture):
+        if setup is not None and 'uv' in setup.planes:
+            lod = tex.lod(*setup.gradients('uv'))
+        else:
+            lod = tex.lod(*uv_gradients(v_pos[0], v_pos[1], v_uvs[:, 0], 1 - v_uvs[:, 1]))
+
     # Rasterization over bounding box
+    tested = shaded = 0
     for j in range(min_y, max_y + 1):
         for i in range(min_x, max_x + 1):
             p = np.array([i + 0.5, j + 0.5])  # Pixel center
 
             # Compute barycentric coordinates
-            A = np.array([
-                [pts2D[0][0] - pts2D[2][0], pts2D[1][0] - pts2D[2][0]],
-                [pts2D[0][1] - pts2D[2][1], pts2D[1][1] - pts2D[2][1]]
-            ])
             b = p - pts2D[2]
             try:
                 u, v = np.linalg.solve(A, b)
@@ -62,6 +94,11 @@ def shade_phong(
             
             # Check if inside triangle
             if u >= 0 and v >= 0 and w >= 0:
+
+                # Depth test with the interpolated depth (hidden pixels are not lit)
+                tested += 1
+                if zbuf is not None and not zbuf.test_pixel(j, i, u * v_pos[2, 0] + v * v_pos[2, 1] + w * v_pos[2, 2]):
+                    continue
                 
              
                 # Interpolated normal (then normalize)
@@ -70,12 +107,15 @@ def shade_phong(
 
                 # Interpolated UV
                 uv = u * v_uvs[0] + v * v_uvs[1] + w * v_uvs[2]
-                tu = np.clip(int(uv[0] * (tex.shape[1] - 1)), 0, tex.shape[1] - 1)
-                tv = np.clip(int(uv[1] * (tex.shape[0] - 1)), 0, tex.shape[0] - 1)
-                tv = np.clip(int((1 - uv[1]) * (tex.shape[0] - 1)), 0, tex.shape[0] - 1)
-
-                
-                vclr = tex[tv, tu, :]   # Normalize to [0,1]
+                if isinstance(tex, MipTexture):
+                    # Filtered fetch from the mip pyramid
+                    vclr = tex.sample(uv[0:1], 1 - uv[1:2], lod)[0].astype(dtype, copy=False)
+                else:
+                    tu = np.clip(int(uv[0] * (tex.shape[1] - 1)), 0, tex.shape[1] - 1)
+                    tv = np.clip(int(uv[1] * (tex.shape[0] - 1)), 0, tex.shape[0] - 1)
+                    tv = np.clip(int((1 - uv[1]) * (tex.shape[0] - 1)), 0, tex.shape[0] - 1)
+
+                    vclr = texels(tex, tv, tu, dtype)   # Normalize to [0,1]
               
 
                 # Interpolated 3D position (optional, but passed for consistency)
@@ -83,11 +123,100 @@ def shade_phong(
 
                 # Lighting calculation using fixed V and L
                 color = light(pt, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb, fixed_V=V, fixed_L_list=L_list)
-                img[j, i, :] = np.clip(color, 0, 1)
+                img[j, i, :] = to_framebuffer(np.clip(color, 0, 1), img.dtype)
+                shaded += 1
+
+    if stats is not None:
+        stats.add('pixels_tested', tested)
+        stats.add('pixels_shaded', shaded)
 
     return img
 
 
+def shade_phong_vec(
+    v_pos: np.ndarray,                               # 3x3 triangle vertices in image space (after projection)
+    v_nrm: np.ndarray,                               # 3x3 vertex normals
+    v_uvs: np.ndarray,                               # 3x2 (u,v) texture coordinates per vertex
+    tex: np.ndarray,                                 # texture image (H x W x 3)
+    cam_pos: np.ndarray,                             # camera/viewer position (3,)
+    mat: MatPhong,                                   # Phong material
+    l_pos: Union[np.ndarray, List[np.ndarray]],      # light positions (N, 3)
+    l_int: Union[np.ndarray, List[np.ndarray]],      # light intensities (N, 3)
+    l_amb: np.ndarray,                               # ambient light (3,)
+    img: np.ndarray,                                 # image buffer to update (H x W x 3)
+    zbuf: Optional[DepthBuffer] = None,              # optional depth buffer for hidden-surface removal
+    bounds: Optional[Tuple[int, int, int, int]] = None,  # optional (min_y, max_y, min_x, max_x) pixel window
+    coverage: Callable = triangle_pixels,            # coverage kernel (triangle_pixels or triangle_pixels_fixed)
+    stats: Optional[RenderStats] = None,             # optional instrumentation (pixel counters)
+    dtype=np.float64,                                # float type of the shading math (see precision_func)
+    backend: Union[None, str, KernelBackend] = None,  # interpolation, texel and lighting kernels (see kernel_backend_func)
+    setup=None                                       # optional record of the triangle (see triangle_setup_func)
+) -> np.ndarray:
+    """
+    Vectorized Phong shading: same result as shade_phong, but barycentrics, normals, UVs,
+    texture fetches and lighting are computed for all covered pixels at once.
+    With a depth buffer, hidden fragments are rejected before texturing and lighting.
+    """
+    kernels = get_backend(backend)
+    res_h, res_w, _ = img.shape
+
+    # Covered pixels and their barycentric coordinates
+    ys, xs, u, v, w = coverage(v_pos, res_h, res_w, bounds, setup)
+    if stats is not None:
+        stats.add('pixels_tested', ys.size)
+
+    # Early depth test on the interpolated depth
+    if zbuf is not None:
+        visible = zbuf.test(ys, xs, u * v_pos[2, 0] + v * v_pos[2, 1] + w * v_pos[2, 2])
+        ys, xs, u, v, w = ys[visible], xs[visible], u[visible], v[visible], w[visible]
+
+    if stats is not None:
+        stats.add('pixels_shaded', ys.size)
+    if ys.size == 0:
+        return img
+
+    # Compute triangle centroid (in 3D, before projection)
+    pt_center = np.mean(v_pos, axis=1)
+
+    # Fixed view direction V
+    V = cam_pos - pt_center
+    V = V / (np.linalg.norm(V) + 1e-8)
+
+    # Fixed light directions for all light sources
+    L_list = l_pos - pt_center
+    L_list = L_list / (np.linalg.norm(L_list, axis=1, keepdims=True) + 1e-8)
+
+    # Interpolated UVs and texture fetch (texture coordinates stay float64)
+    uv = kernels.interpolate(u, v, w, v_uvs)
+    if isinstance(tex, MipTexture):
+        # Filtered fetch, level of detail from the UV derivatives of the triangle (its UV plane)
+        if setup is not None and 'uv' in setup.planes:
+            lod = tex.lod(*setup.gradients('uv'))
+        else:
+            lod = tex.lod(*uv_gradients(v_pos[0], v_pos[1], v_uvs[:, 0], 1 - v_uvs[:, 1]))
+        vclr = tex.sample(uv[:, 0], 1 - uv[:, 1], lod).astype(dtype, copy=False)
+    else:
+        tu = np.clip((uv[:, 0] * (tex.shape[1] - 1)).astype(int), 0, tex.shape[1] - 1)
+        tv = np.clip(((1 - uv[:, 1]) * (tex.shape[0] - 1)).astype(int), 0, tex.shape[0] - 1)
+        vclr = kernels.texels(tex, tv, tu, dtype)
+
+    # Barycentric weights in the compute type for the shading attributes
+    u, v, w = (a.astype(dtype, copy=False) for a in (u, v, w))
+
+    # Interpolated normals (then normalize)
+    nrm = kernels.interpolate(u, v, w, v_nrm.T.astype(dtype, copy=False))
+    nrm = nrm / (np.sqrt(np.sum(nrm * nrm, axis=1, keepdims=True)) + 1e-8)
+
+    # Interpolated 3D positions (optional, but passed for consistency)
+    pt = kernels.interpolate(u, v, w, v_pos.T.astype(dtype, copy=False))
+
+    # Lighting of all pixels with fixed V and L
+    color = kernels.light_batch(pt, nrm, vclr, cam_pos, mat, l_pos, l_int, l_amb, fixed_V=V, fixed_L_list=L_list,
+                                dtype=dtype)
+
+    img[ys, xs, :] = to_framebuffer(np.clip(color, 0, 1), img.dtype)
+
+    return img
 
 
 # # Example usage of the shade_phong function (uncomment the following lines to test):
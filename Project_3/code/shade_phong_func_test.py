@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from render_object_func import render_object
+from MatPhong import MatPhong
+from texture_cache_func import load_texture
+
+# Tests of the per-pixel Phong shader on hw3.npy: with a mip texture it must sample the same
+# filtered texels as the vectorized shader. The image is rendered at a quarter of the
+# resolution so the per-pixel loop stays fast.
+# Run with: python -m pytest shade_phong_func_test.py
+
+data = np.load("hw3.npy", allow_pickle=True).item()
+texture = load_texture("Mona-Lisa-Exist-in-Real-Life-2635825581.jpg")
+scene = dict(v_pos=data["v_pos"], v_uvs=data["v_uvs"], t_pos_idx=data["t_pos_idx"].T, tex=texture,
+             plane_h=data["plane_h"], plane_w=data["plane_w"], res_h=data["res_h"] // 4, res_w=data["res_w"] // 4,
+             focal=data["focal"], eye=data["cam_pos"].flatten(), up=data["up"].flatten(),
+             target=data["target"].flatten(), mat=MatPhong(ka=data["ka"], kd=data["kd"], ks=data["ks"], n=data["n"]),
+             l_pos=np.array(data["l_pos"]), l_int=np.array(data["l_int"]), l_amb=data["l_amb"])
+
+
+@pytest.mark.parametrize("tex_filter", ['nearest', 'bilinear', 'trilinear'])
+def test_filtered_matches_vectorized(tex_filter):
+    img = render_object(**scene, shader='phong', zbuffer=True, tex_filter=tex_filter)
+    expected = render_object(**scene, shader='phong_vec', zbuffer=True, tex_filter=tex_filter)
+    np.testing.assert_array_equal(img, expected)
+
+    # The filter is not ignored: at this size the triangles sample coarser levels
+    unfiltered = render_object(**scene, shader='phong', zbuffer=True)
+    assert np.any(img != unfiltered)
@@ -0,0 +1,267 @@
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from typing import Union, List, Tuple, Callable, Optional
+from MatPhong import MatPhong
+from depth_buffer_func import DepthBuffer
+from render_stats_func import RenderStats
+from precision_func import Precision, PRECISIONS, get_precision, white
+from triangle_setup_func import TriangleSetup
+from shade_gouraud_func import shade_gouraud, shade_gouraud_vec, gouraud_vertex_colors
+
+# State of a worker process (set once by _init_worker)
+_worker = {}
+
+def bin_triangles(
+    vertices_2d: np.ndarray,
+    t_pos_idx: np.ndarray,
+    res_h: int,
+    res_w: int,
+    tile_size: int,
+    setup: Optional[TriangleSetup] = None
+) -> List[Tuple[Tuple[int, int, int, int], np.ndarray]]:
+    """
+    Sorts the triangles into square screen tiles by their bounding boxes (sort-middle binning).
+
+    A triangle goes into every tile its clamped bounding box touches (the same box the shading
+    kernels scan), and every tile keeps its triangles in index order.
+
+    Parameters:
+    - vertices_2d: (3, Nv) projected vertices (pixel x, pixel y, depth).
+    - t_pos_idx: (3, Nt) triangle indices (0-based).
+    - res_h, res_w: Resolution of the image.
+    - tile_size: Width and height of a tile in pixels.
+    - setup: Optional TriangleSetup of the triangles (see triangle_setup_func): its bounding
+      boxes are used instead of being computed again.
+
+    Returns:
+    - List of (bounds, triangles) for the non-empty tiles, where bounds is the inclusive pixel
+      window (min_y, max_y, min_x, max_x) of the tile and triangles the indices into t_pos_idx.
+    """
+    # Bounding box of every triangle (clamped to image bounds)
+    if setup is not None:
+        min_x, max_x, min_y, max_y = setup.min_x, setup.max_x, setup.min_y, setup.max_y
+    else:
+        x = vertices_2d[0, t_pos_idx]
+        y = vertices_2d[1, t_pos_idx]
+        min_x = np.maximum(np.floor(np.min(x, axis=0)).astype(int), 0)
+        max_x = np.minimum(np.ceil(np.max(x, axis=0)).astype(int), res_w - 1)
+        min_y = np.maximum(np.floor(np.min(y, axis=0)).astype(int), 0)
+        max_y = np.minimum(np.ceil(np.max(y, axis=0)).astype(int), res_h - 1)
+    tris = np.flatnonzero((min_x <= max_x) & (min_y <= max_y))
+
+    # Range of tiles touched by every triangle
+    n_tiles_x = (res_w + tile_size - 1) // tile_size
+    tx0, tx1 = min_x[tris] // tile_size, max_x[tris] // tile_size
+    ty0, ty1 = min_y[tris] // tile_size, max_y[tris] // tile_size
+    span_x = tx1 - tx0 + 1
+    counts = span_x * (ty1 - ty0 + 1)
+
+    # One (tile, triangle) pair per touched tile
+    owner = np.repeat(np.arange(tris.size), counts)
+    local = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile = (ty0[owner] + local // span_x[owner]) * n_tiles_x + tx0[owner] + local % span_x[owner]
+
+    # Group by tile, keeping the triangle order inside each tile
+    order = np.argsort(tile, kind='stable')
+    tile, tri = tile[order], tris[owner[order]]
+    starts = np.flatnonzero(np.r_[True, tile[1:] != tile[:-1]]) if tile.size else np.empty(0, dtype=int)
+
+    bins = []
+    for start, stop in zip(starts, np.r_[starts[1:], tile.size]):
+        ty, tx = divmod(int(tile[start]), n_tiles_x)
+        bounds = (ty * tile_size, min((ty + 1) * tile_size, res_h) - 1,
+                  tx * tile_size, min((tx + 1) * tile_size, res_w) - 1)
+        bins.append((bounds, tri[start:stop]))
+
+    return bins
+
+
+def render_tiles(
+    shade: Callable,
+    vertices_2d: np.ndarray,
+    v_normals: np.ndarray,
+    v_uvs: np.ndarray,
+    t_pos_idx: np.ndarray,
+    tex: np.ndarray,
+    cam_pos: np.ndarray,
+    mat: MatPhong,
+    l_pos: Union[np.ndarray, List[np.ndarray]],
+    l_int: Union[np.ndarray, List[np.ndarray]],
+    l_amb: np.ndarray,
+    res_h: int,
+    res_w: int,
+    zbuffer: bool = False,
+    workers: int = 2,
+    tile_size: int = 64,
+    shade_kwargs: Optional[dict] = None,
+    stats: Optional[RenderStats] = None,
+    precision: Optional[Precision] = None,
+    setup: Optional[TriangleSetup] = None
+) -> np.ndarray:
+    """
+    Renders the triangles tile by tile in a pool of worker processes.
+
+    Tiles cover disjoint pixels and every tile draws its triangles in index order (with its
+    own depth test), so each pixel sees exactly the same sequence of writes as in the serial
+    loop of render_object: the image is identical whatever the number of workers. The workers
+    write straight into a framebuffer in shared memory.
+
+    The per-triangle work is done once per triangle, not once per tile it touches: the
+    vertices, normals and UVs of every triangle are gathered once and, for Gouraud shading,
+    the vertices of every triangle are lit once (by the workers, before the tiles). Both are
+    kept in shared memory next to the framebuffer, so the tiles only rasterize and shade
+    pixels.
+
+    Parameters:
+    - shade: Shading kernel (one of render_object's SHADERS), called with bounds=tile.
+    - vertices_2d: (3, Nv) projected vertices (pixel x, pixel y, depth).
+    - v_normals: (3, Nv) vertex normals.
+    - v_uvs: (Nv, 2) texture coordinates.
+    - t_pos_idx: (3, Nt) triangle indices (0-based, all valid).
+    - tex: (H, W, 3) texture image.
+    - cam_pos, mat, l_pos, l_int, l_amb: Camera position, material and lights.
+    - res_h, res_w: Resolution of the image.
+    - zbuffer: Remove hidden surfaces with a depth buffer.
+    - workers: Number of worker processes.
+    - tile_size: Width and height of a tile in pixels.
+    - shade_kwargs: Extra keyword arguments for the shading kernel (e.g. coverage, dtype).
+    - stats: Optional RenderStats; the pixel counters of the workers are added to it.
+    - precision: Framebuffer type of the image (see precision_func; default float32).
+    - setup: Optional TriangleSetup of the triangles (see triangle_setup_func): the tiles are
+      binned with its bounding boxes and the kernels get the record of every triangle.
+
+    Returns:
+    - img: (res_h, res_w, 3) image with RGB values in [0, 1] (or [0, 255] for uint8).
+    """
+    # Step 1: Bin the triangles, biggest tiles first for a better load balance
+    bins = bin_triangles(vertices_2d, t_pos_idx, res_h, res_w, tile_size, setup)
+    bins.sort(key=lambda b: -b[1].size)
+
+    # Step 2: Framebuffer (white background) and per-triangle vertex data in shared memory
+    n_tri = t_pos_idx.shape[1]
+    dtype = get_precision(precision, PRECISIONS['mixed']).framebuffer
+    shade_kwargs = shade_kwargs or {}
+    gouraud = shade is shade_gouraud or shade is shade_gouraud_vec
+    specs = {'img': ((res_h, res_w, 3), dtype),
+             'v_pos': ((n_tri, 3, 3), vertices_2d.dtype),
+             'v_nrm': ((n_tri, 3, 3), v_normals.dtype),
+             'v_uvs': ((n_tri, 3, 2), v_uvs.dtype)}
+    if gouraud:
+        specs['vertex_colors'] = ((n_tri, 3, 3), shade_kwargs.get('dtype', np.float64))
+    shm, layout = _shared_arrays(specs)
+    try:
+        arrays = _attach_arrays(shm, layout)
+        arrays['img'][:] = white(dtype)
+        arrays['v_pos'][:] = vertices_2d[:, t_pos_idx].transpose(2, 0, 1)
+        arrays['v_nrm'][:] = v_normals[:, t_pos_idx].transpose(2, 0, 1)
+        arrays['v_uvs'][:] = v_uvs[t_pos_idx.T]
+
+        scene = dict(shade=shade, tex=tex, cam_pos=cam_pos, mat=mat, l_pos=l_pos, l_int=l_int, l_amb=l_amb,
+                     zbuffer=zbuffer, shade_kwargs=shade_kwargs, count=stats is not None, setup=setup)
+        with Pool(workers, initializer=_init_worker, initargs=(shm.name, layout, scene)) as pool:
+            # Step 3: Gouraud shading: light the vertices of every binned triangle once
+            if gouraud and bins:
+                drawn = np.unique(np.concatenate([tris for _, tris in bins]))
+                pool.map(_light_triangles, np.array_split(drawn, min(drawn.size, 4 * workers)))
+
+            # Step 4: Render the tiles in parallel
+            for counters in pool.imap_unordered(_render_tile, bins):
+                for name, n in counters.items():
+                    stats.add(name, n)
+
+        result = arrays['img'].copy()
+        del arrays
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return result
+
+
+def _shared_arrays(specs: dict) -> Tuple[shared_memory.SharedMemory, dict]:
+    """
+    Creates one shared memory block for several arrays, specs mapping every name to its
+    (shape, dtype). Returns the block and its layout (name -> (offset, shape, dtype)), from
+    which _attach_arrays gives the arrays in any process.
+    """
+    layout, size = {}, 0
+    for name, (shape, dtype) in specs.items():
+        dtype = np.dtype(dtype)
+        size = -(-size // 64) * 64  # every array starts on a cache line
+        layout[name] = (size, tuple(shape), dtype.str)
+        size += int(np.prod(shape)) * dtype.itemsize
+    return shared_memory.SharedMemory(create=True, size=max(size, 1)), layout
+
+
+def _attach_arrays(shm: shared_memory.SharedMemory, layout: dict) -> dict:
+    """
+    Views of the arrays of a shared memory block (see _shared_arrays), without copies.
+    """
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+
+def _init_worker(shm_name: str, layout: dict, scene: dict) -> None:
+    """
+    Attaches a worker process to the shared framebuffer and vertex data and keeps the scene data.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['arrays'] = _attach_arrays(shm, layout)
+    _worker['scene'] = scene
+
+    # Tiles are disjoint, so one depth buffer per worker serves all of its tiles
+    res_h, res_w, _ = layout['img'][1]
+    _worker['zbuf'] = DepthBuffer(res_h, res_w) if scene['zbuffer'] else None
+
+
+def _light_triangles(tris: np.ndarray) -> None:
+    """
+    Lights the vertices of some triangles for Gouraud shading (runs in a worker) and stores
+    their colors in shared memory, with the same arguments as the shading kernel would use.
+    """
+    scene = _worker['scene']
+    arrays = _worker['arrays']
+    kwargs = scene['shade_kwargs']
+    for triangle_idx in tris:
+        arrays['vertex_colors'][triangle_idx] = gouraud_vertex_colors(
+            arrays['v_pos'][triangle_idx], arrays['v_nrm'][triangle_idx], arrays['v_uvs'][triangle_idx],
+            scene['tex'], scene['cam_pos'], scene['mat'], scene['l_pos'], scene['l_int'], scene['l_amb'],
+            dtype=kwargs.get('dtype', np.float64), backend=kwargs.get('backend')
+        )
+
+
+def _render_tile(task: Tuple[Tuple[int, int, int, int], np.ndarray]) -> dict:
+    """
+    Draws the triangles of one tile into the shared framebuffer (runs in a worker) and
+    returns the pixel counters of the tile (empty if not counting).
+    """
+    bounds, tris = task
+    scene = _worker['scene']
+    arrays = _worker['arrays']
+    stats = RenderStats() if scene['count'] else None
+
+    setup = scene['setup']
+    vertex_colors = arrays.get('vertex_colors')
+    for triangle_idx in tris:
+        extra = {'vertex_colors': vertex_colors[triangle_idx]} if vertex_colors is not None else {}
+        scene['shade'](
+            v_pos=arrays['v_pos'][triangle_idx],
+            v_nrm=arrays['v_nrm'][triangle_idx],
+            v_uvs=arrays['v_uvs'][triangle_idx],
+            tex=scene['tex'],
+            cam_pos=scene['cam_pos'],
+            mat=scene['mat'],
+            l_pos=scene['l_pos'],
+            l_int=scene['l_int'],
+            l_amb=scene['l_amb'],
+            img=arrays['img'],
+            zbuf=_worker['zbuf'],
+            bounds=bounds,
+            stats=stats,
+            setup=setup[triangle_idx] if setup is not None else None,
+            **extra,
+            **scene['shade_kwargs']
+        )
+
+    return stats.counters if stats is not None else {}
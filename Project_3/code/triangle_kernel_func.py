@@ -0,0 +1,121 @@
+import numpy as np
+from typing import Tuple, Optional, Union
+
+def triangle_pixels(
+    v_pos: np.ndarray,      # 3x3 triangle vertices in image space (x, y, depth as rows)
+    res_h: int,             # image height in pixels
+    res_w: int,             # image width in pixels
+    bounds: Optional[Tuple[int, int, int, int]] = None,  # optional (min_y, max_y, min_x, max_x) pixel window
+    setup=None              # optional record of the triangle (see triangle_setup_func)
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds all pixels covered by a triangle and their barycentric coordinates in one pass.
+
+    This is the vectorized counterpart of the per-pixel loop used by shade_gouraud and
+    shade_phong: the same bounding box is scanned, the same pixel centers (i + 0.5, j + 0.5)
+    are tested and the same 2x2 system is solved, but for all pixels of the box at once.
+    The system is solved as a stack of 2x2 problems so every pixel goes through exactly
+    the same LAPACK call as in the scalar loop, which keeps the results bit-identical.
+
+    Parameters:
+    - v_pos: (3, 3) array with the projected vertices as columns.
+    - res_h, res_w: Size of the target image (used to clamp the bounding box).
+    - bounds: Optional inclusive pixel window (min_y, max_y, min_x, max_x), e.g. a screen tile;
+      only the covered pixels inside it are returned.
+    - setup: Optional setup record of the triangle (setup[k] of setup_triangles). Its bounding
+      box and barycentric system are used instead of being recomputed, and the pixels its edge
+      functions put clearly outside are dropped before the solve (same result, fewer solves).
+
+    Returns:
+    - ys, xs: (P,) integer pixel coordinates of the covered pixels.
+    - u, v, w: (P,) barycentric weights of vertex 0, 1 and 2 at those pixels.
+    """
+    x = v_pos[0, :]
+    y = v_pos[1, :]
+
+    # Bounding box (clamped to image bounds)
+    if setup is not None:
+        min_x, max_x, min_y, max_y = int(setup.min_x), int(setup.max_x), int(setup.min_y), int(setup.max_y)
+    else:
+        min_x = max(int(np.floor(np.min(x))), 0)
+        max_x = min(int(np.ceil(np.max(x))), res_w - 1)
+        min_y = max(int(np.floor(np.min(y))), 0)
+        max_y = min(int(np.ceil(np.max(y))), res_h - 1)
+
+    # Restrict to the pixel window
+    if bounds is not None:
+        min_y, max_y = max(min_y, bounds[0]), min(max_y, bounds[1])
+        min_x, max_x = max(min_x, bounds[2]), min(max_x, bounds[3])
+
+    empty_i = np.empty(0, dtype=int)
+    empty_f = np.empty(0, dtype=np.float64)
+    if min_x > max_x or min_y > max_y or (setup is not None and setup.degenerate):
+        return empty_i, empty_i, empty_f, empty_f, empty_f
+
+    # Pixel grid of the bounding box (row-major, same order as the scalar loops)
+    jj, ii = np.mgrid[min_y:max_y + 1, min_x:max_x + 1]
+    ys = jj.ravel()
+    xs = ii.ravel()
+
+    # Barycentric system, identical for every pixel of the triangle
+    if setup is not None:
+        A = setup.A
+        keep = edge_candidates(setup.edges, setup.reject_tol, xs, ys)
+        ys, xs = ys[keep], xs[keep]
+    else:
+        A = np.array([
+            [x[0] - x[2], x[1] - x[2]],
+            [y[0] - y[2], y[1] - y[2]]
+        ])
+    b = np.stack([xs + 0.5 - x[2], ys + 0.5 - y[2]], axis=1)
+
+    # The weights always come from the solve (the edge functions of a setup only reject
+    # pixels: their weights differ from the solve in the last bits)
+    try:
+        sol = np.linalg.solve(np.broadcast_to(A, (b.shape[0], 2, 2)), b[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # Degenerate triangle: the scalar loops skip every pixel
+        return empty_i, empty_i, empty_f, empty_f, empty_f
+
+    u = sol[:, 0]
+    v = sol[:, 1]
+    w = 1 - u - v
+
+    # Keep only the pixels inside the triangle
+    inside = (u >= 0) & (v >= 0) & (w >= 0)
+    return ys[inside], xs[inside], u[inside], v[inside], w[inside]
+
+
+def edge_candidates(edges: np.ndarray, reject_tol: Union[float, np.ndarray], xs: np.ndarray,
+                    ys: np.ndarray) -> np.ndarray:
+    """
+    Pixels that may be covered, from the normalized edge functions of a triangle setup: a
+    pixel is dropped only if one of its barycentric weights is below -reject_tol, far enough
+    from the edge that the exact solve cannot find it inside.
+
+    Parameters:
+    - edges: (3, 3) edge functions of one triangle, or (P, 3, 3) of the triangle of every pixel.
+    - reject_tol: Rejection tolerance of the triangle, or (P,) of the triangle of every pixel.
+    - xs, ys: (P,) integer pixel coordinates.
+
+    Returns:
+    - (P,) boolean mask of the pixels to solve for.
+    """
+    px = xs[:, None] + 0.5
+    py = ys[:, None] + 0.5
+    weights = edges[..., 0] * px + edges[..., 1] * py + edges[..., 2]
+    return np.all(weights >= -np.reshape(reject_tol, (-1, 1)), axis=1)
+
+
+def interpolate(u: np.ndarray, v: np.ndarray, w: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Interpolates per-vertex attributes at many pixels with barycentric weights.
+
+    Parameters:
+    - u, v, w: (P,) barycentric weights.
+    - values: (3, D) array with the attribute of each vertex as rows.
+
+    Returns:
+    - (P, D) array of interpolated attributes.
+    """
+    return u[:, None] * values[0] + v[:, None] * values[1] + w[:, None] * values[2]
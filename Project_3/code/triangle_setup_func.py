@@ -0,0 +1,306 @@
+import numpy as np
+from typing import Optional, Dict, Tuple, Iterator, Union
+from triangle_kernel_func import edge_candidates
+from edge_raster_func import SUBPIXEL_BITS, MAX_COORD
+
+# Barycentric weights this close to an edge (relative to the size of the edge functions over
+# the bounding box) are always left to the exact solve of the coverage kernels
+REJECT_TOLERANCE = 1e-6
+
+# Triangles whose barycentric system is worse conditioned than this are never pre-rejected
+MAX_CONDITION = 1e6
+
+# Maximum number of candidate pixels processed at once by batch_pixels
+BATCH_PIXELS = 1 << 18
+
+class TriangleSetup:
+    def __init__(self, x: np.ndarray, y: np.ndarray, z: np.ndarray, min_x: np.ndarray, max_x: np.ndarray,
+                 min_y: np.ndarray, max_y: np.ndarray, A: np.ndarray, degenerate: np.ndarray,
+                 inv_area: np.ndarray, edges: np.ndarray, reject_tol: np.ndarray,
+                 planes: Dict[str, np.ndarray], fixed: Optional[np.ndarray] = None,
+                 fixed_area: Optional[np.ndarray] = None, fixed_edges: Optional[np.ndarray] = None) -> None:
+        """
+        Struct-of-arrays setup of the triangles of a view: everything the rasterizers need per
+        triangle, computed once for all triangles (see setup_triangles) instead of once per
+        triangle, or even once per pixel, in the kernels.
+
+        setup[k] is the record of triangle k (the same fields without the triangle axis), the
+        form taken by the coverage kernels and the shaders; setup[idx] with a slice or an index
+        array is the setup of those triangles.
+
+        Parameters:
+        - x, y, z: (N, 3) screen-space vertices (pixel x, pixel y, depth) of every triangle.
+        - min_x, max_x, min_y, max_y: (N,) inclusive bounding box, clamped to the image
+          (empty, min_x > max_x, for triangles with invalid indices or non-finite vertices).
+        - A: (N, 2, 2) barycentric system of triangle_pixels, the same for all pixels.
+        - degenerate: (N,) True where that system is singular (the triangle covers nothing).
+        - inv_area: (N,) inverse of twice the signed area (0 for degenerate triangles).
+        - edges: (N, 3, 3) edge functions normalized to the barycentric weights: the weight of
+          vertex k at the pixel center (px, py) is edges[:, k, 0] * px + edges[:, k, 1] * py
+          + edges[:, k, 2].
+        - reject_tol: (N,) pixels with a weight below -reject_tol are certainly outside (inf
+          for ill-conditioned triangles: no pixel is rejected before the solve).
+        - planes: Plane equations of per-vertex attributes, name -> (N, D, 3) array with the
+          derivatives d/dx, d/dy and the value at pixel (0, 0) of every component.
+        - fixed: (N,) True where the fixed-point edge functions below are exact (None if not
+          set up for sub-pixel rasterization).
+        - fixed_area: (N,) twice the absolute area in fixed point (0 for degenerate triangles).
+        - fixed_edges: (N, 3, 4) integer edge functions of triangle_pixels_fixed, oriented so
+          that the inside is positive: (dx, dy, c, bias) of the edge opposite to vertex k, with
+          value dx * py - dy * px + c at the fixed-point position (px, py).
+        """
+        self.x = x
+        self.y = y
+        self.z = z
+        self.min_x = min_x
+        self.max_x = max_x
+        self.min_y = min_y
+        self.max_y = max_y
+        self.A = A
+        self.degenerate = degenerate
+        self.inv_area = inv_area
+        self.edges = edges
+        self.reject_tol = reject_tol
+        self.planes = planes
+        self.fixed = fixed
+        self.fixed_area = fixed_area
+        self.fixed_edges = fixed_edges
+
+    def __len__(self) -> int:
+        return self.x.shape[0]
+
+    def __getitem__(self, key: Union[int, slice, np.ndarray]) -> "TriangleSetup":
+        pick = lambda a: a[key] if a is not None else None
+        return TriangleSetup(pick(self.x), pick(self.y), pick(self.z), pick(self.min_x), pick(self.max_x),
+                             pick(self.min_y), pick(self.max_y), pick(self.A), pick(self.degenerate),
+                             pick(self.inv_area), pick(self.edges), pick(self.reject_tol),
+                             {name: plane[key] for name, plane in self.planes.items()}, pick(self.fixed),
+                             pick(self.fixed_area), pick(self.fixed_edges))
+
+    def gradients(self, name: str) -> Tuple[np.ndarray, ...]:
+        """
+        Screen-space derivatives of the attribute `name`: d0/dx, d0/dy, d1/dx, d1/dy, ... for
+        its components (for texture coordinates the dsdx, dsdy, dtdx, dtdy of uv_gradients).
+        """
+        plane = self.planes[name]
+        return tuple(plane[..., d, j] for d in range(plane.shape[-2]) for j in (0, 1))
+
+    def __repr__(self) -> str:
+        if np.ndim(self.degenerate) == 0:
+            return f"TriangleSetup(record, box x {self.min_x}..{self.max_x}, y {self.min_y}..{self.max_y})"
+        return f"TriangleSetup({len(self)} triangles, {np.count_nonzero(self.degenerate)} degenerate)"
+
+
+def setup_triangles(
+    vertices_2d: np.ndarray,
+    t_pos_idx: np.ndarray,
+    res_h: int,
+    res_w: int,
+    attributes: Optional[Dict[str, np.ndarray]] = None,
+    subpixel: bool = False
+) -> TriangleSetup:
+    """
+    Triangle setup: one vectorized pass over all triangles that computes their clamped
+    bounding boxes, barycentric systems, normalized edge functions, inverse areas and the
+    plane equations of their attributes (see TriangleSetup).
+
+    The coverage kernels read their bounding boxes and barycentric systems instead of
+    recomputing them, and use the edge functions only to drop the pixels of the bounding box
+    that are clearly outside before the barycentric solve. The weights of the remaining
+    pixels still come from the same per-pixel LAPACK solve, so the images are unchanged:
+    the edge functions times the inverse area give the same weights only up to rounding
+    (the solve rounds differently, e.g. with fused multiply-adds), which would move pixels
+    on the edges and change the interpolated values in the last bits.
+
+    Parameters:
+    - vertices_2d: (3, Nv) projected vertices (pixel x, pixel y, depth).
+    - t_pos_idx: (3, Nt) triangle indices (0-based); triangles with invalid indices get an
+      empty bounding box.
+    - res_h, res_w: Resolution of the image.
+    - attributes: Optional per-vertex attributes to set up plane equations for, name ->
+      (D, Nv) array, e.g. 'uv': the texture coordinates (u, 1 - v) of the texture fetches.
+    - subpixel: If True, also set up the fixed-point edge functions of triangle_pixels_fixed.
+
+    Returns:
+    - The TriangleSetup of the Nt triangles, in the order of t_pos_idx.
+    """
+    vertices_2d = np.asarray(vertices_2d, dtype=np.float64)
+    t_pos_idx = np.asarray(t_pos_idx)
+    N = t_pos_idx.shape[1]
+
+    # Step 1: Vertices of every triangle (invalid indices read vertex 0 and are masked below)
+    valid = np.all((t_pos_idx >= 0) & (t_pos_idx < vertices_2d.shape[1]), axis=0)
+    idx = np.where(valid, t_pos_idx, 0).T                  # N x 3
+    x, y, z = vertices_2d[0, idx], vertices_2d[1, idx], vertices_2d[2, idx]
+    usable = valid & np.all(np.isfinite(x) & np.isfinite(y), axis=1)
+
+    # Step 2: Bounding boxes, clamped to the image (empty where the triangle is unusable)
+    xu, yu = np.where(usable[:, None], x, 0), np.where(usable[:, None], y, 0)
+    min_x = np.clip(np.floor(np.min(xu, axis=1)), 0, res_w).astype(np.int64)
+    max_x = np.clip(np.ceil(np.max(xu, axis=1)), -1, res_w - 1).astype(np.int64)
+    min_y = np.clip(np.floor(np.min(yu, axis=1)), 0, res_h).astype(np.int64)
+    max_y = np.clip(np.ceil(np.max(yu, axis=1)), -1, res_h - 1).astype(np.int64)
+    min_x[~usable], max_x[~usable] = 0, -1
+
+    # Step 3: Barycentric systems (as built by triangle_pixels) and the singular ones
+    A = np.stack([np.stack([x[:, 0] - x[:, 2], x[:, 1] - x[:, 2]], axis=1),
+                  np.stack([y[:, 0] - y[:, 2], y[:, 1] - y[:, 2]], axis=1)], axis=1)
+    degenerate = _singular(A)
+
+    # Step 4: Twice the signed area and its inverse (as in uv_gradients), then the edge
+    # functions divided by it: the barycentric weights as planes over the screen
+    x0, x1, x2 = x.T
+    y0, y1, y2 = y.T
+    det = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        inv_area = np.where(det != 0, 1.0 / det, 0.0)
+        edges = np.stack([np.stack([y1 - y2, x2 - x1, x1 * y2 - x2 * y1], axis=1),
+                          np.stack([y2 - y0, x0 - x2, x2 * y0 - x0 * y2], axis=1),
+                          np.stack([y0 - y1, x1 - x0, x0 * y1 - x1 * y0], axis=1)], axis=1) * inv_area[:, None, None]
+
+        # Rejection tolerance: relative to the largest weight the edge functions reach in the
+        # bounding box; ill-conditioned (sliver) triangles reject nothing
+        reach = np.maximum(np.abs(min_x), np.abs(max_x)) + 1, np.maximum(np.abs(min_y), np.abs(max_y)) + 1
+        scale = np.max(np.abs(edges[:, :, 0]) * reach[0][:, None] + np.abs(edges[:, :, 1]) * reach[1][:, None]
+                       + np.abs(edges[:, :, 2]), axis=1)
+        length2 = np.max(np.stack([(x1 - x0) ** 2 + (y1 - y0) ** 2, (x2 - x1) ** 2 + (y2 - y1) ** 2,
+                                   (x0 - x2) ** 2 + (y0 - y2) ** 2]), axis=0)
+        condition = length2 * np.abs(inv_area)
+    reject_tol = np.where(np.isfinite(scale) & (condition <= MAX_CONDITION) & (inv_area != 0),
+                          REJECT_TOLERANCE * (1 + scale), np.inf)
+
+    # Step 5: Plane equations of the attributes
+    planes = {}
+    for name, values in (attributes or {}).items():
+        values = np.asarray(values, dtype=np.float64)[:, idx].transpose(1, 2, 0)     # N x 3 x D
+        s1, s2 = values[:, 1] - values[:, 0], values[:, 2] - values[:, 0]
+        ddx = (s1 * (y2 - y0)[:, None] - s2 * (y1 - y0)[:, None]) * inv_area[:, None]
+        ddy = (s2 * (x1 - x0)[:, None] - s1 * (x2 - x0)[:, None]) * inv_area[:, None]
+        planes[name] = np.stack([ddx, ddy, values[:, 0] - ddx * x0[:, None] - ddy * y0[:, None]], axis=2)
+
+    setup = TriangleSetup(x, y, z, min_x, max_x, min_y, max_y, A, degenerate, inv_area, edges, reject_tol, planes)
+    if subpixel:
+        setup.fixed, setup.fixed_area, setup.fixed_edges = _fixed_edges(x, y, usable)
+    return setup
+
+
+def batch_pixels(
+    setup: TriangleSetup,
+    batch: int = BATCH_PIXELS
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Covered pixels of all triangles of a setup, in chunks of at most `batch` candidate
+    pixels, in drawing order (triangle by triangle, row-major inside a triangle).
+
+    Every triangle gets exactly the pixels and the weights of
+    triangle_pixels(..., setup=setup[k]): the pixels left after the edge-function rejection
+    go through the same 2x2 LAPACK solve, only for the pixels of many triangles at once.
+
+    Yields:
+    - tri: (P,) index of the triangle of every covered pixel.
+    - ys, xs: (P,) integer pixel coordinates.
+    - u, v, w: (P,) barycentric weights of vertex 0, 1 and 2.
+    """
+    box_w = np.maximum(setup.max_x - setup.min_x + 1, 0)
+    counts = np.where(setup.degenerate, 0, box_w * np.maximum(setup.max_y - setup.min_y + 1, 0))
+
+    # Split the triangles into chunks with a bounded number of candidate pixels
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(setup):
+        base = ends[start - 1] if start > 0 else 0
+        stop = max(int(np.searchsorted(ends, base + batch, side='right')), start + 1)
+        total = int(ends[stop - 1] - base)
+        start, first = stop, start
+        if total == 0:
+            continue
+
+        # One candidate per bounding-box pixel, tagged with its triangle
+        chunk = counts[first:stop]
+        tri = np.repeat(np.arange(first, stop), chunk)
+        local = np.arange(total) - np.repeat(np.cumsum(chunk) - chunk, chunk)
+        xs = setup.min_x[tri] + local % box_w[tri]
+        ys = setup.min_y[tri] + local // box_w[tri]
+
+        # Drop the pixels that are clearly outside, then solve the barycentric systems
+        keep = edge_candidates(setup.edges[tri], setup.reject_tol[tri], xs, ys)
+        tri, xs, ys = tri[keep], xs[keep], ys[keep]
+        x2, y2 = setup.x[tri, 2], setup.y[tri, 2]
+        b = np.stack([xs + 0.5 - x2, ys + 0.5 - y2], axis=1)
+        sol = np.linalg.solve(setup.A[tri], b[:, :, None])[:, :, 0]
+        u = sol[:, 0]
+        v = sol[:, 1]
+        w = 1 - u - v
+
+        inside = (u >= 0) & (v >= 0) & (w >= 0)
+        yield tri[inside], ys[inside], xs[inside], u[inside], v[inside], w[inside]
+
+
+def _singular(A: np.ndarray) -> np.ndarray:
+    """
+    (N,) mask of the 2x2 systems whose LAPACK solve raises LinAlgError (a zero pivot), so
+    degenerate triangles are told apart exactly as by the try/except of the kernels.
+    """
+    singular = np.linalg.det(A) == 0 if A.shape[0] else np.zeros(0, dtype=bool)
+    rhs = np.ones(2)
+
+    # A zero determinant is almost always a zero pivot; check those few one by one
+    for k in np.flatnonzero(singular):
+        try:
+            np.linalg.solve(A[k], rhs)
+            singular[k] = False
+        except np.linalg.LinAlgError:
+            pass
+
+    # The others at once (one by one only if that fails)
+    rest = np.flatnonzero(~singular)
+    try:
+        np.linalg.solve(A[rest], np.broadcast_to(rhs, (rest.size, 2))[:, :, None])
+    except np.linalg.LinAlgError:
+        for k in rest:
+            try:
+                np.linalg.solve(A[k], rhs)
+            except np.linalg.LinAlgError:
+                singular[k] = True
+    return singular
+
+
+def _fixed_edges(x: np.ndarray, y: np.ndarray, usable: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fixed-point edge functions of triangle_pixels_fixed for all triangles at once (see
+    TriangleSetup). Triangles too far away for exact integer arithmetic are not fixed.
+    """
+    fixed = usable & (np.max(np.abs(x), axis=1) < MAX_COORD) & (np.max(np.abs(y), axis=1) < MAX_COORD)
+
+    # Snap the vertices to the fixed-point grid
+    one = 1 << SUBPIXEL_BITS
+    X = np.round(np.where(fixed[:, None], x, 0) * one).astype(np.int64)
+    Y = np.round(np.where(fixed[:, None], y, 0) * one).astype(np.int64)
+
+    # Twice the signed area, then the edges oriented so that the inside is positive
+    area = (X[:, 1] - X[:, 0]) * (Y[:, 2] - Y[:, 0]) - (Y[:, 1] - Y[:, 0]) * (X[:, 2] - X[:, 0])
+    sign = np.where(area < 0, -1, 1)[:, None]
+    a, b = np.array([1, 2, 0]), np.array([2, 0, 1])
+    dx = (X[:, b] - X[:, a]) * sign
+    dy = (Y[:, b] - Y[:, a]) * sign
+    c = dy * X[:, a] - dx * Y[:, a]
+
+    # Top-left fill rule (y points down): pixel centers on other edges are left out
+    bias = np.where((dy < 0) | ((dy == 0) & (dx > 0)), 0, -1)
+    return fixed, np.abs(area), np.stack([dx, dy, c, bias], axis=2)
+
+
+
+
+# # Example usage (comment or uncomment as needed)
+
+# from triangle_kernel_func import triangle_pixels
+
+# # Two triangles of a quad: the setup once, then the coverage of every triangle from its record
+# vertices_2d = np.array([[4.0, 27.0, 27.0, 4.0], [4.0, 4.0, 29.0, 29.0], [1.0, 1.0, 2.0, 2.0]])
+# t_pos_idx = np.array([[0, 0], [1, 2], [2, 3]])
+# setup = setup_triangles(vertices_2d, t_pos_idx, 32, 32)
+# print(setup, setup[0])
+# for k in range(len(setup)):
+#     ys, xs, u, v, w = triangle_pixels(vertices_2d[:, t_pos_idx[:, k]], 32, 32, setup=setup[k])
+#     print(k, ys.size, "pixels")